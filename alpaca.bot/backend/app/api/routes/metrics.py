@@ -3,6 +3,13 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select, func
 from app.db.session import get_db
 from app.db import models
+from app.core.events import EVENT_STATS_KEY
+from app.core.redis_client import TICK_LAST_KEY, get_redis
+from app.core.ws_hub import get_event_hub
+from app.engine.rate_limit import get_massive_rate_limiter
+from app.engine.scheduler import get_scheduler
+from app.engine.snapshot_cache import snapshot_cache_stats
+from app.strategies.indicator_cache import indicator_cache_stats
 
 router = APIRouter(tags=["metrics"])
 
@@ -18,3 +25,67 @@ def overview(db: Session = Depends(get_db)):
         "runs_total": total_runs,
         "runs_errors": errors,
     }
+
+
+@router.get("/metrics/rate-limit")
+def rate_limit():
+    """
+    Fleet-wide Massive API token bucket usage: how often and how long callers waited.
+    """
+    limiter = get_massive_rate_limiter()
+    if limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **limiter.stats()}
+
+
+@router.get("/metrics/snapshot-cache")
+def snapshot_cache():
+    """
+    Fleet-wide snapshot cache hit/miss counts, for tuning SNAPSHOT_CACHE_TTL_S.
+    """
+    stats = snapshot_cache_stats()
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
+@router.get("/metrics/indicator-cache")
+def indicator_cache():
+    """
+    Per-tick indicator cache totals: dedup_ratio is lookups per computed series.
+    """
+    return indicator_cache_stats()
+
+
+@router.get("/metrics/scheduler")
+def scheduler():
+    """
+    Strategies in the due queue and time until the next one runs.
+    """
+    return get_scheduler().stats()
+
+
+@router.get("/metrics/tick")
+def last_tick():
+    """
+    Summary of the last completed tick, including budget_used_pct and skipped stages.
+    """
+    return get_redis().hgetall(TICK_LAST_KEY) or {}
+
+
+@router.get("/metrics/events")
+def events():
+    """
+    Fleet-wide event publisher totals: published vs coalesced/dropped, and
+    batches (published / batches is the mean events per round trip).
+    """
+    return {k: int(v) for k, v in (get_redis().hgetall(EVENT_STATS_KEY) or {}).items()}
+
+
+@router.get("/metrics/ws")
+def ws_hub():
+    """
+    This API process's WebSocket fan-out: connected clients, messages
+    received from Redis, and what slow clients had dropped or conflated.
+    """
+    return get_event_hub().stats()
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import select
 from app.db.session import get_db
 from app.db import models
+from app.engine.scheduler import notify_schedule_changed
 
 router = APIRouter(tags=["strategies"])
 
@@ -51,6 +52,7 @@ def create_strategy(payload: StrategyIn, db: Session = Depends(get_db)):
     db.add(s)
     db.commit()
     db.refresh(s)
+    notify_schedule_changed()
     return s
 
 @router.patch("/strategies/{strategy_id}", response_model=StrategyOut)
@@ -69,6 +71,7 @@ def update_strategy(strategy_id: str, payload: StrategyIn, db: Session = Depends
 
     db.commit()
     db.refresh(s)
+    notify_schedule_changed()
     return s
 
 @router.delete("/strategies/{strategy_id}")
@@ -78,4 +81,5 @@ def delete_strategy(strategy_id: str, db: Session = Depends(get_db)):
         raise HTTPException(404, "Not found")
     db.delete(s)
     db.commit()
+    notify_schedule_changed()
     return {"ok": True}
@@ -1,180 +1,168 @@
 import asyncio
-import json
 import logging
+import redis
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import redis.asyncio as redis_async
 from app.core.config import settings
 from app.core.events import EVENT_CHANNEL
+from app.core.wire import FORMATS, decode, encode
+from app.core.ws_hub import ClientQueue, Subscription, get_event_hub
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["ws"])
 
+KEEPALIVE_S = 25
+
+
+async def _send_loop(ws: WebSocket, q: ClientQueue) -> None:
+    # Messages arrive pre-serialised from the hub; a ping goes out after
+    # KEEPALIVE_S of silence so dead connections get noticed.
+    # JSON frames go out as text, msgpack as binary.
+    ping = encode({"type": "ping"}, q.format)
+    while True:
+        try:
+            frame = await asyncio.wait_for(q.get(), timeout=KEEPALIVE_S)
+        except asyncio.TimeoutError:
+            frame = ping
+        await _send_frame(ws, frame)
+
+
+async def _send_frame(ws: WebSocket, frame: str | bytes) -> None:
+    if isinstance(frame, bytes):
+        await ws.send_bytes(frame)
+    else:
+        await ws.send_text(frame)
+
+
+def _reply(q: ClientQueue, payload: dict) -> None:
+    # Through the outbox, so replies keep their place relative to events
+    q.send(payload)
+
+
+def handle_client_message(q: ClientQueue, data: str | bytes) -> None:
+    """
+    Client -> server protocol (JSON text or msgpack binary frames):
+
+        {"op": "subscribe", "types": [...], "strategies": [...], "symbols": [...], "max_hz": 2}
+        {"op": "unsubscribe"}   # back to everything, default rate
+
+    Omitted or "*" fields match everything. max_hz caps updates per second
+    per (type, symbol) for conflated event types; WS_MAX_HZ by default.
+    Each op is answered with {"type": "subscribed", "filter": {...}}, or
+    {"type": "error", ...} leaving the previous subscription in place.
+    """
+    try:
+        msg, _ = decode(data)
+        if not isinstance(msg, dict):
+            raise ValueError("expected a JSON object")
+        op = msg.get("op")
+        if op == "subscribe":
+            q.subscription = Subscription.parse(msg, default_max_hz=settings.ws_max_hz)
+        elif op == "unsubscribe":
+            q.subscription = Subscription(max_hz=settings.ws_max_hz)
+        elif op == "ping":
+            _reply(q, {"type": "pong"})
+            return
+        else:
+            raise ValueError(f"unknown op {op!r}")
+    except (ValueError, TypeError) as e:
+        _reply(q, {"type": "error", "error": str(e)})
+        return
+    _reply(q, {"type": "subscribed", "filter": q.subscription.describe()})
+
+
+async def _receive_loop(ws: WebSocket, q: ClientQueue) -> None:
+    while True:
+        msg = await ws.receive()
+        if msg["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(msg.get("code", 1000))
+        client_msg = msg.get("text") if msg.get("text") is not None else msg.get("bytes")
+        if client_msg is None:
+            continue
+        logger.debug(f"Received client message: {client_msg[:100]!r}")
+        handle_client_message(q, client_msg)
+
+
+def _initial_subscription(ws: WebSocket) -> Subscription:
+    # Same fields as the subscribe op, comma-separated: /api/ws?symbols=AAPL,MSFT&types=tick
+    qp = ws.query_params
+    msg = {k: qp[k].split(",") for k in ("types", "strategies", "symbols") if qp.get(k)}
+    if qp.get("max_hz"):
+        msg["max_hz"] = qp["max_hz"]
+    return Subscription.parse(msg, default_max_hz=settings.ws_max_hz)
+
+
 @router.websocket("/ws")
 async def ws_endpoint(ws: WebSocket):
+    """
+    Live bot events. Every connection is fed from the process-wide EventHub
+    (one Redis subscription in total) through its own bounded queue, so a
+    slow client loses old or superseded messages instead of stalling others.
+    Clients narrow the stream with the subscribe op (handle_client_message)
+    or the same fields as query parameters. ?format=msgpack switches the
+    connection to binary msgpack frames (app.core.wire) in both directions.
+
+    Events carry a "cursor" (their id in the event log). A client that
+    reconnects with ?cursor=<last seen> first gets every logged event it
+    missed, then a {"type": "replayed", ...} marker, then the live stream,
+    with nothing lost or repeated in between.
+    """
     await ws.accept()
     logger.info("WebSocket connection accepted")
-    
-    r = None
-    pubsub = None
-    keepalive_task = None
 
+    fmt = ws.query_params.get("format", "json")
     try:
-        # Create Redis connection with proper error handling
-        r = redis_async.Redis.from_url(
-            settings.celery_broker_url, 
-            decode_responses=True,
-            retry_on_timeout=True,
-            socket_keepalive=True
-        )
-        
-        # Test Redis connection
-        await r.ping()
-        
-        pubsub = r.pubsub()
-        await pubsub.subscribe(EVENT_CHANNEL)
-        logger.info(f"Subscribed to Redis channel: {EVENT_CHANNEL}")
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        subscription = _initial_subscription(ws)
+    except ValueError as e:
+        await ws.send_json({"type": "error", "error": str(e)})
+        await ws.close(code=1008)
+        return
 
+    hub = get_event_hub()
+    q = hub.subscribe(subscription, format=fmt)
+    tasks: list[asyncio.Task] = []
+    try:
         # Send a hello so client knows we're connected
-        await ws.send_json({
-            "type": "hello", 
+        await _send_frame(ws, encode({
+            "type": "hello",
             "channel": EVENT_CHANNEL,
-            "status": "connected"
-        })
+            "status": "connected",
+            "format": fmt,
+            "filter": subscription.describe(),
+        }, fmt))
 
-        # Create keepalive task to detect disconnections
-        async def send_keepalive():
-            try:
-                while True:
-                    await asyncio.sleep(25)  # Send ping every 25 seconds
-                    try:
-                        await ws.send_json({"type": "ping"})
-                    except (WebSocketDisconnect, RuntimeError, ConnectionError):
-                        logger.debug("WebSocket disconnected, stopping keepalive")
-                        break
-            except asyncio.CancelledError:
-                logger.debug("Keepalive task cancelled")
-                raise
-            except Exception as e:
-                logger.error(f"Keepalive error: {e}")
-
-        keepalive_task = asyncio.create_task(send_keepalive())
-
-        # Main message loop
-        while True:
+        # Catch up from the log while live events queue up behind it
+        cursor = ws.query_params.get("cursor")
+        if cursor:
             try:
-                # Check for client messages with timeout
-                try:
-                    client_msg = await asyncio.wait_for(
-                        ws.receive_text(), 
-                        timeout=0.1
-                    )
-                    # Handle client messages if needed
-                    logger.debug(f"Received client message: {client_msg[:100]}")
-                except asyncio.TimeoutError:
-                    pass  # No client message, continue to Redis
-                except WebSocketDisconnect:
-                    logger.info("Client disconnected")
-                    break
-
-                # Check Redis messages with timeout
-                try:
-                    msg = await pubsub.get_message(
-                        ignore_subscribe_messages=True, 
-                        timeout=0.1
-                    )
-                    
-                    if msg and msg.get("type") == "message":
-                        data = msg.get("data")
-                        try:
-                            # Try to parse as JSON
-                            payload = json.loads(data)
-                            await ws.send_json(payload)
-                            logger.debug(f"Sent Redis message: {type(payload)}")
-                        except json.JSONDecodeError:
-                            # Send as raw data if not JSON
-                            await ws.send_json({
-                                "type": "raw", 
-                                "data": data,
-                                "channel": msg.get("channel")
-                            })
-                        except Exception as e:
-                            logger.error(f"Error sending message: {e}")
-                            
-                except asyncio.TimeoutError:
-                    continue  # No Redis message, continue loop
-                except redis_async.ConnectionError as e:
-                    logger.error(f"Redis connection error: {e}")
-                    # Try to reconnect Redis
-                    try:
-                        await r.ping()
-                    except:
-                        logger.error("Redis connection lost, attempting to reconnect...")
-                        # Recreate Redis connection
-                        if r:
-                            await r.close()
-                        r = redis_async.Redis.from_url(
-                            settings.celery_broker_url, 
-                            decode_responses=True
-                        )
-                        pubsub = r.pubsub()
-                        await pubsub.subscribe(EVENT_CHANNEL)
-                        logger.info("Redis reconnected and resubscribed")
-                    continue
-                    
-            except WebSocketDisconnect:
-                logger.info("WebSocket disconnected by client")
-                break
-            except asyncio.CancelledError:
-                logger.info("WebSocket task cancelled (likely backend reload)")
-                break
-            except Exception as e:
-                logger.error(f"Unexpected error in WebSocket loop: {e}")
-                # Don't break immediately on unexpected errors, try to continue
-                await asyncio.sleep(1)
-                continue
+                async for frame in hub.replay(q, cursor, limit=settings.ws_replay_max):
+                    await _send_frame(ws, frame)
+            except (ValueError, redis.RedisError) as e:
+                await _send_frame(ws, encode({"type": "error", "error": f"replay failed: {e}"}, fmt))
 
+        tasks = [
+            asyncio.create_task(_send_loop(ws, q)),
+            asyncio.create_task(_receive_loop(ws, q)),
+        ]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            exc = t.exception()
+            if exc is not None and not isinstance(exc, (WebSocketDisconnect, RuntimeError, ConnectionError)):
+                logger.error(f"WebSocket error: {exc}")
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except asyncio.CancelledError:
         logger.info("WebSocket task cancelled (backend reloading)")
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
     finally:
-        # Clean up tasks
-        logger.info("Cleaning up WebSocket connection")
-        
-        # Cancel keepalive task
-        if keepalive_task and not keepalive_task.done():
-            keepalive_task.cancel()
-            try:
-                await keepalive_task
-            except (asyncio.CancelledError, Exception):
-                pass
-        
-        # Clean up Redis pubsub
-        if pubsub:
-            try:
-                # Use asyncio.shield to prevent cancellation during cleanup
-                await asyncio.shield(pubsub.unsubscribe(EVENT_CHANNEL))
-                await asyncio.shield(pubsub.close())
-                logger.info("Redis pubsub closed")
-            except (asyncio.CancelledError, Exception) as e:
-                logger.error(f"Error closing pubsub: {e}")
-        
-        # Clean up Redis client
-        if r:
-            try:
-                await asyncio.shield(r.close())
-                logger.info("Redis client closed")
-            except (asyncio.CancelledError, Exception) as e:
-                logger.error(f"Error closing Redis client: {e}")
-        
-        # Close WebSocket if still open
+        hub.unsubscribe(q)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         try:
             await ws.close()
         except (RuntimeError, Exception):
             pass
-        
-        logger.info("WebSocket connection cleaned up")
\ No newline at end of file
+        logger.info("WebSocket connection cleaned up")
@@ -16,6 +16,78 @@ class Settings(BaseSettings):
 
     polygon_api_key: str
 
+    # Local on-disk bar cache for MassiveDataService.get_ohlc (disabled when unset).
+    # Closed bars newer than the publish lag are not cached yet (delayed / EOD plans).
+    bar_store_dir: str | None = None
+    bar_store_publish_lag_s: float = 900.0
+    # Dense symbols x dates daily matrix built from Grouped Daily backfills
+    daily_matrix_dir: str = "./data/daily_matrix"
+
+    # Shared Redis token bucket for Massive API calls.
+    # Tier: basic|starter|developer|advanced, empty disables. Rate/burst override the tier defaults.
+    massive_plan_tier: str = ""
+    massive_rate_per_s: float | None = None
+    massive_rate_burst: float | None = None
+
+    # Alpaca trading API: account-wide request budget (0 disables the limiter),
+    # concurrent order submissions per batch and HTTP pool size per worker
+    alpaca_rate_per_min: float = 200.0
+    alpaca_rate_burst: float = 20.0
+    order_concurrency: int = 20
+    alpaca_http_pool_size: int = 20
+
+    # In-memory positions/buying power for pre-trade risk checks, re-synced
+    # from the broker every N seconds (0 disables the cache)
+    portfolio_reconcile_s: float = 30.0
+
+    # Event publishing: 0 publishes each event immediately, > 0 batches them
+    # into one pipelined round trip per window, keeping only the latest event
+    # per (type, symbol) for the comma-separated coalesced types
+    event_batch_ms: float = 50.0
+    event_coalesce_types: str = "price,quote"
+    # Encoding of events on the bus: json|msgpack (WebSocket clients pick their own)
+    event_wire_format: str = "json"
+    # Capped Redis Stream of published events for WebSocket replay (0 disables)
+    event_log_maxlen: int = 10_000
+
+    # Messages buffered per WebSocket client before the oldest are dropped
+    ws_client_queue_size: int = 256
+    # Default max updates/s per (type, symbol) of coalesced types sent to each client
+    ws_max_hz: float = 4.0
+    # Most logged events replayed to one reconnecting client
+    ws_replay_max: int = 5_000
+
+    # Local simulated broker instead of Alpaca (load testing the execution path)
+    broker_sim: bool = False
+    broker_sim_cash: float = 100_000.0
+    broker_sim_latency_ms: float = 30.0
+    broker_sim_jitter_ms: float = 20.0
+    broker_sim_slippage_bps: float = 2.0
+    broker_sim_partial_rate: float = 0.0
+    broker_sim_reject_rate: float = 0.0
+
+    # Per-ticker snapshot cache shared by tick/API/strategies (0 disables)
+    snapshot_cache_ttl_s: float = 5.0
+
+    # Streaming indicator checkpoints: directory if set, else Redis (with TTL)
+    indicator_state_dir: str | None = None
+    indicator_state_ttl_s: int = 7 * 24 * 3600
+
+    # Per-strategy scheduler: how often beat checks for due strategies, and
+    # how often the due queue is re-read from the DB without a change signal
+    scheduler_resolution_s: float = 1.0
+    scheduler_sync_s: float = 30.0
+
+    # Tick fan-out: max symbols per tick_shard task
+    tick_shard_symbols: int = 500
+    # Tick deadline (keep below the 60s beat interval). Shards stop
+    # tick_merge_reserve_s early; low-priority stages need tick_low_priority_min_s left.
+    tick_budget_s: float = 50.0
+    tick_merge_reserve_s: float = 5.0
+    tick_low_priority_min_s: float = 10.0
+    # Tick lock lives at most budget + slack if a tick dies without releasing it
+    tick_lock_slack_s: float = 5.0
+
     app_env: str = "dev"
     port:str
 
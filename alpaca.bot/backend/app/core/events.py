@@ -1,13 +1,193 @@
-import json
-from typing import Any
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import atexit
+import logging
+import os
+import threading
+import time
 import redis
 from app.core.config import settings
+from app.core.wire import encode
+
+logger = logging.getLogger(__name__)
 
 EVENT_CHANNEL = "bot_events"
+EVENT_STATS_KEY = "events:stats"
+EVENT_STREAM = "events:log"
+
+
+class EventPublisher:
+    """
+    Process-wide publisher onto EVENT_CHANNEL over one pooled Redis client.
+
+    With batch_ms = 0 every publish() is one round trip on a pooled
+    connection. With batch_ms > 0 publish() only appends to an in-memory
+    buffer (microseconds, no I/O) and a background thread sends everything
+    buffered every batch_ms in one pipelined round trip. While buffered,
+    events with the same coalesce key replace each other, so a burst of
+    per-symbol price updates sends only the latest one per symbol per
+    window. Event types in coalesce_types get the key (type, symbol)
+    automatically.
+
+    The buffer holds at most max_pending events; beyond that the oldest are
+    dropped (and counted) rather than blocking the caller. Don't mutate an
+    event dict after publishing it: it is serialised on the flush thread.
+
+    Events are encoded once, as wire_format ("json" or "msgpack", see
+    app.core.wire). With log_maxlen > 0 each frame is also appended to the
+    EVENT_STREAM (XADD, trimmed to about log_maxlen entries) in the same
+    round trip; the WebSocket hub tails that stream and replays from it
+    when a client reconnects with a cursor.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        batch_ms: float = 0.0,
+        coalesce_types: frozenset[str] = frozenset(),
+        max_pending: int = 10_000,
+        channel: str = EVENT_CHANNEL,
+        wire_format: str = "json",
+        log_maxlen: int = 0,
+    ):
+        self.url = url
+        self.batch_s = max(0.0, batch_ms) / 1000
+        self.coalesce_types = coalesce_types
+        self.max_pending = max_pending
+        self.channel = channel
+        self.wire_format = wire_format
+        self.log_maxlen = log_maxlen
+
+        self._lock = threading.Lock()
+        self._pending: OrderedDict[Hashable, dict[str, Any]] = OrderedDict()
+        self._seq = 0
+        self._pid = -1
+        self._r: Optional[redis.Redis] = None
+        self._thread: Optional[threading.Thread] = None
+        self.counts = {"published": 0, "coalesced": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._unreported = {"coalesced": 0, "dropped": 0}  # not yet added to EVENT_STATS_KEY
+
+    def _client(self) -> redis.Redis:
+        # Pools and threads don't survive fork (Celery prefork): rebuild in the child
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._r = redis.Redis.from_url(self.url, decode_responses=True)
+                    self._pending.clear()
+                    self._thread = None
+                    self._pid = os.getpid()
+        return self._r  # type: ignore[return-value]
+
+    # -----------------------
+    # Publishing
+    # -----------------------
+    def publish(self, event: dict[str, Any], *, coalesce_key: Optional[Hashable] = None) -> None:
+        r = self._client()
+        if self.batch_s <= 0:
+            try:
+                p = r.pipeline(transaction=False)
+                self._send(p, encode(event, self.wire_format))
+                p.hincrby(EVENT_STATS_KEY, "published", 1)
+                p.execute()
+                self.counts["published"] += 1
+            except redis.RedisError as e:
+                self.counts["errors"] += 1
+                logger.warning("event publish failed: %s", e)
+            return
+
+        if coalesce_key is None and event.get("type") in self.coalesce_types:
+            coalesce_key = (event["type"], event.get("symbol"))
+        with self._lock:
+            if coalesce_key is None:
+                self._seq += 1
+                coalesce_key = self._seq
+            elif coalesce_key in self._pending:
+                # keep the first one's position so ordering vs. other events holds
+                self.counts["coalesced"] += 1
+                self._unreported["coalesced"] += 1
+            self._pending[coalesce_key] = event
+            if len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+                self.counts["dropped"] += 1
+                self._unreported["dropped"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-publisher", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> int:
+        """Send everything buffered now, in one pipeline. Returns the number sent."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch = list(self._pending.values())
+            self._pending.clear()
+            counts, self._unreported = self._unreported, {"coalesced": 0, "dropped": 0}
+
+        p = self._client().pipeline(transaction=False)
+        for ev in batch:
+            self._send(p, encode(ev, self.wire_format))
+        p.hincrby(EVENT_STATS_KEY, "published", len(batch))
+        p.hincrby(EVENT_STATS_KEY, "batches", 1)
+        for k, v in counts.items():
+            if v:
+                p.hincrby(EVENT_STATS_KEY, k, v)
+        try:
+            p.execute()
+        except redis.RedisError as e:
+            with self._lock:
+                self.counts["errors"] += 1
+            logger.warning("event flush of %d events failed: %s", len(batch), e)
+            return 0
+        with self._lock:
+            self.counts["published"] += len(batch)
+            self.counts["batches"] += 1
+        return len(batch)
+
+    def _send(self, p: redis.client.Pipeline, frame: str | bytes) -> None:
+        if self.log_maxlen > 0:
+            p.xadd(EVENT_STREAM, {"d": frame}, maxlen=self.log_maxlen, approximate=True)
+        p.publish(self.channel, frame)
+
+    def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("event flush failed")
+            # steady cadence even when a flush is slow
+            time.sleep(max(0.0, self.batch_s - (time.perf_counter() - t0)))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {**self.counts, "pending": len(self._pending), "batch_ms": self.batch_s * 1000}
+
+
+_publisher: Optional[EventPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_event_publisher() -> EventPublisher:
+    global _publisher
+    if _publisher is None:
+        with _publisher_lock:
+            if _publisher is None:
+                _publisher = EventPublisher(
+                    settings.celery_broker_url,
+                    batch_ms=settings.event_batch_ms,
+                    coalesce_types=frozenset(t for t in settings.event_coalesce_types.split(",") if t),
+                    wire_format=settings.event_wire_format,
+                    log_maxlen=settings.event_log_maxlen,
+                )
+                atexit.register(_publisher.flush)
+    return _publisher
+
 
-def publish_event(event: dict[str, Any]) -> None:
+def publish_event(event: dict[str, Any], *, coalesce_key: Optional[Hashable] = None) -> None:
     """
     Publish an event to Redis pubsub so the FastAPI websocket can forward it to clients.
+    Goes through the process-wide EventPublisher (pooled, optionally batched); never raises.
     """
-    r = redis.Redis.from_url(settings.celery_broker_url, decode_responses=True)
-    r.publish(EVENT_CHANNEL, json.dumps(event, default=str))
+    get_event_publisher().publish(event, coalesce_key=coalesce_key)
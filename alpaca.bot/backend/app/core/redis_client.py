@@ -0,0 +1,29 @@
+"""
+Process-wide Redis client (the Celery broker's Redis, decode_responses=True)
+for the small keys both the API and the workers read and write: tick
+summary and lock, rate-limit buckets, the strategy schedule, snapshot
+cache entries and stats hashes. Safe to import from the web process; it
+pulls in no task modules. Binary payloads (indicator checkpoints) use
+their own raw-bytes client.
+"""
+from __future__ import annotations
+from typing import Optional
+import threading
+import redis
+from app.core.config import settings
+
+# Written by app.tasks.runner, read by /api/metrics/tick
+TICK_LOCK_KEY = "tick:lock"
+TICK_LAST_KEY = "tick:last"
+
+_redis: Optional[redis.Redis] = None
+_redis_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        with _redis_lock:
+            if _redis is None:
+                _redis = redis.Redis.from_url(settings.celery_broker_url, decode_responses=True)
+    return _redis
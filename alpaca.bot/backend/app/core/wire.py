@@ -0,0 +1,63 @@
+"""
+Event encodings shared by the publisher, the WebSocket hub and clients.
+
+"json" frames are UTF-8 text; "msgpack" frames are binary. A message read
+off the bus can be either (publishers may run with different
+EVENT_WIRE_FORMAT during a rollout), so decode() tells them apart by the
+first byte: JSON events are objects and start with "{", msgpack maps never
+do.
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import json
+import struct
+import msgpack
+
+FORMATS = ("json", "msgpack")
+
+
+def encode(obj: Any, fmt: str) -> str | bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(obj, default=str, use_bin_type=True)
+    return json.dumps(obj, default=str)
+
+
+def decode(data: str | bytes) -> tuple[Any, str]:
+    """(object, format) of one frame; raises ValueError if it is neither."""
+    if isinstance(data, str):
+        return json.loads(data), "json"
+    if data[:1] in (b"{", b"[", b" "):
+        return json.loads(data), "json"
+    try:
+        return msgpack.unpackb(data, raw=False), "msgpack"
+    except Exception as e:
+        raise ValueError(f"undecodable frame: {e}") from e
+
+
+def prepend_field(data: str | bytes, fmt: str, key: str, value: Any) -> Optional[str | bytes]:
+    """
+    `data` (an encoded map in `fmt`) with key: value added in front, spliced
+    into the bytes rather than decoded and re-encoded; None if `data` is not
+    a map. `key` must not already be in it. JSON comes back as text.
+    """
+    if fmt == "json":
+        text = data.decode("utf-8") if isinstance(data, bytes) else data
+        body = text.lstrip()
+        if not body.startswith("{"):
+            return None
+        head = "{" + json.dumps(key) + ": " + json.dumps(value, default=str)
+        rest = body[1:].lstrip()
+        return head + rest if rest.startswith("}") else head + ", " + rest
+    if not isinstance(data, bytes) or not data:
+        return None
+    b = data[0]
+    if 0x80 <= b <= 0x8F:
+        n, size = b & 0x0F, 1
+    elif b == 0xDE:
+        n, size = struct.unpack_from(">H", data, 1)[0], 3
+    elif b == 0xDF:
+        n, size = struct.unpack_from(">I", data, 1)[0], 5
+    else:
+        return None
+    packer = msgpack.Packer(default=str, use_bin_type=True)
+    return packer.pack_map_header(n + 1) + packer.pack(key) + packer.pack(value) + data[size:]
@@ -0,0 +1,414 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Hashable, Optional
+import asyncio
+import itertools
+import logging
+import re
+import time
+import redis.asyncio as redis_async
+from app.core.config import settings
+from app.core.events import EVENT_CHANNEL, EVENT_STREAM
+from app.core.wire import decode, encode, prepend_field
+
+logger = logging.getLogger(__name__)
+
+
+_CURSOR_RE = re.compile(r"^\d+-\d+$")
+
+
+def _id_tuple(stream_id: str) -> tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+# List fields whose items carry a "symbol" and get filtered per subscriber
+_SYMBOL_LISTS = ("signals", "rejected")
+
+
+@dataclass
+class Subscription:
+    """
+    What one client asked for; None means everything. Events with a
+    top-level strategy_id / symbol must match; lists of per-symbol items
+    (a tick's signals) are cut down to the subscribed symbols, and an event
+    left with nothing for the client is not sent at all.
+    """
+    types: Optional[frozenset[str]] = None
+    strategies: Optional[frozenset[str]] = None
+    symbols: Optional[frozenset[str]] = None
+    max_hz: float = 0.0  # max updates per second per conflation key (0 = no limit)
+
+    def select(self, payload: Any, cache: dict) -> Any:
+        """
+        What to send for `payload`: the payload itself, a copy with its
+        symbol lists cut down, or None to skip it. `cache` is shared per
+        dispatch so clients with the same symbols share one copy.
+        """
+        if not isinstance(payload, dict):
+            return payload if self.types is None else None
+        if self.types is not None and payload.get("type") not in self.types:
+            return None
+        sid = payload.get("strategy_id")
+        if self.strategies is not None and sid is not None and str(sid) not in self.strategies:
+            return None
+        if self.symbols is None:
+            return payload
+        sym = payload.get("symbol")
+        if sym is not None:
+            return payload if sym in self.symbols else None
+        lists = [k for k in _SYMBOL_LISTS if isinstance(payload.get(k), list)]
+        if not lists:
+            return payload
+        key = self.symbols
+        if key not in cache:
+            cut = {k: [x for x in payload[k] if not isinstance(x, dict) or x.get("symbol") in self.symbols] for k in lists}
+            if not any(cut.values()) and any(payload[k] for k in lists) and payload.get("type") != "tick":
+                cache[key] = None  # only other symbols' signals in it
+            else:
+                cache[key] = payload if all(len(cut[k]) == len(payload[k]) for k in lists) else {**payload, **cut}
+        return cache[key]
+
+    @classmethod
+    def parse(cls, msg: dict[str, Any], *, default_max_hz: float) -> "Subscription":
+        def _set(name: str) -> Optional[frozenset[str]]:
+            v = msg.get(name)
+            if v is None or v == "*":
+                return None
+            if not isinstance(v, list):
+                raise ValueError(f"{name} must be a list of strings or \"*\"")
+            return frozenset(str(x) for x in v)
+
+        max_hz = float(msg.get("max_hz", default_max_hz))
+        if max_hz < 0:
+            raise ValueError("max_hz must be >= 0")
+        return cls(types=_set("types"), strategies=_set("strategies"), symbols=_set("symbols"), max_hz=max_hz)
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "types": sorted(self.types) if self.types is not None else "*",
+            "strategies": sorted(self.strategies) if self.strategies is not None else "*",
+            "symbols": sorted(self.symbols) if self.symbols is not None else "*",
+            "max_hz": self.max_hz,
+        }
+
+
+class ClientQueue:
+    """
+    Bounded outbox for one WebSocket client.
+
+    Messages with a conflation key replace the one already waiting under
+    that key (a slow client gets the latest price per symbol, not every
+    tick of it), and with subscription.max_hz set a key is sent at most
+    that often: updates arriving sooner are held, latest wins, until its
+    interval is up. When the outbox is full the oldest message is dropped,
+    so a stalled client never holds memory or slows anyone else down.
+    """
+
+    def __init__(self, maxsize: int, subscription: Optional[Subscription] = None, *, format: str = "json"):
+        self.maxsize = max(1, maxsize)
+        self.subscription = subscription or Subscription()
+        self.format = format  # wire format this client asked for (app.core.wire)
+        self.replay_until: Optional[str] = None  # set by EventHub.subscribe
+        self._items: OrderedDict[Hashable, str | bytes] = OrderedDict()
+        self._held: dict[Hashable, str | bytes] = {}        # rate-limited keys waiting for their slot
+        self._sent_at: dict[Hashable, float] = {}   # last send per conflation key
+        self._seq = itertools.count()
+        self._ready = asyncio.Event()
+        self.dropped = 0
+        self.conflated = 0
+
+    def _interval(self) -> float:
+        hz = self.subscription.max_hz
+        return 1.0 / hz if hz > 0 else 0.0
+
+    def send(self, obj: Any) -> None:
+        """Queue a server message (hello, replies) encoded for this client."""
+        self.put(encode(obj, self.format))
+
+    def put(self, text: str | bytes, key: Optional[Hashable] = None) -> None:
+        if key is not None and key in self._items:
+            self._items[key] = text
+            self.conflated += 1
+            return
+        if key is not None and self._interval():
+            if key in self._held or time.monotonic() - self._sent_at.get(key, float("-inf")) < self._interval():
+                self.conflated += key in self._held
+                self._held[key] = text
+                self._ready.set()  # the sender re-arms its timer
+                return
+        self._items[key if key is not None else next(self._seq)] = text
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+            self.dropped += 1
+        self._ready.set()
+
+    def _release_due(self) -> Optional[float]:
+        """Move held keys whose interval is up into the outbox; seconds until the next one."""
+        if not self._held:
+            return None
+        now, interval, wait = time.monotonic(), self._interval(), None
+        for key in list(self._held):
+            due = self._sent_at.get(key, float("-inf")) + interval
+            if due <= now:
+                self._items[key] = self._held.pop(key)
+            else:
+                wait = due - now if wait is None else min(wait, due - now)
+        return wait
+
+    async def get(self) -> str | bytes:
+        while True:
+            wait = self._release_due()
+            if self._items:
+                key, text = self._items.popitem(last=False)
+                if isinstance(key, tuple):
+                    self._sent_at[key] = time.monotonic()
+                return text
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def __len__(self) -> int:
+        return len(self._items) + len(self._held)
+
+
+class EventHub:
+    """
+    One Redis reader per API process, fanned out to every connected
+    WebSocket through its ClientQueue, filtered by the client's Subscription.
+
+    With the event log enabled (EVENT_LOG_MAXLEN > 0) the reader tails the
+    EVENT_STREAM with a blocking XREAD, stamps each event with its stream
+    id as "cursor", and picks up after the last id it saw when it
+    reconnects, so nothing is lost across a Redis blip. Without it, the
+    reader blocks on the pubsub channel.
+
+    Each message is decoded once and filtered per client. Each (format,
+    symbol-filtered variant) is encoded once per message and shared by
+    every client that needs it; clients using the format the event was
+    published in get the original frame as is (off the log, with the
+    cursor spliced in front of it). Redis connections stay at one however
+    many dashboards are open (plus short replay reads, see replay()).
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        channel: str = EVENT_CHANNEL,
+        stream: Optional[str] = None,
+        queue_size: int = 256,
+        conflate_types: frozenset[str] = frozenset(),
+    ):
+        self.url = url
+        self.channel = channel
+        self.stream = stream
+        self.last_id: Optional[str] = None  # last stream id dispatched
+        self.seed_id: Optional[str] = None  # where the reader started tailing
+        self._seeded = asyncio.Event()
+        self._backoff = 0.5
+        self._replay_r: Optional[redis_async.Redis] = None
+        self.queue_size = queue_size
+        self.conflate_types = conflate_types
+        self.clients: set[ClientQueue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.encoded = 0  # frames encoded here rather than forwarded as published
+        self.reconnects = 0
+
+    def subscribe(self, subscription: Optional[Subscription] = None, *, format: str = "json") -> ClientQueue:
+        q = ClientQueue(self.queue_size, subscription or Subscription(max_hz=settings.ws_max_hz), format=format)
+        self.clients.add(q)
+        # Everything dispatched from here on is newer than this (None: reader not started yet)
+        q.replay_until = self.last_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="ws-hub")
+        return q
+
+    def unsubscribe(self, q: ClientQueue) -> None:
+        self.clients.discard(q)
+
+    def conflation_key(self, payload: Any) -> Optional[Hashable]:
+        if isinstance(payload, dict) and payload.get("type") in self.conflate_types:
+            return (payload["type"], payload.get("symbol"))
+        return None
+
+    def dispatch(self, data: str | bytes, cursor: Optional[str] = None) -> None:
+        self.received += 1
+        payload, fmt = self._decode(data, cursor)
+        key = self.conflation_key(payload)
+        variants: dict = {}                     # symbol-filtered copies
+        frames: dict[tuple[int, str], str | bytes] = {}
+        if fmt is not None:
+            # JSON goes out as a text frame, msgpack as binary; the cursor is
+            # spliced into the published bytes, not re-encoded with them
+            frame = data.decode("utf-8") if fmt == "json" and isinstance(data, bytes) else data
+            if cursor is not None:
+                frame = prepend_field(data, fmt, "cursor", cursor)
+            if frame is not None:
+                frames[(id(payload), fmt)] = frame
+        for q in self.clients:
+            obj = q.subscription.select(payload, variants)
+            if obj is None:
+                continue
+            fk = (id(obj), q.format)
+            if fk not in frames:
+                frames[fk] = encode(obj, q.format)
+                self.encoded += 1
+            q.put(frames[fk], key)
+
+    def _decode(self, data: str | bytes, cursor: Optional[str]) -> tuple[Any, Optional[str]]:
+        try:
+            payload, fmt = decode(data)
+        except ValueError:
+            text = data.decode("utf-8", errors="replace") if isinstance(data, bytes) else data
+            payload, fmt = {"type": "raw", "data": text, "channel": self.channel}, None
+        if cursor is not None and isinstance(payload, dict):
+            payload["cursor"] = cursor
+        return payload, fmt
+
+    async def _run(self) -> None:
+        while True:
+            # raw bytes: frames may be msgpack, and matching clients get them untouched
+            r = redis_async.Redis.from_url(self.url, decode_responses=False, socket_keepalive=True)
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            try:
+                if self.stream:
+                    await self._tail_stream(r)
+                else:
+                    await pubsub.subscribe(self.channel)
+                    logger.info("ws hub: subscribed to %s", self.channel)
+                    self._backoff = 0.5
+                    async for msg in pubsub.listen():
+                        if msg.get("type") == "message":
+                            self.dispatch(msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.reconnects += 1
+                logger.warning("ws hub: redis subscription lost (%s); retrying in %.1fs", e, self._backoff)
+                await asyncio.sleep(self._backoff)
+                self._backoff = min(self._backoff * 2, 30.0)
+            finally:
+                try:
+                    await asyncio.shield(pubsub.aclose())
+                    await asyncio.shield(r.aclose())
+                except Exception:
+                    pass
+
+    async def _tail_stream(self, r: redis_async.Redis) -> None:
+        if self.last_id is None:
+            newest = await r.xrevrange(self.stream, count=1)
+            self.last_id = newest[0][0].decode() if newest else "0-0"
+            self.seed_id = self.last_id
+            self._seeded.set()
+            logger.info("ws hub: tailing %s from %s", self.stream, self.last_id)
+        while True:
+            res = await r.xread({self.stream: self.last_id}, count=500, block=5000)
+            self._backoff = 0.5
+            for _, entries in res or ():
+                for entry_id, fields in entries:
+                    self.last_id = entry_id.decode()
+                    self.dispatch(fields.get(b"d", b""), self.last_id)
+
+    # -----------------------
+    # Replay
+    # -----------------------
+    async def replay(
+        self, q: ClientQueue, cursor: str, *, limit: int, seed_timeout_s: float = 5.0
+    ) -> AsyncIterator[str | bytes]:
+        """
+        Frames for `q` of the events logged after `cursor` and before q
+        joined the live fan-out, oldest first (at most `limit`), then a
+        {"type": "replayed", ...} summary. complete=False there means events
+        were missed (trimmed from the capped stream, over `limit`, live
+        events dropped from q's full outbox while the replay streamed, or the
+        reader could not reach Redis within `seed_timeout_s` to say where
+        live starts) and the client should rebuild its state from REST instead.
+        """
+        if not self.stream:
+            raise ValueError("event log is disabled (EVENT_LOG_MAXLEN=0); cannot replay")
+        if not _CURSOR_RE.match(cursor):
+            raise ValueError("cursor must be a stream id like 1700000000000-0")
+        if q.replay_until is None:
+            try:
+                await asyncio.wait_for(self._seeded.wait(), timeout=seed_timeout_s)
+            except asyncio.TimeoutError:
+                logger.warning("ws hub: reader not seeded after %.1fs; skipping replay", seed_timeout_s)
+                yield encode(
+                    {"type": "replayed", "from": cursor, "cursor": None, "count": 0, "complete": False}, q.format
+                )
+                return
+            # q was subscribed before the reader started, so it has been sent
+            # everything after the seed id (last_id may have moved on since)
+            q.replay_until = self.seed_id
+        until = q.replay_until
+        dropped = q.dropped
+
+        if self._replay_r is None:
+            self._replay_r = redis_async.Redis.from_url(self.url, decode_responses=False)
+        r = self._replay_r
+
+        oldest = await r.xrange(self.stream, count=1)
+        complete = not oldest or _id_tuple(oldest[0][0].decode()) <= _id_tuple(cursor) or cursor == "0-0"
+        sent, last = 0, cursor
+        start = f"({cursor}"
+        while _id_tuple(last) < _id_tuple(until) and sent < limit:
+            page = await r.xrange(self.stream, min=start, max=until, count=min(500, limit - sent))
+            if not page:
+                break
+            for entry_id, fields in page:
+                last = entry_id.decode()
+                payload, _ = self._decode(fields.get(b"d", b""), last)
+                obj = q.subscription.select(payload, {})
+                if obj is not None:
+                    yield encode(obj, q.format)
+                sent += 1
+            start = f"({last}"
+        if sent >= limit and _id_tuple(last) < _id_tuple(until):
+            complete = False
+        if q.dropped > dropped:
+            complete = False
+        yield encode(
+            {"type": "replayed", "from": cursor, "cursor": until, "count": sent, "complete": complete}, q.format
+        )
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "clients": len(self.clients),
+            "running": self._task is not None and not self._task.done(),
+            "received": self.received,
+            "encoded": self.encoded,
+            "cursor": self.last_id,
+            "reconnects": self.reconnects,
+            "queued": sum(len(q) for q in self.clients),
+            "dropped": sum(q.dropped for q in self.clients),
+            "conflated": sum(q.conflated for q in self.clients),
+        }
+
+
+_hub: Optional[EventHub] = None
+
+
+def get_event_hub() -> EventHub:
+    global _hub
+    if _hub is None:
+        _hub = EventHub(
+            settings.celery_broker_url,
+            stream=EVENT_STREAM if settings.event_log_maxlen > 0 else None,
+            queue_size=settings.ws_client_queue_size,
+            conflate_types=frozenset(t for t in settings.event_coalesce_types.split(",") if t),
+        )
+    return _hub
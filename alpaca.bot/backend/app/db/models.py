@@ -32,7 +32,7 @@ class StrategyRun(Base):
     started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=datetime.utcnow)
     finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
-    status: Mapped[str] = mapped_column(String(32), default="running")  # running|ok|error
+    status: Mapped[str] = mapped_column(String(32), default="running")  # running|ok|partial|error
     message: Mapped[str | None] = mapped_column(Text, nullable=True)
 
     signals: Mapped[dict] = mapped_column(JSON, default=dict)
@@ -1,20 +1,98 @@
+import threading
+from typing import Optional
+from requests.adapters import HTTPAdapter
 from app.core.config import settings
 from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import MarketOrderRequest
-from alpaca.trading.enums import OrderSide, TimeInForce
+from alpaca.trading.requests import MarketOrderRequest, StopLossRequest, TakeProfitRequest
+from alpaca.trading.enums import OrderClass, OrderSide, TimeInForce
+from app.engine.sim_broker import new_sim_client
 
-def get_trading_client() -> TradingClient:
-    return TradingClient(
+_client: Optional[TradingClient] = None
+_client_lock = threading.Lock()
+
+
+def new_trading_client() -> TradingClient:
+    if settings.broker_sim:
+        return new_sim_client()  # type: ignore[return-value]
+    client = TradingClient(
         api_key=settings.alpaca_api_key,
         secret_key=settings.alpaca_api_secret,
         paper="paper-api.alpaca.markets" in settings.alpaca_base_url,
     )
+    # One keep-alive pool sized for concurrent order submission
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.alpaca_http_pool_size)
+    client._session.mount("https://", adapter)
+    return client
+
+
+def get_trading_client() -> TradingClient:
+    """
+    Long-lived client for this worker process, so connections (TLS and
+    keep-alive) are reused across runs instead of rebuilt per batch.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = new_trading_client()
+    return _client
+
+
+def _tick_round(price: float) -> float:
+    # Alpaca rejects sub-penny prices at or above $1
+    return round(price, 2 if price >= 1 else 4)
+
+
+def exit_prices(
+    side: str, price: float, take_profit_pct: float | None, stop_loss_pct: float | None
+) -> tuple[float | None, float | None]:
+    """
+    (take-profit limit, stop-loss stop) around `price` for an entry on
+    `side`, each at least one tick away from it. Pcts are fractions (0.02 = 2%).
+    """
+    tick = 0.01 if price >= 1 else 0.0001
+    sign = 1 if side == "buy" else -1
+    tp = sl = None
+    if take_profit_pct:
+        tp = _tick_round(price * (1 + sign * take_profit_pct))
+        tp = tp if sign * (tp - price) >= tick else _tick_round(price + sign * tick)
+    if stop_loss_pct:
+        sl = _tick_round(price * (1 - sign * stop_loss_pct))
+        sl = sl if sign * (price - sl) >= tick else _tick_round(price - sign * tick)
+    return tp, sl
+
 
-def place_market_order(client: TradingClient, symbol: str, side: str, qty: float):
+def place_market_order(
+    client: TradingClient,
+    symbol: str,
+    side: str,
+    qty: float,
+    *,
+    take_profit_pct: float | None = None,
+    stop_loss_pct: float | None = None,
+    price: float | None = None,
+):
+    """
+    Market entry. With take_profit_pct / stop_loss_pct and a reference
+    `price` the exits are attached broker-side in the same request: a
+    bracket order when both are set, OTO when only one is. Alpaca only
+    accepts those for whole-share quantities, so fractional orders (or a
+    missing price) go out as plain market orders.
+    """
+    legs: dict = {}
+    if (take_profit_pct or stop_loss_pct) and price and float(qty).is_integer():
+        tp, sl = exit_prices(side, price, take_profit_pct, stop_loss_pct)
+        legs["order_class"] = OrderClass.BRACKET if tp and sl else OrderClass.OTO
+        if tp:
+            legs["take_profit"] = TakeProfitRequest(limit_price=tp)
+        if sl:
+            legs["stop_loss"] = StopLossRequest(stop_price=sl)
     order = MarketOrderRequest(
         symbol=symbol,
         qty=qty,
         side=OrderSide.BUY if side == "buy" else OrderSide.SELL,
-        time_in_force=TimeInForce.DAY,
+        # bracket/OTO exits must outlive the day they were opened on
+        time_in_force=TimeInForce.GTC if legs else TimeInForce.DAY,
+        **legs,
     )
     return client.submit_order(order)
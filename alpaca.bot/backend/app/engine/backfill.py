@@ -0,0 +1,234 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Optional, Sequence
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import shutil
+import numpy as np
+from app.engine.massive_service import MassiveDataService
+
+logger = logging.getLogger(__name__)
+
+# Last axis of DailyMatrix.values, in this order.
+FIELDS: tuple[str, ...] = ("o", "h", "l", "c", "v", "vw")
+_PRICE_FIELDS = [FIELDS.index(f) for f in ("o", "h", "l", "c", "vw")]
+
+# Relative change in a saved adjusted close that means a split re-based the symbol
+_SPLIT_TOLERANCE = 1e-4
+
+
+@dataclass
+class DailyMatrix:
+    """
+    Dense daily history: values[symbol, date, field] with NaN where a symbol
+    did not trade (or was not listed) on a date.
+    """
+    symbols: np.ndarray          # (S,) str
+    dates: np.ndarray            # (D,) datetime64[D], ascending
+    values: np.ndarray           # (S, D, len(FIELDS)) float64
+
+    def field(self, name: str) -> np.ndarray:
+        """(S, D) view of one field, e.g. m.field("c") for closes."""
+        return self.values[:, :, FIELDS.index(name)]
+
+    def symbol_index(self) -> dict[str, int]:
+        return {str(s): i for i, s in enumerate(self.symbols)}
+
+    def rows(self, symbols: Sequence[str]) -> "DailyMatrix":
+        """Sub-matrix for `symbols` (unknown symbols become all-NaN rows)."""
+        idx = self.symbol_index()
+        out = np.full((len(symbols), len(self.dates), len(FIELDS)), np.nan)
+        for i, s in enumerate(symbols):
+            j = idx.get(s)
+            if j is not None:
+                out[i] = self.values[j]
+        return DailyMatrix(symbols=np.asarray(symbols, dtype=str), dates=self.dates, values=out)
+
+    # -----------------------
+    # Persistence
+    # -----------------------
+    def save(self, path: str | os.PathLike) -> None:
+        """
+        Save as a directory of .npy files so values can be memory-mapped on load.
+
+        The files are written to a temp directory next to `path` that then
+        replaces it, so a crash or a concurrent load never sees values,
+        dates and meta from different saves.
+        """
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f".{p.name}.{os.getpid()}.tmp")
+        old = p.with_name(f".{p.name}.{os.getpid()}.old")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        np.save(tmp / "values.npy", np.ascontiguousarray(self.values))
+        np.save(tmp / "dates.npy", self.dates.astype("datetime64[D]"))
+        (tmp / "meta.json").write_text(json.dumps({
+            "symbols": [str(s) for s in self.symbols],
+            "fields": list(FIELDS),
+        }))
+        # A directory can only be renamed onto a missing (or empty) one
+        if p.exists():
+            os.replace(p, old)
+        os.replace(tmp, p)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, *, mmap: bool = True) -> "DailyMatrix":
+        p = Path(path)
+        meta = json.loads((p / "meta.json").read_text())
+        if tuple(meta.get("fields", FIELDS)) != FIELDS:
+            raise ValueError(f"Unexpected field layout in {p}: {meta.get('fields')}")
+        m = cls(
+            symbols=np.asarray(meta["symbols"], dtype=str),
+            dates=np.load(p / "dates.npy"),
+            values=np.load(p / "values.npy", mmap_mode="r" if mmap else None),
+        )
+        if m.values.shape != (len(m.symbols), len(m.dates), len(FIELDS)):
+            raise ValueError(f"Inconsistent daily matrix in {p}: values {m.values.shape}")
+        return m
+
+
+def trading_dates(start: date, end: date) -> list[date]:
+    """
+    Weekdays in [start, end]. Exchange holidays come back empty from the API and are dropped.
+    """
+    out: list[date] = []
+    d = start
+    while d <= end:
+        if d.weekday() < 5:
+            out.append(d)
+        d += timedelta(days=1)
+    return out
+
+
+def backfill_daily_matrix(
+    svc: MassiveDataService,
+    start: date,
+    end: date,
+    *,
+    symbols: Optional[Sequence[str]] = None,
+    existing: Optional[DailyMatrix] = None,
+    adjusted: bool = True,
+    include_otc: bool = False,
+    max_workers: int = 8,
+) -> DailyMatrix:
+    """
+    Build a symbols x dates x OHLCV matrix from Grouped Daily results.
+
+    One request per trading date covers the whole market, so two years of
+    history is ~500 calls regardless of universe size. Dates are fetched in
+    parallel through svc.get_daily_market_summary (same retry/backoff).
+
+    - symbols: restrict/ordering of rows; default is every ticker seen.
+    - existing: previously saved matrix; its dates (except the newest) are not fetched again.
+      With adjusted data, one saved date is re-fetched to catch splits since
+      the last run, and the saved history of re-based symbols is rescaled.
+    """
+    if existing is not None and adjusted:
+        existing = rebase_splits(svc, existing, include_otc=include_otc)
+    have = set() if existing is None else {d.item() for d in existing.dates.astype("datetime64[D]")}
+    if have:
+        # The newest saved date may have been captured intraday; refresh it.
+        have.discard(max(have))
+    todo = [d for d in trading_dates(start, end) if d not in have]
+
+    def _one(d: date) -> tuple[date, list[dict[str, Any]]]:
+        return d, svc.get_daily_market_summary(
+            d.isoformat(), adjusted=adjusted, include_otc=include_otc
+        )
+
+    fetched: dict[date, list[dict[str, Any]]] = {}
+    if todo:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            for d, rows in ex.map(_one, todo):
+                if rows:  # empty => market holiday
+                    fetched[d] = rows
+    logger.info("daily backfill: fetched %d/%d dates (%d skipped as cached)",
+                len(fetched), len(todo), len(have))
+
+    fresh = _pivot(fetched, symbols)
+    if existing is None:
+        return fresh
+    return _merge(existing, fresh, symbols)
+
+
+def rebase_splits(svc: MassiveDataService, m: DailyMatrix, *, include_otc: bool = False) -> DailyMatrix:
+    """
+    Re-fetch one saved date (the second newest; the newest may be intraday)
+    and rescale every symbol whose adjusted close there changed: prices by
+    new / old, volume by old / new. Returns `m` itself when nothing moved.
+    """
+    if len(m.dates) < 2:
+        return m
+    probe = m.dates.astype("datetime64[D]")[-2].item()
+    rows = svc.get_daily_market_summary(probe.isoformat(), adjusted=True, include_otc=include_otc)
+    now = _pivot({probe: rows}, [str(s) for s in m.symbols]).field("c")[:, 0] if rows else None
+    if now is None:
+        return m
+
+    was = m.field("c")[:, -2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = now / was
+    moved = np.isfinite(factor) & (factor > 0) & (np.abs(factor - 1.0) > _SPLIT_TOLERANCE)
+    if not moved.any():
+        return m
+
+    logger.info("daily backfill: %d symbols re-based since the last save (splits), rescaling their history",
+                int(moved.sum()))
+    values = np.array(m.values)
+    f = factor[moved][:, None]
+    for k in _PRICE_FIELDS:
+        values[moved, :, k] *= f
+    values[moved, :, FIELDS.index("v")] /= f
+    return DailyMatrix(symbols=m.symbols, dates=m.dates, values=values)
+
+
+def _pivot(by_date: dict[date, list[dict[str, Any]]], symbols: Optional[Sequence[str]]) -> DailyMatrix:
+    dates = sorted(by_date)
+    if symbols is None:
+        seen: set[str] = set()
+        for rows in by_date.values():
+            seen.update(r.get("T") or r.get("ticker") for r in rows)
+        seen.discard(None)
+        symbols = sorted(seen)
+
+    sym_idx = {s: i for i, s in enumerate(symbols)}
+    values = np.full((len(symbols), len(dates), len(FIELDS)), np.nan)
+
+    for j, d in enumerate(dates):
+        rows_i: list[int] = []
+        rows_v: list[tuple[float, ...]] = []
+        for r in by_date[d]:
+            i = sym_idx.get(r.get("T") or r.get("ticker"))
+            if i is None:
+                continue
+            rows_i.append(i)
+            rows_v.append(tuple(_num(r.get(f)) for f in FIELDS))
+        if rows_i:
+            values[np.asarray(rows_i), j, :] = np.asarray(rows_v, dtype=float)
+
+    return DailyMatrix(
+        symbols=np.asarray(symbols, dtype=str),
+        dates=np.asarray(dates, dtype="datetime64[D]"),
+        values=values,
+    )
+
+
+def _merge(old: DailyMatrix, new: DailyMatrix, symbols: Optional[Sequence[str]]) -> DailyMatrix:
+    if symbols is None:
+        symbols = sorted(set(map(str, old.symbols)) | set(map(str, new.symbols)))
+    old, new = old.rows(symbols), new.rows(symbols)
+    dates = np.union1d(old.dates, new.dates)
+    values = np.full((len(symbols), len(dates), len(FIELDS)), np.nan)
+    values[:, np.searchsorted(dates, old.dates)] = old.values
+    values[:, np.searchsorted(dates, new.dates)] = new.values
+    return DailyMatrix(symbols=np.asarray(symbols, dtype=str), dates=dates, values=values)
+
+
+def _num(v: Any) -> float:
+    return np.nan if v is None else float(v)
@@ -0,0 +1,474 @@
+"""
+Vectorised backtests of StrategyBase subclasses over stored daily history.
+
+A strategy opts in by implementing StrategyBase.backtest_signals(data, params),
+which returns +1/-1/0 for every symbol and bar at once. The engine turns those
+into positions, applies take-profit / stop-loss and costs, and scores each
+parameter set on an equal-weight portfolio of all symbols.
+
+    data = BacktestData.from_daily_matrix(DailyMatrix.load(settings.daily_matrix_dir))
+    results = sweep(SmaCrossOverStrategy, data, {"fast": range(5, 105), "slow": range(10, 210, 2)})
+    best(results, "sharpe")
+
+CLI:
+    python -m app.engine.backtest cross_over --grid fast=5:105 --grid slow=10:210:2 --symbols 500
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import product
+from multiprocessing import shared_memory
+from typing import Any, Hashable, Iterable, Mapping, Optional, Sequence
+import argparse
+import logging
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+from app.engine.backfill import DailyMatrix
+from app.strategies.indicators import sma
+
+logger = logging.getLogger(__name__)
+
+TRADING_DAYS = 252
+
+# name -> fn(close, *params) returning a matrix shaped like close
+_INDICATORS = {
+    "sma": sma,
+}
+
+
+@dataclass
+class BacktestData:
+    """
+    Aligned close matrix (symbols x bars, oldest first, NaN where a symbol has
+    no bar) plus a memo of full-length indicator matrices, so a sweep
+    evaluating SMA(50) against 100 slow windows computes it once per process.
+    The memo is bounded by memo_bytes (least recently used entries go first).
+    """
+    symbols: np.ndarray          # (S,) str
+    dates: np.ndarray            # (T,) datetime64[D]
+    close: np.ndarray            # (S, T) float64
+    memo_bytes: int = 512 * 1024 * 1024
+    _memo: "OrderedDict[tuple[Hashable, ...], np.ndarray]" = field(default_factory=OrderedDict, repr=False)
+    _returns: Optional[np.ndarray] = field(default=None, repr=False)
+
+    @classmethod
+    def from_daily_matrix(
+        cls,
+        m: DailyMatrix,
+        *,
+        symbols: Optional[Sequence[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> "BacktestData":
+        if symbols is not None:
+            m = m.rows(symbols)
+        dates = m.dates.astype("datetime64[D]")
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return cls(
+            symbols=np.asarray(m.symbols, dtype=str),
+            dates=dates[lo:hi],
+            close=np.ascontiguousarray(m.field("c")[:, lo:hi], dtype=np.float64),
+        )
+
+    @property
+    def returns(self) -> np.ndarray:
+        """(S, T-1) close-to-close returns, 0 where either close is missing."""
+        if self._returns is None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                r = self.close[:, 1:] / self.close[:, :-1] - 1.0
+            self._returns = np.where(np.isfinite(r), r, 0.0)
+        return self._returns
+
+    def indicator(self, name: str, *params: Hashable) -> np.ndarray:
+        key = (name, *params)
+        out = self._memo.get(key)
+        if out is not None:
+            self._memo.move_to_end(key)
+            return out
+        out = _INDICATORS[name](self.close, *params)
+        self._memo[key] = out
+        used = sum(a.nbytes for a in self._memo.values())
+        while used > self.memo_bytes and len(self._memo) > 1:
+            used -= self._memo.popitem(last=False)[1].nbytes
+        return out
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Ship only the prices to worker processes, never the memo.
+        return {"symbols": self.symbols, "dates": self.dates, "close": self.close, "memo_bytes": self.memo_bytes}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._memo = OrderedDict()
+        self._returns = None
+
+
+class SharedPrices:
+    """
+    Picklable handle to a BacktestData whose close and return matrices live
+    in one multiprocessing.shared_memory block. Workers attach() to it and
+    read the same pages as the parent, so memory stays flat as the pool grows.
+
+        with SharedPrices.create(data) as shared:
+            ProcessPoolExecutor(initializer=..., initargs=(shared,))
+    """
+
+    def __init__(self, name: str, shape: tuple[int, int], symbols: np.ndarray, dates: np.ndarray):
+        self.name = name
+        self.shape = shape
+        self.symbols = symbols
+        self.dates = dates
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._owner = False
+
+    @classmethod
+    def create(cls, data: BacktestData) -> "SharedPrices":
+        S, T = data.close.shape
+        nbytes = max(1, (S * T + S * max(T - 1, 0)) * 8)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        out = cls(shm.name, (S, T), data.symbols, data.dates)
+        out._shm, out._owner = shm, True
+        close, returns = out._views(shm)
+        close[:] = data.close
+        returns[:] = data.returns
+        return out
+
+    def _views(self, shm: shared_memory.SharedMemory) -> tuple[np.ndarray, np.ndarray]:
+        S, T = self.shape
+        close = np.ndarray((S, T), dtype=np.float64, buffer=shm.buf)
+        returns = np.ndarray((S, max(T - 1, 0)), dtype=np.float64, buffer=shm.buf, offset=S * T * 8)
+        return close, returns
+
+    def attach(self, *, memo_bytes: int = 256 * 1024 * 1024) -> BacktestData:
+        """Zero-copy BacktestData over the shared block (read-only views)."""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        close, returns = self._views(self._shm)
+        close.flags.writeable = False
+        returns.flags.writeable = False
+        data = BacktestData(symbols=self.symbols, dates=self.dates, close=close, memo_bytes=memo_bytes)
+        data._returns = returns
+        data._shared = self  # type: ignore[attr-defined]  # keeps the mapping alive
+        return data
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        shm.close()
+        if self._owner:
+            shm.unlink()
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {"name": self.name, "shape": self.shape, "symbols": self.symbols, "dates": self.dates}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(**state)
+
+    def __enter__(self) -> "SharedPrices":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+# -----------------------
+# Simulation
+# -----------------------
+def positions(
+    signals: np.ndarray,
+    close: np.ndarray,
+    *,
+    take_profit_pct: Optional[float] = None,
+    stop_loss_pct: Optional[float] = None,
+    allow_short: bool = False,
+) -> np.ndarray:
+    """
+    Position held at the close of each bar (+1 long, -1 short, 0 flat).
+
+    A buy signal goes long, a sell signal exits (or goes short when
+    allow_short). Without take-profit / stop-loss the position is just the
+    last signal carried forward, computed for all symbols at once. With them,
+    exits depend on the entry price, so bars are walked in order (still
+    vectorised across symbols); exits are checked on closes only.
+    """
+    S, T = signals.shape
+    if not take_profit_pct and not stop_loss_pct:
+        cols = np.where(signals != 0, np.arange(T, dtype=np.int32), np.int32(0))
+        np.maximum.accumulate(cols, axis=1, out=cols)
+        pos = np.take_along_axis(signals, cols, axis=1)
+        return pos if allow_short else np.maximum(pos, 0)
+
+    tp = float(take_profit_pct or 0.0)
+    sl = float(stop_loss_pct or 0.0)
+    out = np.zeros((S, T), dtype=np.int8)
+    pos = np.zeros(S, dtype=np.int8)
+    entry = np.full(S, np.nan)
+    for t in range(T):
+        c = close[:, t]
+        move = c / entry - 1.0
+        with np.errstate(invalid="ignore"):
+            exit_ = np.zeros(S, dtype=bool)
+            if tp:
+                exit_ |= ((pos > 0) & (move >= tp)) | ((pos < 0) & (move <= -tp))
+            if sl:
+                exit_ |= ((pos > 0) & (move <= -sl)) | ((pos < 0) & (move >= sl))
+        pos[exit_] = 0
+
+        s = signals[:, t]
+        new = np.where(s > 0, 1, -1 if allow_short else 0).astype(np.int8)
+        change = (s != 0) & (new != pos)
+        pos[change] = new[change]
+        entry[change] = c[change]
+        out[:, t] = pos
+    return out
+
+
+def evaluate(
+    pos: np.ndarray,
+    close: np.ndarray,
+    *,
+    cost_bps: float = 0.0,
+    returns: Optional[np.ndarray] = None,
+) -> dict[str, float]:
+    """
+    Score positions on an equal-weight portfolio: capital is split evenly
+    across symbols, a position earns its symbol's next-bar return, idle
+    capital earns nothing, and every change in position pays cost_bps.
+    Pass BacktestData.returns as `returns` to skip recomputing them.
+    """
+    S, T = close.shape
+    if T < 2 or S == 0:
+        return {"total_return": 0.0, "cagr": 0.0, "max_drawdown": 0.0, "sharpe": 0.0, "trades": 0, "exposure": 0.0}
+
+    if returns is None:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = close[:, 1:] / close[:, :-1] - 1.0
+        returns = np.where(np.isfinite(returns), returns, 0.0)
+    held = pos[:, :-1]
+    # Sum over symbols per bar without materialising a float (S, T-1) copy of held
+    port = np.einsum("st,st->t", held, returns, dtype=np.float64) / S
+
+    step = np.diff(pos, axis=1, prepend=np.int8(0))
+    if cost_bps:
+        port -= np.abs(step[:, :-1]).sum(axis=0) * (cost_bps / 1e4) / S
+
+    equity = np.cumprod(1.0 + port)
+    peak = np.maximum.accumulate(equity)
+    max_dd = float(np.max(1.0 - equity / peak))
+    total = float(equity[-1] - 1.0)
+    years = (T - 1) / TRADING_DAYS
+    sd = float(port.std())
+
+    return {
+        "total_return": total,
+        "cagr": float((1.0 + total) ** (1.0 / years) - 1.0) if years > 0 and total > -1 else 0.0,
+        "max_drawdown": max_dd,
+        "sharpe": float(port.mean() / sd * math.sqrt(TRADING_DAYS)) if sd > 0 else 0.0,
+        "trades": int(np.count_nonzero((step != 0) & (pos != 0))),
+        "exposure": float(np.count_nonzero(held) / held.size),
+    }
+
+
+def score(
+    sig: np.ndarray,
+    data: BacktestData,
+    params: Mapping[str, Any],
+    *,
+    lo: int = 0,
+    hi: Optional[int] = None,
+    cost_bps: float = 0.0,
+    allow_short: bool = False,
+) -> dict[str, float]:
+    """
+    Metrics for precomputed signals over bars [lo, hi). Signals come from the
+    full history, so indicators are already warm at `lo`; positions start flat.
+    """
+    hi = data.close.shape[1] if hi is None else hi
+    close = data.close[:, lo:hi]
+    pos = positions(
+        sig[:, lo:hi],
+        close,
+        take_profit_pct=params.get("take_profit_pct"),
+        stop_loss_pct=params.get("stop_loss_pct"),
+        allow_short=allow_short,
+    )
+    return evaluate(pos, close, cost_bps=cost_bps, returns=data.returns[:, lo:max(lo, hi - 1)])
+
+
+def run_backtest(
+    strategy_cls: type,
+    data: BacktestData,
+    params: Mapping[str, Any],
+    *,
+    cost_bps: float = 0.0,
+    allow_short: bool = False,
+) -> Optional[dict[str, float]]:
+    """
+    Metrics for one parameter set, or None if the strategy rejects it.
+    take_profit_pct / stop_loss_pct are read from params like the live strategy does.
+    """
+    sig = strategy_cls.backtest_signals(data, dict(params))
+    if sig is None:
+        return None
+    return score(sig, data, params, cost_bps=cost_bps, allow_short=allow_short)
+
+
+# -----------------------
+# Sweeps
+# -----------------------
+def param_grid(grid: Mapping[str, Iterable[Any]], base: Optional[Mapping[str, Any]] = None) -> list[dict[str, Any]]:
+    """
+    Cartesian product of `grid`, in order (the first key varies slowest, so
+    neighbouring sets share indicator values), each merged over `base`.
+    """
+    keys = list(grid)
+    return [{**(base or {}), **dict(zip(keys, vals))} for vals in product(*(list(grid[k]) for k in keys))]
+
+
+_worker: dict[str, Any] = {}
+
+
+def _init_worker(strategy_cls: type, data: BacktestData | SharedPrices, kwargs: dict[str, Any]) -> None:
+    if isinstance(data, SharedPrices):
+        data = data.attach()
+    _worker.update(strategy_cls=strategy_cls, data=data, kwargs=kwargs)
+
+
+def pool_size(workers: Optional[int]) -> int:
+    """
+    Processes for a sweep: `workers`, else one per CPU. A daemonic process
+    (e.g. a Celery prefork child) may not start children, so there it is
+    always 1; run optimisation tasks on a solo or threads worker to use
+    every core.
+    """
+    if multiprocessing.current_process().daemon:
+        if workers and workers > 1:
+            logger.warning("running in a daemonic process: ignoring workers=%d, sweeping in-process", workers)
+        return 1
+    return workers or os.cpu_count() or 1
+
+
+def _run_chunk(chunk: list[dict[str, Any]]) -> list[Optional[dict[str, float]]]:
+    return [run_backtest(_worker["strategy_cls"], _worker["data"], p, **_worker["kwargs"]) for p in chunk]
+
+
+def sweep(
+    strategy_cls: type,
+    data: BacktestData,
+    grid: Mapping[str, Iterable[Any]],
+    *,
+    base_params: Optional[Mapping[str, Any]] = None,
+    workers: Optional[int] = None,
+    cost_bps: float = 0.0,
+    allow_short: bool = False,
+) -> list[dict[str, Any]]:
+    """
+    Backtest every parameter set in `grid` and return
+    [{"params": {...}, **metrics}, ...] in grid order (rejected sets omitted).
+
+    The grid is cut into contiguous chunks so each worker reuses indicator
+    matrices across neighbouring sets; prices are shared with the workers
+    through SharedPrices rather than copied. workers=1 runs in-process
+(always the case inside a daemonic worker, see pool_size).
+    """
+    sets = param_grid(grid, base_params)
+    kwargs = {"cost_bps": cost_bps, "allow_short": allow_short}
+    workers = pool_size(workers)
+
+    t0 = time.perf_counter()
+    if workers <= 1 or len(sets) < 2:
+        _init_worker(strategy_cls, data, kwargs)
+        metrics = _run_chunk(sets)
+    else:
+        n_chunks = min(len(sets), workers * 4)
+        size = -(-len(sets) // n_chunks)
+        chunks = [sets[i:i + size] for i in range(0, len(sets), size)]
+        with SharedPrices.create(data) as shared, ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(strategy_cls, shared, kwargs),
+        ) as pool:
+            metrics = [m for part in pool.map(_run_chunk, chunks) for m in part]
+
+    out = [{"params": p, **m} for p, m in zip(sets, metrics) if m is not None]
+    logger.info(
+        "backtest sweep: %d sets (%d evaluated) over %d symbols x %d bars in %.2fs",
+        len(sets), len(out), *data.close.shape, time.perf_counter() - t0,
+    )
+    return out
+
+
+def best(results: Sequence[dict[str, Any]], key: str = "sharpe", *, min_trades: int = 1) -> Optional[dict[str, Any]]:
+    """Highest `key` among results with at least min_trades trades."""
+    ok = [r for r in results if r["trades"] >= min_trades and np.isfinite(r[key])]
+    return max(ok, key=lambda r: r[key]) if ok else None
+
+
+# -----------------------
+# CLI
+# -----------------------
+def _parse_grid(items: list[str]) -> dict[str, list[Any]]:
+    """name=start:stop[:step] (ints or floats) or name=a,b,c."""
+    grid: dict[str, list[Any]] = {}
+    for item in items:
+        name, _, spec = item.partition("=")
+        num = float if any(c in spec for c in ".eE") else int
+        if ":" in spec:
+            parts = [num(x) for x in spec.split(":")]
+            grid[name] = np.arange(*parts).tolist()
+        else:
+            grid[name] = [num(x) for x in spec.split(",")]
+    return grid
+
+
+def main(argv: list[str] | None = None) -> None:
+    from app.core.config import settings
+    from app.strategies.registry import STRATEGY_TYPES as types
+
+    ap = argparse.ArgumentParser(prog="python -m app.engine.backtest")
+    ap.add_argument("strategy", choices=sorted(types))
+    ap.add_argument("--matrix", default=settings.daily_matrix_dir)
+    ap.add_argument("--grid", action="append", default=[], help="e.g. fast=5:105 or stop_loss_pct=0.01,0.02")
+    ap.add_argument("--symbols", default="", help="comma list, or N for the first N symbols")
+    ap.add_argument("--start")
+    ap.add_argument("--end")
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--cost-bps", type=float, default=0.0)
+    ap.add_argument("--short", action="store_true")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--sort", default="sharpe")
+    args = ap.parse_args(argv)
+
+    m = DailyMatrix.load(args.matrix)
+    symbols: Optional[list[str]] = None
+    if args.symbols.isdigit():
+        symbols = [str(s) for s in m.symbols[: int(args.symbols)]]
+    elif args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    data = BacktestData.from_daily_matrix(m, symbols=symbols, start=args.start, end=args.end)
+
+    t0 = time.perf_counter()
+    results = sweep(
+        types[args.strategy],
+        data,
+        _parse_grid(args.grid),
+        workers=args.workers or None,
+        cost_bps=args.cost_bps,
+        allow_short=args.short,
+    )
+    dt = time.perf_counter() - t0
+    print(f"{len(results)} parameter sets over {data.close.shape[0]} symbols x {data.close.shape[1]} bars in {dt:.2f}s")
+    for r in sorted(results, key=lambda r: r[args.sort], reverse=True)[: args.top]:
+        print(
+            f"{r['params']}  return={r['total_return']:+.2%} maxdd={r['max_drawdown']:.2%} "
+            f"sharpe={r['sharpe']:.2f} trades={r['trades']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Iterable
+import json
+import os
+import numpy as np
+
+# One fixed-size record per bar. Missing vwap is stored as NaN, missing
+# transaction count as -1 so the file stays a flat, memory-mappable array.
+BAR_DTYPE = np.dtype([
+    ("t", "<i8"),
+    ("o", "<f8"),
+    ("h", "<f8"),
+    ("l", "<f8"),
+    ("c", "<f8"),
+    ("v", "<f8"),
+    ("vw", "<f8"),
+    ("n", "<i8"),
+])
+
+Range = tuple[int, int]
+
+
+def merge_ranges(ranges: Iterable[Range]) -> list[Range]:
+    """
+    Merge overlapping / adjacent inclusive [lo, hi] millisecond ranges.
+    """
+    out: list[list[int]] = []
+    for lo, hi in sorted((int(a), int(b)) for a, b in ranges if b >= a):
+        if out and lo <= out[-1][1] + 1:
+            out[-1][1] = max(out[-1][1], hi)
+        else:
+            out.append([lo, hi])
+    return [(a, b) for a, b in out]
+
+
+def subtract_ranges(lo: int, hi: int, covered: Iterable[Range]) -> list[Range]:
+    """
+    Parts of [lo, hi] that are NOT inside any covered range.
+    """
+    gaps: list[Range] = []
+    cur = lo
+    for a, b in merge_ranges(covered):
+        if b < cur:
+            continue
+        if a > hi:
+            break
+        if a > cur:
+            gaps.append((cur, a - 1))
+        cur = max(cur, b + 1)
+        if cur > hi:
+            break
+    if cur <= hi:
+        gaps.append((cur, hi))
+    return gaps
+
+
+class BarStore:
+    """
+    Persistent, append-only bar cache on local disk.
+
+    Layout (one directory per timespan/multiplier):
+        {root}/{timespan}_{multiplier}/{SYMBOL}.bars   raw BAR_DTYPE records sorted by t
+        {root}/{timespan}_{multiplier}/{SYMBOL}.json   {"ranges": [[lo_ms, hi_ms], ...]}
+
+    The .bars file is read through np.memmap, so serving a cached range is a
+    binary search plus a slice. New bars past the end are appended in place;
+    filling a hole in the middle rewrites the file atomically.
+
+    The .json sidecar records which time ranges have been fetched from the API
+    (a range can be "covered" and still hold no bars, e.g. weekends). Writers
+    in different processes are not locked against each other; a lost update
+    only costs a re-fetch of that range.
+
+    publish_lag_s is how long after a bar closes the API may still not serve
+    it (delayed or end-of-day plans); get_ohlc never marks that window as
+    covered, so those bars are fetched again until they show up.
+    """
+
+    def __init__(self, root: str | os.PathLike, *, publish_lag_s: float = 900.0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.publish_lag_s = publish_lag_s
+
+    # -----------------------
+    # Paths
+    # -----------------------
+    def _dir(self, multiplier: int, timespan: str) -> Path:
+        d = self.root / f"{timespan}_{int(multiplier)}"
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+
+    def _bars_path(self, symbol: str, multiplier: int, timespan: str) -> Path:
+        return self._dir(multiplier, timespan) / f"{symbol.upper()}.bars"
+
+    def _meta_path(self, symbol: str, multiplier: int, timespan: str) -> Path:
+        return self._dir(multiplier, timespan) / f"{symbol.upper()}.json"
+
+    # -----------------------
+    # Coverage
+    # -----------------------
+    def covered(self, symbol: str, multiplier: int, timespan: str) -> list[Range]:
+        p = self._meta_path(symbol, multiplier, timespan)
+        if not p.exists():
+            return []
+        try:
+            meta = json.loads(p.read_text())
+            return merge_ranges(tuple(r) for r in meta.get("ranges", []))
+        except Exception:
+            # A corrupt sidecar just means we re-fetch.
+            return []
+
+    def missing(self, symbol: str, multiplier: int, timespan: str, lo: int, hi: int) -> list[Range]:
+        """
+        Sub-ranges of [lo, hi] (ms, inclusive) that still have to be fetched.
+        """
+        return subtract_ranges(lo, hi, self.covered(symbol, multiplier, timespan))
+
+    def _write_covered(self, symbol: str, multiplier: int, timespan: str, ranges: list[Range]) -> None:
+        p = self._meta_path(symbol, multiplier, timespan)
+        tmp = p.with_suffix(f".json.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps({"ranges": [list(r) for r in merge_ranges(ranges)]}))
+        os.replace(tmp, p)
+
+    # -----------------------
+    # Read / write
+    # -----------------------
+    def _load(self, symbol: str, multiplier: int, timespan: str) -> np.ndarray:
+        p = self._bars_path(symbol, multiplier, timespan)
+        if not p.exists() or p.stat().st_size < BAR_DTYPE.itemsize:
+            return np.empty(0, dtype=BAR_DTYPE)
+        n = p.stat().st_size // BAR_DTYPE.itemsize
+        return np.memmap(p, dtype=BAR_DTYPE, mode="r", shape=(n,))
+
+    def read(self, symbol: str, multiplier: int, timespan: str, lo: int, hi: int) -> np.ndarray:
+        """
+        Records with lo <= t <= hi. Returns a copy so callers never hold the mmap open.
+        """
+        arr = self._load(symbol, multiplier, timespan)
+        if len(arr) == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        t = arr["t"]
+        i = int(np.searchsorted(t, lo, side="left"))
+        j = int(np.searchsorted(t, hi, side="right"))
+        return np.array(arr[i:j])
+
+    def last_before(self, symbol: str, multiplier: int, timespan: str, t_max: int) -> np.ndarray | None:
+        """The newest stored record with t <= t_max (a copy), or None."""
+        arr = self._load(symbol, multiplier, timespan)
+        i = int(np.searchsorted(arr["t"], t_max, side="right")) if len(arr) else 0
+        return np.array(arr[i - 1]) if i else None
+
+    def reset(self, symbol: str, multiplier: int, timespan: str) -> None:
+        """Forget everything stored for symbol (bars and coverage)."""
+        for p in (self._bars_path(symbol, multiplier, timespan), self._meta_path(symbol, multiplier, timespan)):
+            p.unlink(missing_ok=True)
+
+    def write(
+        self,
+        symbol: str,
+        multiplier: int,
+        timespan: str,
+        records: np.ndarray,
+        *,
+        covered: Range | None = None,
+    ) -> None:
+        """
+        Merge `records` into the store and optionally mark `covered` as fetched.
+
+        Records newer than everything on disk are appended; anything else
+        (hole fill, re-fetch of the last in-progress bar) rewrites the file,
+        keeping the newest copy of each timestamp.
+        """
+        records = np.asarray(records, dtype=BAR_DTYPE)
+        if len(records):
+            records = np.sort(records, order="t", kind="stable")
+            p = self._bars_path(symbol, multiplier, timespan)
+            existing = self._load(symbol, multiplier, timespan)
+
+            if len(existing) == 0 or records["t"][0] > existing["t"][-1]:
+                with open(p, "ab") as f:
+                    f.write(_dedupe_last(records).tobytes())
+            else:
+                merged = _dedupe_last(np.concatenate([np.array(existing), records]))
+                del existing
+                tmp = p.with_suffix(f".bars.{os.getpid()}.tmp")
+                with open(tmp, "wb") as f:
+                    f.write(merged.tobytes())
+                os.replace(tmp, p)
+
+        if covered is not None and covered[1] >= covered[0]:
+            ranges = self.covered(symbol, multiplier, timespan)
+            ranges.append(covered)
+            self._write_covered(symbol, multiplier, timespan, ranges)
+
+
+def _dedupe_last(records: np.ndarray) -> np.ndarray:
+    """
+    Sort by t and keep the LAST occurrence of every timestamp (newest fetch wins).
+    """
+    if len(records) < 2:
+        return records
+    records = np.sort(records, order="t", kind="stable")
+    t = records["t"]
+    keep = np.ones(len(records), dtype=bool)
+    keep[:-1] = t[1:] != t[:-1]
+    return records[keep]
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from array import array
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator, Sequence
+import numpy as np
+from app.engine.bar_store import BAR_DTYPE
+
+
+@dataclass
+class AggBar:
+    t: int
+    o: float
+    h: float
+    l: float
+    c: float
+    v: float
+    vw: float | None = None
+    n: int | None = None
+
+
+# Column name in BarSeries -> (attribute names on massive Agg objects, array typecode)
+_AGG_FIELDS: dict[str, tuple[tuple[str, ...], str]] = {
+    "t": (("timestamp", "t"), "q"),
+    "o": (("open", "o"), "d"),
+    "h": (("high", "h"), "d"),
+    "l": (("low", "l"), "d"),
+    "c": (("close", "c"), "d"),
+    "v": (("volume", "v"), "d"),
+    "vw": (("vwap", "vw"), "d"),
+    "n": (("transactions", "n"), "q"),
+}
+
+COLUMNS: tuple[str, ...] = tuple(_AGG_FIELDS)
+
+# Names used by the DataFrame helpers (matches the old get_ohlc_many_df output)
+DF_COLUMNS = {
+    "t": "t",
+    "o": "open",
+    "h": "high",
+    "l": "low",
+    "c": "close",
+    "v": "volume",
+    "vw": "vwap",
+    "n": "transactions",
+}
+
+
+@dataclass
+class BarSeries:
+    """
+    Columnar bars for one symbol: one contiguous NumPy array per field.
+
+    Missing prices, volume and vwap are NaN and a missing transaction count
+    is -1 (same convention as the on-disk BarStore). Indexing with an int returns an AggBar and
+    iteration yields AggBars, so code written against list[AggBar] keeps
+    working; new code should use the arrays directly.
+    """
+    t: np.ndarray    # int64 epoch ms
+    o: np.ndarray    # float64
+    h: np.ndarray
+    l: np.ndarray
+    c: np.ndarray
+    v: np.ndarray
+    vw: np.ndarray
+    n: np.ndarray    # int64
+
+    # -----------------------
+    # Construction
+    # -----------------------
+    @classmethod
+    def empty(cls) -> "BarSeries":
+        return cls(**{
+            k: np.empty(0, dtype=np.int64 if code == "q" else np.float64)
+            for k, (_, code) in _AGG_FIELDS.items()
+        })
+
+    @classmethod
+    def from_aggs(cls, aggs: Iterable[Any]) -> "BarSeries":
+        """
+        Fill from RESTClient.list_aggs() in one pass. Attribute names are
+        resolved once from the first object, and values are appended to typed
+        buffers that NumPy then wraps without copying.
+        """
+        it = iter(aggs)
+        first = next(it, None)
+        if first is None:
+            return cls.empty()
+
+        names: dict[str, str | None] = {}
+        for k, (attrs, _) in _AGG_FIELDS.items():
+            names[k] = next((a for a in attrs if hasattr(first, a)), None)
+
+        bufs = {k: array(code) for k, (_, code) in _AGG_FIELDS.items()}
+        # A missing price must not read as a real 0.0 (it would drag SMAs/backtests)
+        fill = {k: float("nan") if code == "d" else 0 for k, (_, code) in _AGG_FIELDS.items()}
+        fill["n"] = -1
+        cols = [(bufs[k].append, names[k], fill[k]) for k in COLUMNS]
+
+        def _push(a: Any) -> None:
+            for append, name, missing in cols:
+                val = getattr(a, name, None) if name else None
+                append(missing if val is None else val)
+
+        _push(first)
+        for a in it:
+            _push(a)
+
+        return cls(**{
+            k: np.frombuffer(bufs[k], dtype=np.int64 if code == "q" else np.float64)
+            for k, (_, code) in _AGG_FIELDS.items()
+        })
+
+    @classmethod
+    def from_records(cls, rec: np.ndarray) -> "BarSeries":
+        """From BAR_DTYPE records (e.g. BarStore.read); copies each field once into its own array."""
+        return cls(**{k: np.ascontiguousarray(rec[k]) for k in COLUMNS})
+
+    @classmethod
+    def concat(cls, parts: Sequence["BarSeries"]) -> "BarSeries":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        return cls(**{k: np.concatenate([getattr(p, k) for p in parts]) for k in COLUMNS})
+
+    # -----------------------
+    # Sequence-ish access
+    # -----------------------
+    def __len__(self) -> int:
+        return len(self.t)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return BarSeries(**{k: getattr(self, k)[idx] for k in COLUMNS})
+        vw = float(self.vw[idx])
+        n = int(self.n[idx])
+        return AggBar(
+            t=int(self.t[idx]),
+            o=float(self.o[idx]),
+            h=float(self.h[idx]),
+            l=float(self.l[idx]),
+            c=float(self.c[idx]),
+            v=float(self.v[idx]),
+            vw=None if vw != vw else vw,
+            n=None if n < 0 else n,
+        )
+
+    def __iter__(self) -> Iterator[AggBar]:
+        for i in range(len(self)):
+            yield self[i]
+
+    # -----------------------
+    # Conversion
+    # -----------------------
+    def to_records(self) -> np.ndarray:
+        rec = np.empty(len(self), dtype=BAR_DTYPE)
+        for k in COLUMNS:
+            rec[k] = getattr(self, k)
+        return rec
+
+    def to_pandas(self, symbol: str | None = None):
+        """
+        DataFrame with the get_ohlc_many_df column names. Columns wrap the
+        existing arrays (copy=False) instead of going through per-row dicts.
+        """
+        import pandas as pd  # type: ignore
+
+        data: dict[str, Any] = {}
+        if symbol is not None:
+            data["symbol"] = np.full(len(self), symbol, dtype=object)
+        for k in COLUMNS:
+            data[DF_COLUMNS[k]] = getattr(self, k)
+        return pd.DataFrame(data, copy=False)
+
+    def to_arrow(self, symbol: str | None = None):
+        """pyarrow.Table sharing the NumPy buffers (pyarrow is optional)."""
+        import pyarrow as pa  # type: ignore
+
+        data: dict[str, Any] = {}
+        if symbol is not None:
+            data["symbol"] = pa.DictionaryArray.from_arrays(np.zeros(len(self), dtype=np.int32), [symbol])
+        for k in COLUMNS:
+            data[DF_COLUMNS[k]] = pa.array(getattr(self, k))
+        return pa.table(data)
@@ -0,0 +1,157 @@
+"""
+Offline data-path benchmarks against a recorded fixture (see app.engine.fixtures).
+
+    python -m app.engine.bench snapshot fixtures/tick.jsonl.gz --symbols AAPL,MSFT --latency-ms 40 --rate-429 0.02
+    python -m app.engine.bench backfill fixtures/daily.jsonl.gz --start 2024-01-01 --end 2024-12-31
+    python -m app.engine.bench ohlc fixtures/ohlc.jsonl.gz --symbols AAPL,MSFT --from 2024-01-01 --to 2024-06-30
+    python -m app.engine.bench orders fixtures/tick.jsonl.gz --symbols AAPL,MSFT --orders 200 --latency-ms 30 --partial-rate 0.1
+
+"orders" fills signals on the local simulated broker (app.engine.sim_broker)
+priced from the fixture, and reports the risk-check cost, order throughput
+and signal-to-fill latency.
+"""
+from __future__ import annotations
+from datetime import date
+import argparse
+import random
+import statistics
+import time
+from app.engine.fixtures import replay_service
+from app.engine.backfill import backfill_daily_matrix
+from app.engine.execution import execute_signals
+from app.engine.portfolio import PortfolioCache
+from app.engine.risk import RiskLimits, apply_risk
+from app.engine.sim_broker import PriceTape, SimTradingClient
+from app.strategies.base import Signal
+
+
+def _report(name: str, times: list[float], svc, extra: str = "") -> None:
+    http, aggs = svc._http.sim, svc.client.sim
+    print(
+        f"{name}: runs={len(times)} "
+        f"p50={statistics.median(times) * 1000:.1f}ms "
+        f"max={max(times) * 1000:.1f}ms "
+        f"requests={http.requests + aggs.requests} injected_429={http.injected_429} {extra}".rstrip()
+    )
+
+
+def _pct(xs: list[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))] if xs else 0.0
+
+
+def bench_orders(args: argparse.Namespace, symbols: list[str]) -> None:
+    tape = PriceTape.from_snapshot_fixture(args.fixture, symbols, frames=args.repeat)
+    client = SimTradingClient(
+        tape,
+        latency_s=args.latency_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        partial_rate=args.partial_rate,
+        reject_rate=args.reject_rate,
+        seed=args.seed,
+    )
+    rng = random.Random(args.seed)
+    priced = [s for s in symbols if tape.price(s)]
+    limits = RiskLimits(max_position_qty=1e9, max_orders_per_run=args.orders)
+
+    # Completion time of each submission, for signal-to-fill latency
+    filled_at: list[float] = []
+    submit = client.submit_order
+
+    def _timed_submit(order):
+        o = submit(order)
+        filled_at.append(time.perf_counter())
+        return o
+
+    client.submit_order = _timed_submit  # type: ignore[method-assign]
+
+    risk_ms, wall, to_fill = [], [], []
+    for _ in range(args.repeat):
+        signals = [
+            Signal(symbol=rng.choice(priced), side=rng.choice(("buy", "sell")), qty=rng.randint(1, 10), reason="bench")
+            for _ in range(args.orders)
+        ]
+        portfolio = PortfolioCache()
+        portfolio.reconcile(client)
+        prices = tape.prices()
+
+        t0 = time.perf_counter()
+        accepted, _ = apply_risk(signals, limits, portfolio=portfolio, prices=prices)
+        risk_ms.append((time.perf_counter() - t0) * 1000)
+
+        filled_at.clear()
+        t0 = time.perf_counter()
+        execute_signals(
+            accepted, risk=limits, client=client, max_concurrency=args.workers,
+            rate_limiter=None, portfolio=portfolio, prices=prices,
+        )
+        wall.append(time.perf_counter() - t0)
+        to_fill.extend((t - t0) * 1000 for t in filled_at)
+        tape.advance()
+
+    st = client.stats()
+    print(
+        f"orders: runs={len(wall)} orders/run={args.orders} "
+        f"risk_p50={statistics.median(risk_ms):.2f}ms "
+        f"throughput={args.orders * len(wall) / sum(wall):.0f}/s "
+        f"signal_to_fill_p50={_pct(to_fill, 0.5):.1f}ms p99={_pct(to_fill, 0.99):.1f}ms "
+        f"filled={st['filled']} partial={st['partially_filled']} rejected={st['rejected']}"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m app.engine.bench")
+    ap.add_argument("mode", choices=["snapshot", "backfill", "ohlc", "orders"])
+    ap.add_argument("fixture")
+    ap.add_argument("--symbols", default="")
+    ap.add_argument("--start")
+    ap.add_argument("--end")
+    ap.add_argument("--from", dest="from_")
+    ap.add_argument("--to")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--orders", type=int, default=100)
+    ap.add_argument("--partial-rate", type=float, default=0.0)
+    ap.add_argument("--reject-rate", type=float, default=0.0)
+    args = ap.parse_args(argv)
+
+    if args.mode == "orders":
+        bench_orders(args, [s for s in args.symbols.split(",") if s])
+        return
+
+    svc = replay_service(
+        args.fixture,
+        latency_s=args.latency_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        rate_429=args.rate_429,
+        seed=args.seed,
+        backoff_base_s=0.0,
+        backoff_jitter_s=0.0,
+    )
+    symbols = [s for s in args.symbols.split(",") if s]
+    times: list[float] = []
+    rows = 0
+
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        if args.mode == "snapshot":
+            rows = len(svc.get_market_snapshot(symbols or None, max_workers=args.workers))
+        elif args.mode == "backfill":
+            m = backfill_daily_matrix(
+                svc, date.fromisoformat(args.start), date.fromisoformat(args.end), max_workers=args.workers
+            )
+            rows = int(m.values.shape[0] * m.values.shape[1])
+        else:
+            data = svc.get_ohlc_many(symbols, from_=args.from_, to=args.to, max_workers=args.workers)
+            rows = sum(len(b) for b in data.values())
+        times.append(time.perf_counter() - t0)
+
+    _report(args.mode, times, svc, f"rows={rows}")
+
+
+if __name__ == "__main__":
+    main()
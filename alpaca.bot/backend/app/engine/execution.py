@@ -1,24 +1,134 @@
 from __future__ import annotations
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Mapping, Optional
+import logging
+import time
+from app.core.config import settings
 from app.engine.alpaca_client import get_trading_client, place_market_order
-from app.engine.risk import RiskLimits, validate_signal
-
-def execute_signals(signals, *, risk: RiskLimits) -> list[dict[str, Any]]:
-    client = get_trading_client()
-    orders: list[dict[str, Any]] = []
-
-    for i, s in enumerate(signals):
-        if i >= risk.max_orders_per_run:
-            break
-        validate_signal(s, risk)
-
-        o = place_market_order(client, s.symbol, s.side, s.qty)
-        orders.append({
-            "id": str(o.id),
-            "symbol": s.symbol,
-            "side": s.side,
-            "qty": s.qty,
-            "reason": s.reason,
-        })
-
-    return orders
+from app.engine.massive_service import MassiveDataService, SnapshotQuote
+from app.engine.rate_limit import RedisTokenBucket, get_alpaca_rate_limiter, get_massive_rate_limiter
+from app.engine.snapshot_cache import get_snapshot_cache
+from app.engine.risk import RiskLimits, apply_risk
+
+logger = logging.getLogger(__name__)
+
+_UNSET: Any = object()
+
+
+def execute_signals(
+    signals,
+    *,
+    risk: RiskLimits,
+    client: Any = None,
+    max_concurrency: Optional[int] = None,
+    rate_limiter: Optional[RedisTokenBucket] = _UNSET,
+    portfolio: Any = None,
+    prices: Optional[Mapping[str, Optional[float]]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Validate signals against `risk`, then submit them as market orders.
+
+    Orders go out concurrently (up to max_concurrency, default
+    settings.order_concurrency) on the worker's shared TradingClient, each
+    taking a token from the account-wide Alpaca limiter first, so a burst
+    leaves in about one round-trip while staying under the broker limit.
+    max_concurrency=1 submits one at a time.
+
+    Results keep signal order. Each has submit_ms (HTTP round-trip) and
+    wait_ms (time spent waiting for the rate limiter); a failed submission
+    has "error" instead of "id" and does not stop the rest of the batch.
+    Signals rejected by the risk checks (apply_risk) are never sent and come
+    back as entries with only "error" set.
+
+    With a PortfolioCache, validation also checks the resulting positions
+    and exposure against it, and each submitted order is applied to the
+    cache so the next batch sees it before the broker reconciles.
+
+    Signals with take_profit_pct / stop_loss_pct are sent as bracket (or
+    OTO) orders priced off `prices`, or the latest snapshot for symbols
+    missing from it, so exits are managed by the broker instead of polled
+    for. When the portfolio shows the order reducing an existing position,
+    it goes out plain: exits only make sense on entries.
+    """
+    signals = list(signals)
+    batch, rejected = apply_risk(signals, risk, portfolio=portfolio, prices=prices)
+    for r in rejected:
+        logger.info("order %s %s %s rejected: %s", r["signal"].side, r["signal"].qty, r["signal"].symbol, r["error"])
+    results: dict[int, dict[str, Any]] = {id(r["signal"]): _result(r["signal"], error=r["error"]) for r in rejected}
+    if not batch:
+        return [results[id(s)] for s in signals]
+
+    with_exits: list[bool] = []
+    pending_qty: dict[str, float] = {}
+    for s in batch:
+        signed = s.qty if s.side == "buy" else -s.qty
+        cur = (portfolio.position_qty(s.symbol) if portfolio is not None else 0.0) + pending_qty.get(s.symbol, 0.0)
+        pending_qty[s.symbol] = pending_qty.get(s.symbol, 0.0) + signed
+        with_exits.append(bool(s.take_profit_pct or s.stop_loss_pct) and cur * signed >= 0)
+
+    need = sorted({s.symbol for s, x in zip(batch, with_exits) if x and not (prices or {}).get(s.symbol)})
+    if need:
+        prices = {**(prices or {}), **_latest_prices(need)}
+
+    client = client or get_trading_client()
+    limiter = get_alpaca_rate_limiter() if rate_limiter is _UNSET else rate_limiter
+    workers = max(1, min(max_concurrency or settings.order_concurrency, len(batch)))
+
+    def _submit(item) -> dict[str, Any]:
+        s, exits = item
+        wait_s = limiter.acquire() if limiter is not None else 0.0
+        out = _result(s, wait_ms=round(wait_s * 1000, 1))
+        t0 = time.perf_counter()
+        try:
+            if exits:
+                o = place_market_order(
+                    client, s.symbol, s.side, s.qty,
+                    take_profit_pct=s.take_profit_pct,
+                    stop_loss_pct=s.stop_loss_pct,
+                    price=(prices or {}).get(s.symbol),
+                )
+            else:
+                o = place_market_order(client, s.symbol, s.side, s.qty)
+            out["id"] = str(o.id)
+            out["order_class"] = str(getattr(o.order_class, "value", o.order_class or "simple"))
+        except Exception as e:
+            logger.warning("order %s %s %s failed: %s", s.side, s.qty, s.symbol, e)
+            out["error"] = str(e)
+        out["submit_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        # Outside the try: the order is live at the broker whatever the cache does
+        if portfolio is not None and "error" not in out:
+            try:
+                portfolio.on_order(s.symbol, s.side, s.qty, (prices or {}).get(s.symbol))
+            except Exception:
+                logger.exception("portfolio cache: could not apply order %s; next reconcile corrects it", out["id"])
+        return out
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        orders = [_submit(item) for item in zip(batch, with_exits)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="orders") as ex:
+            orders = list(ex.map(_submit, zip(batch, with_exits)))
+
+    logger.info(
+        "submitted %d orders (%d failed, %d rejected) in %.0fms, slowest %.0fms",
+        len(orders), sum("error" in o for o in orders), len(rejected), (time.perf_counter() - t0) * 1000,
+        max(o["submit_ms"] for o in orders),
+    )
+    results.update((id(s), o) for s, o in zip(batch, orders))
+    return [results[id(s)] for s in signals]
+
+
+def _result(s, **extra: Any) -> dict[str, Any]:
+    return {"symbol": s.symbol, "side": s.side, "qty": s.qty, "reason": s.reason, **extra}
+
+
+def _latest_prices(symbols: list[str]) -> dict[str, Optional[float]]:
+    """Last-trade prices for `symbols` in one snapshot call (through the snapshot cache)."""
+    svc = MassiveDataService(api_key=settings.polygon_api_key, rate_limiter=get_massive_rate_limiter())
+    try:
+        rows = (get_snapshot_cache(svc) or svc).get_market_snapshot(symbols)
+    except Exception as e:
+        logger.warning("no snapshot prices for bracket exits (%s); those orders go out without them", e)
+        return {}
+    return {q.ticker: q.price for q in map(SnapshotQuote.from_row, rows) if q.ticker}
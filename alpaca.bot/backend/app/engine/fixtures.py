@@ -0,0 +1,296 @@
+"""
+Record / replay of Massive API traffic for offline benchmarking.
+
+Fixture files are gzip-compressed JSON lines, one exchange per line:
+    {"kind": "http", "key": "...", "status": 200, "headers": {...}, "body": "..."}
+    {"kind": "aggs", "key": "...", "rows": [{...}, ...]}
+
+Record:
+    svc = recording_service(api_key, "fixtures/tick.jsonl.gz")
+    ... use svc normally ...
+    svc.recorder.close()
+
+Replay (no network; latency and 429s are simulated):
+    svc = replay_service("fixtures/tick.jsonl.gz", latency_s=0.05, rate_429=0.02)
+"""
+from __future__ import annotations
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterator, Optional
+from urllib.parse import urlsplit
+import gzip
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from app.engine.massive_service import MassiveDataService
+
+
+def _http_key(url: str, params: Optional[dict[str, Any]]) -> str:
+    path = urlsplit(url).path
+    q = "&".join(f"{k}={params[k]}" for k in sorted(params or {}))
+    return f"GET {path}?{q}"
+
+
+def _aggs_key(kwargs: dict[str, Any]) -> str:
+    return "AGGS " + "&".join(f"{k}={kwargs[k]}" for k in sorted(kwargs))
+
+
+class FixtureRecorder:
+    """
+    Append-only writer for fixture files. Safe to share between threads.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = gzip.open(self.path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            self._f.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+
+class RecordingSession:
+    """
+    Wraps a requests.Session; every response is captured before it is returned.
+    """
+
+    def __init__(self, inner: requests.Session, recorder: FixtureRecorder):
+        self.inner = inner
+        self.recorder = recorder
+        self.headers = inner.headers
+
+    def mount(self, prefix: str, adapter: Any) -> None:
+        self.inner.mount(prefix, adapter)
+
+    def get(self, url: str, params: Optional[dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+        resp = self.inner.get(url, params=params, **kwargs)
+        # Reading .content here is fine for stream=True too: iter_content()
+        # serves from the cached body afterwards.
+        self.recorder.write({
+            "kind": "http",
+            "key": _http_key(url, params),
+            "status": resp.status_code,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() in ("retry-after", "content-type")},
+            "body": resp.content.decode("utf-8", errors="replace"),
+        })
+        return resp
+
+
+class RecordingRESTClient:
+    """
+    Wraps a RESTClient; list_aggs results are captured as plain dicts.
+    """
+
+    def __init__(self, inner: Any, recorder: FixtureRecorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def list_aggs(self, **kwargs: Any) -> Iterator[Any]:
+        rows = list(self.inner.list_aggs(**kwargs))
+        self.recorder.write({
+            "kind": "aggs",
+            "key": _aggs_key(kwargs),
+            # None fields are kept: BarSeries.from_aggs resolves columns from the first row
+            "rows": [vars(a) for a in rows],
+        })
+        return iter(rows)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.inner, name)
+
+
+# -----------------------
+# Replay
+# -----------------------
+class Fixture:
+    """
+    Loaded fixture file. Repeated keys are served round-robin, so a recording
+    of several ticks replays each tick's response in order.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        self.http: dict[str, list[dict[str, Any]]] = {}
+        self.aggs: dict[str, list[list[dict[str, Any]]]] = {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                e = json.loads(line)
+                if e["kind"] == "http":
+                    self.http.setdefault(e["key"], []).append(e)
+                elif e["kind"] == "aggs":
+                    self.aggs.setdefault(e["key"], []).append(e["rows"])
+        self._pos: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _next(self, table: dict[str, list[Any]], key: str) -> Any:
+        items = table.get(key)
+        if not items:
+            return None
+        with self._lock:
+            i = self._pos.get(key, 0)
+            self._pos[key] = i + 1
+        return items[i % len(items)]
+
+
+class ReplayResponse:
+    """
+    The subset of requests.Response that MassiveDataService uses.
+    """
+
+    def __init__(self, status_code: int, body: str = "", headers: Optional[dict[str, str]] = None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = body.encode("utf-8")
+        self.text = body
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ReplayResponse":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class _Simulator:
+    def __init__(self, latency_s: float, jitter_s: float, rate_429: float, seed: Optional[int]):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.rate_429 = rate_429
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.injected_429 = 0
+
+    def delay(self) -> None:
+        with self._lock:
+            self.requests += 1
+            d = self.latency_s + (self._rng.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        if d > 0:
+            time.sleep(d)
+
+    def throttle(self) -> bool:
+        with self._lock:
+            hit = self.rate_429 > 0 and self._rng.random() < self.rate_429
+            if hit:
+                self.injected_429 += 1
+        return hit
+
+
+class ReplaySession:
+    """
+    Stands in for MassiveDataService._http. Unknown requests get a 404, which
+    the service raises as a non-retryable error.
+    """
+
+    def __init__(
+        self,
+        fixture: Fixture,
+        *,
+        latency_s: float = 0.0,
+        jitter_s: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after_s: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.fixture = fixture
+        self.sim = _Simulator(latency_s, jitter_s, rate_429, seed)
+        self.retry_after_s = retry_after_s
+        self.headers: dict[str, str] = {}
+
+    def mount(self, prefix: str, adapter: Any) -> None:
+        pass
+
+    def get(self, url: str, params: Optional[dict[str, Any]] = None, **kwargs: Any) -> ReplayResponse:
+        self.sim.delay()
+        if self.sim.throttle():
+            return ReplayResponse(429, '{"status":"ERROR"}', {"Retry-After": str(self.retry_after_s)})
+        key = _http_key(url, params)
+        e = self.fixture._next(self.fixture.http, key)
+        if e is None:
+            return ReplayResponse(404, json.dumps({"error": f"no fixture for {key}"}))
+        return ReplayResponse(e["status"], e["body"], e.get("headers"))
+
+
+class ReplayRESTClient:
+    """
+    Stands in for MassiveDataService.client (list_aggs only).
+    """
+
+    def __init__(self, fixture: Fixture, *, latency_s: float = 0.0, jitter_s: float = 0.0, seed: Optional[int] = None):
+        self.fixture = fixture
+        self.sim = _Simulator(latency_s, jitter_s, 0.0, seed)
+
+    def list_aggs(self, **kwargs: Any) -> Iterator[Any]:
+        self.sim.delay()
+        key = _aggs_key(kwargs)
+        rows = self.fixture._next(self.fixture.aggs, key)
+        if rows is None:
+            raise RuntimeError(f"no fixture for {key}")
+        # Every row gets every field seen in the recording (older fixtures dropped Nones)
+        fields = dict.fromkeys(k for r in rows for k in r)
+        return (SimpleNamespace(**{**fields, **r}) for r in rows)
+
+
+# -----------------------
+# Factories
+# -----------------------
+def recording_service(api_key: str, path: str | os.PathLike, **kwargs: Any) -> MassiveDataService:
+    """
+    A live MassiveDataService that also writes every response to `path`.
+    Call svc.recorder.close() when done.
+    """
+    svc = MassiveDataService(api_key=api_key, **kwargs)
+    rec = FixtureRecorder(path)
+    svc._http = RecordingSession(svc._http, rec)  # type: ignore[assignment]
+    svc.client = RecordingRESTClient(svc.client, rec)  # type: ignore[assignment]
+    svc.recorder = rec  # type: ignore[attr-defined]
+    return svc
+
+
+def replay_service(
+    path: str | os.PathLike,
+    *,
+    latency_s: float = 0.0,
+    jitter_s: float = 0.0,
+    rate_429: float = 0.0,
+    retry_after_s: float = 0.0,
+    seed: Optional[int] = None,
+    **kwargs: Any,
+) -> MassiveDataService:
+    """
+    An offline MassiveDataService serving responses from a fixture file.
+    Extra kwargs go to MassiveDataService (e.g. bar_store, backoff_base_s).
+    """
+    fixture = Fixture(path)
+    svc = MassiveDataService(api_key="replay", **kwargs)
+    svc._http = ReplaySession(  # type: ignore[assignment]
+        fixture,
+        latency_s=latency_s,
+        jitter_s=jitter_s,
+        rate_429=rate_429,
+        retry_after_s=retry_after_s,
+        seed=seed,
+    )
+    svc.client = ReplayRESTClient(fixture, latency_s=latency_s, jitter_s=jitter_s, seed=seed)  # type: ignore[assignment]
+    return svc
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Iterator, Optional
+import logging
+import threading
+import uuid
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Delete / extend only if we still own the key (it may have expired and been
+# taken by someone else in the meantime). Extending never shortens the TTL.
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    if redis.call('PTTL', KEYS[1]) < tonumber(ARGV[2]) then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    end
+    return 1
+end
+return 0
+"""
+
+
+class RedisLock:
+    """
+    Expiring mutex across processes/replicas: SET key token NX PX ttl.
+
+    The token identifies the owner, so the same owner can re-acquire (e.g. a
+    retried Celery task passing its request id) and a different process can
+    release it (e.g. the chord callback that finishes the work). The TTL is
+    the backstop if the owner dies without releasing.
+    """
+
+    def __init__(self, r: redis.Redis, key: str, *, ttl_s: float, token: Optional[str] = None):
+        self.r = r
+        self.key = key
+        self.ttl_ms = max(1, int(ttl_s * 1000))
+        self.token = token or uuid.uuid4().hex
+        self._release = r.register_script(_RELEASE_SCRIPT)
+        self._extend = r.register_script(_EXTEND_SCRIPT)
+
+    def acquire(self) -> bool:
+        if self.r.set(self.key, self.token, nx=True, px=self.ttl_ms):
+            return True
+        # Already ours (retry of the same owner)?
+        return self.r.get(self.key) == self.token
+
+    def release(self) -> bool:
+        return bool(self._release(keys=[self.key], args=[self.token]))
+
+    def extend(self, ttl_s: float) -> bool:
+        """Keep the lock at least ttl_s longer; False if it is no longer ours."""
+        return bool(self._extend(keys=[self.key], args=[self.token, max(1, int(ttl_s * 1000))]))
+
+    @contextmanager
+    def held(self, ttl_s: float) -> Iterator[None]:
+        """
+        Heartbeat: keep the lock alive (extend(ttl_s) every ttl_s / 3) while
+        the block runs, and once more on the way out, so work that outlives
+        the original TTL still owns it. Losing the lock is logged, not raised.
+        """
+        stop = threading.Event()
+
+        def _beat() -> None:
+            while True:
+                try:
+                    if not self.extend(ttl_s):
+                        logger.warning("lock %s lost (now held by %s)", self.key, self.holder())
+                        return
+                except redis.RedisError as e:
+                    logger.warning("lock %s: heartbeat failed: %s", self.key, e)
+                if stop.wait(ttl_s / 3):
+                    return
+
+        t = threading.Thread(target=_beat, name=f"lock-heartbeat:{self.key}", daemon=True)
+        t.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            t.join(ttl_s)
+            try:
+                self.extend(ttl_s)
+            except redis.RedisError:
+                pass
+
+    def holder(self) -> Optional[str]:
+        return self.r.get(self.key)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from datetime import date, timedelta
+from typing import Any, Sequence
+import math
+import numpy as np
+from app.engine.bars import BarSeries
+from app.engine.massive_service import MassiveDataService
+from app.strategies.indicators import right_align
+
+# Rough bars per trading day, used to turn "last N bars" into a date range.
+_BARS_PER_DAY = {
+    "minute": 390,
+    "hour": 7,
+    "day": 1,
+}
+_DAYS_PER_BAR = {
+    "week": 7,
+    "month": 31,
+    "quarter": 92,
+    "year": 366,
+}
+
+
+def lookback_days(limit: int, *, multiplier: int = 1, timespan: str = "day") -> int:
+    """
+    Calendar days to request so that at least `limit` bars come back
+    (covers weekends and a few holidays).
+    """
+    if timespan in _DAYS_PER_BAR:
+        return limit * multiplier * _DAYS_PER_BAR[timespan] + 7
+    per_day = max(1.0, _BARS_PER_DAY.get(timespan, 1) / multiplier)
+    trading_days = math.ceil(limit / per_day)
+    return math.ceil(trading_days * 7 / 5) + 7
+
+
+class MassiveMarketData:
+    """
+    Strategy-facing market data client backed by MassiveDataService.
+
+    Implements the calls strategies make on ctx.broker_client / market_data:
+      - get_bars(symbol, limit)            -> list[dict] (t/o/h/l/c/v)
+      - get_recent_closes(symbol, limit)   -> list[float]
+      - get_closes_matrix(symbols, limit)  -> (S, limit) float array, NaN left-padded
+    """
+
+    def __init__(self, svc: MassiveDataService, *, multiplier: int = 1, timespan: str = "day"):
+        self.svc = svc
+        self.multiplier = multiplier
+        self.timespan = timespan
+
+    def _range(self, limit: int) -> tuple[str, str]:
+        end = date.today()
+        start = end - timedelta(days=lookback_days(limit, multiplier=self.multiplier, timespan=self.timespan))
+        return start.isoformat(), end.isoformat()
+
+    def get_series(self, symbol: str, limit: int) -> BarSeries:
+        from_, to = self._range(limit)
+        bars = self.svc.get_ohlc(
+            symbol, multiplier=self.multiplier, timespan=self.timespan, from_=from_, to=to
+        )
+        return bars[-limit:]
+
+    def get_series_many(self, symbols: Sequence[str], limit: int) -> dict[str, BarSeries]:
+        from_, to = self._range(limit)
+        data = self.svc.get_ohlc_many(
+            symbols, multiplier=self.multiplier, timespan=self.timespan, from_=from_, to=to
+        )
+        return {s: b[-limit:] for s, b in data.items()}
+
+    def get_bars(self, symbol: str, limit: int = 200) -> list[dict[str, Any]]:
+        b = self.get_series(symbol, limit)
+        return [
+            {"t": int(t), "o": float(o), "h": float(h), "l": float(l), "c": float(c), "v": float(v)}
+            for t, o, h, l, c, v in zip(b.t, b.o, b.h, b.l, b.c, b.v)
+        ]
+
+    def get_recent_closes(self, symbol: str, limit: int = 60) -> list[float]:
+        return self.get_series(symbol, limit).c.tolist()
+
+    def get_closes_matrix(self, symbols: Sequence[str], limit: int) -> np.ndarray:
+        data = self.get_series_many(symbols, limit)
+        empty = BarSeries.empty()
+        return right_align([data.get(s, empty).c for s in symbols], limit)
+
+
+def closes_matrix(client: Any, symbols: Sequence[str], limit: int) -> np.ndarray:
+    """
+    (S, limit) close matrix from any strategy client: uses get_closes_matrix
+    when the client has it, else falls back to one get_bars call per symbol
+    (bars are expected oldest first).
+    """
+    if hasattr(client, "get_closes_matrix"):
+        return client.get_closes_matrix(symbols, limit)
+
+    series: list[np.ndarray] = []
+    for sym in symbols:
+        bars = client.get_bars(symbol=sym, limit=limit) or []
+        closes = [b.get("c", b.get("close")) if isinstance(b, dict) else getattr(b, "close", None) for b in bars]
+        series.append(np.asarray([np.nan if c is None else c for c in closes], dtype=float))
+    return right_align(series, limit)
+
+
+def recent_series(client: Any, limits: dict[str, int]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """
+    Last `limits[symbol]` bars per symbol as (t_ms int64, close float64) arrays,
+    oldest first. Symbols needing the same count are fetched in one batch when
+    the client supports get_series_many.
+    """
+    by_limit: dict[int, list[str]] = {}
+    for sym, n in limits.items():
+        by_limit.setdefault(int(n), []).append(sym)
+
+    out: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    for n, syms in by_limit.items():
+        if hasattr(client, "get_series_many"):
+            for sym, b in client.get_series_many(syms, n).items():
+                out[sym] = (b.t, b.c)
+            continue
+        for sym in syms:
+            bars = client.get_bars(symbol=sym, limit=n) or []
+            t = np.asarray([_bar_ms(b.get("t", b.get("timestamp"))) for b in bars], dtype=np.int64)
+            c = np.asarray([b.get("c", b.get("close")) for b in bars], dtype=float)
+            out[sym] = (t, c)
+    return out
+
+
+def _bar_ms(v: Any) -> int:
+    if isinstance(v, (int, np.integer)):
+        return int(v)
+    return int(np.datetime64(str(v).replace("Z", ""), "ms").astype(np.int64))
@@ -1,28 +1,186 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from datetime import datetime, date
-from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, Sequence
+from datetime import datetime, date, timezone, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union, Sequence
 from massive import RESTClient
 import requests
+from requests.adapters import HTTPAdapter
+import codecs
+import json
+import logging
+import re
 import time
 import random
+import numpy as np
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.engine.bar_store import BarStore
+from app.engine.bars import AggBar, BarSeries
+from app.engine.rate_limit import RedisTokenBucket
+
+logger = logging.getLogger(__name__)
 
 # Types
 DateLike = Union[str, datetime, date]
 
+# Approximate length of one bar per timespan (ms). Used to decide how much of a
+# requested range is "closed" and safe to mark as cached.
+_TIMESPAN_MS = {
+    "second": 1_000,
+    "minute": 60_000,
+    "hour": 3_600_000,
+    "day": 86_400_000,
+    "week": 7 * 86_400_000,
+    "month": 31 * 86_400_000,
+    "quarter": 92 * 86_400_000,
+    "year": 366 * 86_400_000,
+}
+
+
+def _to_ms(value: DateLike | int, *, end: bool = False) -> int:
+    """
+    Convert a from_/to argument to epoch ms (UTC).
+    Plain dates cover the whole day when end=True.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        if value.isdigit():
+            return int(value)
+        value = datetime.fromisoformat(value) if "T" in value or " " in value else date.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1000)
+    start = datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if end:
+        return int((start + timedelta(days=1)).timestamp() * 1000) - 1
+    return int(start.timestamp() * 1000)
+
+
+
+# Relative change in a cached bar's close that means history was re-based
+_REBASE_TOLERANCE = 1e-4
+
+
+def _rebased(cached: np.ndarray, fetched: np.ndarray) -> bool:
+    """True if `fetched` has the bar `cached` at a different (adjusted) close."""
+    same = fetched[fetched["t"] == cached["t"]]
+    if not len(same):
+        return False
+    old, new = float(cached["c"]), float(same["c"][-1])
+    if old != old or new != new:
+        return False
+    return abs(new - old) > _REBASE_TOLERANCE * max(abs(old), 1e-9)
+
+
+@dataclass(slots=True)
+class SnapshotQuote:
+    """
+    Compact per-ticker row from the full-market snapshot (see iter_market_snapshot).
+    `price` is the last trade, falling back to the latest minute / day close.
+    """
+    ticker: str
+    price: float | None
+    day_o: float | None
+    day_h: float | None
+    day_l: float | None
+    day_c: float | None
+    day_v: float | None
+    prev_c: float | None
+    updated: int | None
+
+    @classmethod
+    def from_row(cls, row: dict[str, Any]) -> "SnapshotQuote":
+        day = row.get("day") or {}
+        minute = row.get("min") or {}
+        last = row.get("lastTrade") or {}
+        prev = row.get("prevDay") or {}
+        return cls(
+            ticker=row.get("ticker") or row.get("T"),
+            price=last.get("p") or minute.get("c") or day.get("c") or None,
+            day_o=day.get("o"),
+            day_h=day.get("h"),
+            day_l=day.get("l"),
+            day_c=day.get("c"),
+            day_v=day.get("v"),
+            prev_c=prev.get("c"),
+            updated=row.get("updated"),
+        )
+
+
+def _iter_json_array(chunks: Iterable[bytes], key: str) -> Iterator[Any]:
+    """
+    Incrementally yield the elements of the top-level array `"key": [...]` from
+    a byte stream, holding at most one element (plus one chunk) in memory.
+    Raises ValueError if the stream ends inside the array (truncated body or
+    an element that never parses), so a partial snapshot is never mistaken
+    for a complete one.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buf = ""
+    in_array = False
+
+    for chunk in chunks:
+        buf += utf8.decode(chunk)
+        if not in_array:
+            m = marker.search(buf)
+            if m is None:
+                buf = buf[-(len(key) + 64):]  # keep enough to match a split marker
+                continue
+            buf = buf[m.end():]
+            in_array = True
+
+        pos = 0
+        n = len(buf)
+        while True:
+            while pos < n and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= n:
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                obj, pos_end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            yield obj
+            pos = pos_end
+        buf = buf[pos:]
+
+    if in_array:
+        tail = buf.strip()
+        raise ValueError(
+            f"JSON array {key!r} ended without a closing ']'"
+            + (f" (unparsed: {tail[:80]!r})" if tail else "")
+        )
+
 
+class _ThrottledRESTClient(RESTClient):
+    """
+    RESTClient that takes a rate-limit token before every HTTP request,
+    including each page fetched lazily by list_aggs(), and starts none past
+    `deadline` (epoch seconds).
+    """
+
+    def __init__(
+        self,
+        *args,
+        rate_limiter: Optional[RedisTokenBucket] = None,
+        deadline: Optional[float] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.deadline = deadline
 
-@dataclass
-class AggBar:
-    t: int
-    o: float
-    h: float
-    l: float
-    c: float
-    v: float
-    vw: float | None = None
-    n: int | None = None
+    def _get(self, *args, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise TimeoutError("deadline passed; aggregates request not sent")
+        return super()._get(*args, **kwargs)
 
 
 class MassiveDataService:
@@ -35,6 +193,10 @@ class MassiveDataService:
         GET /v2/aggs/grouped/locale/us/market/stocks/{date}
       - For "latest" minute/day/prevDay across lots of symbols, use Full Market Snapshot:
         GET /v2/snapshot/locale/us/markets/stocks/tickers
+
+    With a deadline (epoch seconds), request timeouts are capped by the time
+    left, no retry backoff sleeps past it and no request starts after it
+    (TimeoutError), so a caller on a budget is not held up by a slow API.
     """
 
     def __init__(
@@ -46,8 +208,22 @@ class MassiveDataService:
         max_retries: int = 6,
         backoff_base_s: float = 0.6,
         backoff_jitter_s: float = 0.25,
+        bar_store: Optional[BarStore] = None,
+        http_pool_size: int = 16,
+        rate_limiter: Optional[RedisTokenBucket] = None,
+        deadline: Optional[float] = None,
     ):
-        self.client = RESTClient(api_key=api_key)
+        self.deadline = deadline
+        rest_timeout = 10.0 if deadline is None else max(0.5, min(10.0, deadline - time.time()))
+        self.client = _ThrottledRESTClient(
+            api_key=api_key,
+            rate_limiter=rate_limiter,
+            deadline=deadline,
+            connect_timeout=rest_timeout,
+            read_timeout=rest_timeout,
+        )
+        self.bar_store = bar_store
+        self.rate_limiter = rate_limiter
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.max_retries = max_retries
@@ -55,6 +231,10 @@ class MassiveDataService:
         self.backoff_jitter_s = backoff_jitter_s
 
         self._http = requests.Session()
+        # Size the connection pool for concurrent chunk fetches (default pool is 10).
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=http_pool_size)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
         self._http.headers.update({
             "Authorization": f"Bearer {api_key}",
             "Accept": "application/json",
@@ -65,20 +245,35 @@ class MassiveDataService:
         path: str,
         params: Optional[dict[str, Any]] = None
     )-> dict[str, Any]:
-        
+        return self._request(path, params).json()
+
+    def _request(
+        self,
+        path: str,
+        params: Optional[dict[str, Any]] = None,
+        *,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        GET with rate limiting and 429/5xx retries. Returns the successful response;
+        with stream=True the body is not read yet (caller must close it).
+        """
         url = f"{self.base_url}{path}"
         params = params or {}
 
 
         for attempt in range(self.max_retries + 1):
-            resp = self._http.get(url, params=params, timeout=self.timeout)
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            resp = self._http.get(url, params=params, timeout=self._timeout(url), stream=stream)
 
             # Success
             if 200 <= resp.status_code < 300:
-                return resp.json()
+                return resp
             
             # Rate limited: respect Retry-After when present, else exponential backoff
             if resp.status_code == 429:
+                resp.close()
                 retry_after = resp.headers.get("Retry-After")
                 if retry_after is not None:
                     sleep_s = float(retry_after)
@@ -86,13 +281,14 @@ class MassiveDataService:
                     sleep_s = (self.backoff_base_s * (2 ** attempt)) + random.uniform(
                         0, self.backoff_jitter_s
                     )
-                time.sleep(sleep_s)
+                self._backoff(sleep_s, url)
                 continue
 
             # Transient server errors: backoff
             if resp.status_code in (500, 502, 503, 504):
+                resp.close()
                 sleep_s = (self.backoff_base_s * (2 ** attempt)) + random.uniform(0, self.backoff_jitter_s)
-                time.sleep(sleep_s)
+                self._backoff(sleep_s, url)
                 continue
 
             # Non-retryable
@@ -103,6 +299,19 @@ class MassiveDataService:
             raise RuntimeError(f"HTTP {resp.status_code} for {url}: {payload}")
 
         raise RuntimeError(f"Exceeded retries for {url}")
+
+    def _timeout(self, url: str) -> float:
+        if self.deadline is None:
+            return self.timeout
+        left = self.deadline - time.time()
+        if left <= 0:
+            raise TimeoutError(f"deadline passed; {url} not requested")
+        return min(self.timeout, left)
+
+    def _backoff(self, sleep_s: float, url: str) -> None:
+        if self.deadline is not None and time.time() + sleep_s >= self.deadline:
+            raise TimeoutError(f"retrying {url} would run past the deadline")
+        time.sleep(sleep_s)
     
 
     # -----------------------
@@ -117,35 +326,73 @@ class MassiveDataService:
         from_: str,
         to: str,
         limit: int = 50000,
-    ) -> list[AggBar]:
+    ) -> BarSeries:
         """
-        Historical aggregates for ONE symbol via RESTClient.list_aggs(generator)
+        Historical aggregates for ONE symbol via RESTClient.list_aggs(generator),
+        as a columnar BarSeries (iterating it still yields AggBar).
+
+        With a bar_store configured, ranges already on disk are served locally
+        and only the missing holes / tail are requested from the API. The
+        tail request also re-reads the newest cached bar before it: if its
+        (split-adjusted) close changed, history was re-based by a split, so
+        the symbol's cache is dropped and the range fetched again.
         """
+        store = self.bar_store
+        if store is None:
+            return self._fetch_ohlc(
+                symbol, multiplier=multiplier, timespan=timespan, from_=from_, to=to, limit=limit
+            )
 
-        out: List[AggBar] = []
+        lo, hi = _to_ms(from_), _to_ms(to, end=True)
+        # Never mark the still-forming bar, or closed bars the API may not be
+        # serving yet (store.publish_lag_s), as cached; they are re-fetched next time.
+        closed_hi = (
+            int(time.time() * 1000)
+            - _TIMESPAN_MS.get(timespan, 0) * multiplier
+            - int(store.publish_lag_s * 1000)
+        )
 
-        for a in self.client.list_aggs(
-            ticker=symbol,
-            multiplier=multiplier,
-            timespan=timespan,
-            from_=from_,
-            to=to,
-            limit=limit,
-        ):
-            
-            out.append(
-                AggBar(
-                    t=getattr(a, "timestamp", getattr(a, "t", None)),
-                    o=getattr(a, "open", getattr(a, "o", None)),
-                    h=getattr(a, "high", getattr(a, "h", None)),
-                    l=getattr(a, "low", getattr(a, "l", None)),
-                    c=getattr(a, "close", getattr(a, "c", None)),
-                    v=getattr(a, "volume", getattr(a, "v", None)),
-                    vw=getattr(a, "vwap", getattr(a, "vw", None)),
-                    n=getattr(a, "transactions", getattr(a, "n", None)),
-                )
+        gaps = store.missing(symbol, multiplier, timespan, lo, hi)
+        for i, (gap_lo, gap_hi) in enumerate(gaps):
+            check = None
+            if i == len(gaps) - 1:
+                check = store.last_before(symbol, multiplier, timespan, min(gap_lo - 1, closed_hi))
+            fetch_lo = gap_lo if check is None else int(check["t"])
+            rec = self._fetch_ohlc(
+                symbol, multiplier=multiplier, timespan=timespan, from_=fetch_lo, to=gap_hi, limit=limit
+            ).to_records()
+            if check is not None:
+                if _rebased(check, rec):
+                    logger.info("%s %d/%s: cached bars were re-based (split?); re-fetching", symbol, multiplier, timespan)
+                    store.reset(symbol, multiplier, timespan)
+                    return self.get_ohlc(
+                        symbol, multiplier=multiplier, timespan=timespan, from_=from_, to=to, limit=limit
+                    )
+                rec = rec[rec["t"] > check["t"]]
+            store.write(symbol, multiplier, timespan, rec, covered=(gap_lo, min(gap_hi, closed_hi)))
+
+        return BarSeries.from_records(store.read(symbol, multiplier, timespan, lo, hi))
+
+    def _fetch_ohlc(
+        self,
+        symbol: str,
+        *,
+        multiplier: int,
+        timespan: str,
+        from_: DateLike | int,
+        to: DateLike | int,
+        limit: int,
+    ) -> BarSeries:
+        return BarSeries.from_aggs(
+            self.client.list_aggs(
+                ticker=symbol,
+                multiplier=multiplier,
+                timespan=timespan,
+                from_=from_,
+                to=to,
+                limit=limit,
             )
-        return out
+        )
     
     def get_ohlc_many(
             self,
@@ -157,16 +404,16 @@ class MassiveDataService:
             to: str,
             limit: int = 50000,
             max_workers: int = 12,
-        ) -> dict[str, list[AggBar]]:
+        ) -> dict[str, BarSeries]:
 
         """
         Historical aggregates for MANY symbols.
         WARNING: For 1000 symbols this can be very expensive in calls/time.
         Prefer get_daily_market_summary()+filter for daily bars.
         """
-        results: dict[str, list[AggBar]] = {}
+        results: dict[str, BarSeries] = {}
 
-        def _one(sym: str) -> tuple[str, list[AggBar]]:
+        def _one(sym: str) -> tuple[str, BarSeries]:
             return sym, self.get_ohlc(
                 sym, multiplier=multiplier, timespan=timespan, from_=from_, to=to, limit=limit
             )
@@ -230,21 +477,78 @@ class MassiveDataService:
         *,
         include_otc: bool = False,
         chunk_max_chars: int = 1800,
+        max_workers: int = 8,
     ) -> list[dict[str, Any]]:
         """
         Full Market Snapshot (minute/day/prevDay + last trade/quote depending on plan).
         Endpoint: GET /v2/snapshot/locale/us/markets/stocks/tickers
 
+        Without symbols the whole market is returned, streamed through iter_market_snapshot.
         The API supports a comma-separated 'tickers' list. For ~1000 symbols, we chunk to avoid URL length issues.
+        Chunks are fetched concurrently (at most `max_workers` in flight), each with the
+        usual 429/5xx retry handling. Rows come back in chunk order, so output order is stable.
         """
         if not symbols:
+            # Whole market: tens of MB, parsed row by row instead of via resp.json()
+            return list(self.iter_market_snapshot(include_otc=include_otc, compact=False))
+
+        chunks = self._chunk_symbols(symbols, chunk_max_chars)
+
+        def _one(ch: list[str]) -> list[dict[str, Any]]:
             payload = self._request_json(
                 "/v2/snapshot/locale/us/markets/stocks/tickers",
-                params={"include_otc": str(include_otc).lower()},
+                params={
+                    "tickers": ",".join(ch),
+                    "include_otc": str(include_otc).lower(),
+                },
             )
             return payload.get("tickers", [])
 
-        # Chunk by URL-safe character count
+        if len(chunks) == 1 or max_workers <= 1:
+            results = [_one(ch) for ch in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as ex:
+                # map() yields in submission order regardless of completion order
+                results = list(ex.map(_one, chunks))
+
+        all_rows: list[dict[str, Any]] = []
+        for rows in results:
+            all_rows.extend(rows)
+        return all_rows
+
+    def iter_market_snapshot(
+        self,
+        wanted: Optional[Iterable[str]] = None,
+        *,
+        include_otc: bool = False,
+        compact: bool = True,
+        chunk_size: int = 64 * 1024,
+    ) -> Iterator[SnapshotQuote | dict[str, Any]]:
+        """
+        Streaming Full Market Snapshot (no tickers param: the whole US market).
+
+        The response is parsed incrementally instead of via resp.json(), and rows
+        not in `wanted` are dropped as soon as they are decoded, so peak memory
+        scales with the rows you keep rather than the tens-of-MB payload.
+        Yields SnapshotQuote records (compact=True) or the raw row dicts.
+        """
+        keep = {s.upper() for s in wanted} if wanted is not None else None
+        resp = self._request(
+            "/v2/snapshot/locale/us/markets/stocks/tickers",
+            params={"include_otc": str(include_otc).lower()},
+            stream=True,
+        )
+        with resp:
+            for row in _iter_json_array(resp.iter_content(chunk_size=chunk_size), "tickers"):
+                if keep is not None and (row.get("ticker") or row.get("T")) not in keep:
+                    continue
+                yield SnapshotQuote.from_row(row) if compact else row
+
+    @staticmethod
+    def _chunk_symbols(symbols: Sequence[str], chunk_max_chars: int) -> list[list[str]]:
+        """
+        Split symbols so each comma-joined chunk stays under chunk_max_chars.
+        """
         chunks: list[list[str]] = []
         cur: list[str] = []
         cur_len = 0
@@ -259,18 +563,7 @@ class MassiveDataService:
                 cur_len += add_len
         if cur:
             chunks.append(cur)
-
-        all_rows: list[dict[str, Any]] = []
-        for ch in chunks:
-            payload = self._request_json(
-                "/v2/snapshot/locale/us/markets/stocks/tickers",
-                params={
-                    "tickers": ",".join(ch),
-                    "include_otc": str(include_otc).lower(),
-                },
-            )
-            all_rows.extend(payload.get("tickers", []))
-        return all_rows
+        return chunks
 
     # -----------------------
     # Optional DataFrame helpers (if you use pandas)
@@ -279,23 +572,10 @@ class MassiveDataService:
         import pandas as pd  # type: ignore
 
         data = self.get_ohlc_many(*args, **kwargs)
-        rows = []
-        for sym, bars in data.items():
-            for b in bars:
-                rows.append(
-                    {
-                        "symbol": sym,
-                        "t": b.t,
-                        "open": b.o,
-                        "high": b.h,
-                        "low": b.l,
-                        "close": b.c,
-                        "volume": b.v,
-                        "vwap": b.vw,
-                        "transactions": b.n,
-                    }
-                )
-        return pd.DataFrame(rows)
+        frames = [bars.to_pandas(symbol=sym) for sym, bars in data.items() if len(bars)]
+        if not frames:
+            return BarSeries.empty().to_pandas(symbol="")
+        return pd.concat(frames, ignore_index=True)
 
     def get_daily_market_summary_for_symbols_df(self, date_yyyy_mm_dd: str, symbols: Sequence[str], **kwargs):
         import pandas as pd  # type: ignore
@@ -303,3 +583,4 @@ class MassiveDataService:
         rows = self.get_daily_market_summary_for_symbols(date_yyyy_mm_dd, symbols, **kwargs)
         return pd.DataFrame(rows)
 
+
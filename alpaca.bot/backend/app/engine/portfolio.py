@@ -0,0 +1,280 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Mapping, Optional
+import json
+import logging
+import os
+import threading
+import time
+import redis
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.engine.alpaca_client import get_trading_client
+from app.engine.rate_limit import RedisTokenBucket, get_alpaca_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class CachedPosition:
+    qty: float          # signed: > 0 long, < 0 short
+    avg_price: float
+    price: float        # last known market price
+
+    @property
+    def exposure(self) -> float:
+        return abs(self.qty) * self.price
+
+
+class PortfolioCache:
+    """
+    In-process copy of the broker's positions and account, for pre-trade
+    risk checks without network calls.
+
+    - reconcile(client) / apply(state) replace everything with the
+      broker's view (at startup and periodically, see sync_shared and
+      start_reconciler).
+    - on_order() applies a submitted order optimistically, so checks made
+      before the next reconciliation already see it.
+    - mark() updates prices from snapshots.
+
+    Gross exposure is maintained incrementally, so every read is O(1).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self.positions: dict[str, CachedPosition] = {}
+        self.cash = 0.0
+        self.buying_power = 0.0
+        self.equity = 0.0
+        self._gross = 0.0
+        self.reconciled_at: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.reconciled_at is not None
+
+    # -----------------------
+    # Reads (no I/O)
+    # -----------------------
+    def position_qty(self, symbol: str) -> float:
+        p = self.positions.get(symbol)
+        return p.qty if p else 0.0
+
+    def price(self, symbol: str) -> Optional[float]:
+        p = self.positions.get(symbol)
+        return p.price if p and p.price > 0 else None
+
+    def gross_exposure(self) -> float:
+        return self._gross
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "reconciled_at": self.reconciled_at.isoformat() if self.reconciled_at else None,
+                "cash": self.cash,
+                "buying_power": self.buying_power,
+                "equity": self.equity,
+                "gross_exposure": self._gross,
+                "positions": {s: {"qty": p.qty, "avg_price": p.avg_price, "price": p.price} for s, p in self.positions.items()},
+            }
+
+    # -----------------------
+    # Updates
+    # -----------------------
+    def reconcile(self, client: Any) -> None:
+        """Replace cached state with the broker's account and positions."""
+        self.apply(broker_state(client))
+
+    def apply(self, state: Mapping[str, Any]) -> bool:
+        """
+        Replace cached state with a broker_state() record (fetched here or
+        shared through Redis, see sync_shared). Records older than the one
+        already applied are ignored; returns whether it was applied.
+        """
+        at = datetime.fromisoformat(state["at"])
+        positions = {
+            sym: CachedPosition(qty=float(qty), avg_price=float(avg), price=float(px))
+            for sym, (qty, avg, px) in state["positions"].items()
+        }
+        with self._lock:
+            if self.reconciled_at is not None and at <= self.reconciled_at:
+                return False
+            drift = sum(
+                1 for s in set(positions) | set(self.positions)
+                if abs(positions.get(s, CachedPosition(0, 0, 0)).qty - self.position_qty(s)) > 1e-9
+            )
+            self.positions = positions
+            self.cash = float(state["cash"])
+            self.buying_power = float(state["buying_power"])
+            self.equity = float(state["equity"])
+            self._gross = sum(p.exposure for p in positions.values())
+            first = self.reconciled_at is None
+            self.reconciled_at = at
+
+        if drift and not first:
+            logger.info("portfolio reconcile: %d positions differed from the cache", drift)
+        return True
+
+    def on_order(self, symbol: str, side: str, qty: float, price: Optional[float]) -> None:
+        """Apply a submitted order as if filled at `price`."""
+        signed = qty if side == "buy" else -qty
+        with self._lock:
+            p = self.positions.get(symbol)
+            if p is None:
+                p = self.positions[symbol] = CachedPosition(qty=0.0, avg_price=0.0, price=price or 0.0)
+            px = price or p.price
+            before = p.exposure
+            new_qty = p.qty + signed
+            if px and abs(new_qty) > abs(p.qty) and (p.qty == 0 or (p.qty > 0) == (signed > 0)):
+                p.avg_price = (abs(p.qty) * p.avg_price + abs(signed) * px) / abs(new_qty)
+            p.qty = new_qty
+            if px:
+                p.price = px
+            self._gross += p.exposure - before
+            # Opening exposure consumes buying power, closing releases it (1x, cash-like)
+            self.buying_power -= (p.exposure - before)
+            self.cash -= signed * (px or 0.0)
+            if abs(p.qty) < 1e-12:
+                del self.positions[symbol]
+
+    def mark(self, prices: Mapping[str, Optional[float]]) -> None:
+        """Update market prices (e.g. from a snapshot) for held symbols."""
+        with self._lock:
+            for sym, px in prices.items():
+                p = self.positions.get(sym)
+                if p is None or not px:
+                    continue
+                before = p.exposure
+                p.price = float(px)
+                self._gross += p.exposure - before
+
+
+def broker_state(client: Any) -> dict[str, Any]:
+    """The broker's account and positions as a JSON-safe record (two API calls)."""
+    account = client.get_account()
+    positions: dict[str, list[float]] = {}
+    for p in client.get_all_positions():
+        qty = float(p.qty)
+        if str(getattr(p, "side", "long")).lower().endswith("short") and qty > 0:
+            qty = -qty
+        price = float(p.current_price or p.avg_entry_price or 0)
+        positions[p.symbol] = [qty, float(p.avg_entry_price or 0), price]
+    return {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "cash": float(account.cash),
+        "buying_power": float(account.buying_power),
+        "equity": float(account.equity),
+        "positions": positions,
+    }
+
+
+# Latest broker_state() JSON, and the per-interval claim on fetching it
+PORTFOLIO_STATE_KEY = "portfolio:state"
+PORTFOLIO_FETCH_KEY = "portfolio:fetch"
+
+
+def sync_shared(
+    cache: PortfolioCache,
+    r: redis.Redis,
+    every_s: float,
+    *,
+    client_factory: Callable[[], Any] = get_trading_client,
+    limiter: Optional[RedisTokenBucket] = None,
+    wait_s: float = 0.0,
+) -> str:
+    """
+    One reconcile step for `cache`, shared by every process on `r`.
+
+    Whoever first claims PORTFOLIO_FETCH_KEY in an interval fetches from
+    the broker (taking its two calls from `limiter`) and publishes the
+    result under PORTFOLIO_STATE_KEY; everyone else applies that record.
+    So a fleet makes two broker calls per interval, not two per process.
+    With wait_s, a process that loses the claim before any record exists
+    waits that long for the winner's. Returns "fetched", "shared" or
+    "none" (nothing newer to apply).
+    """
+    ttl_ms = max(1000, int(every_s * 900))  # a bit under one interval, so each interval gets a fetch
+    if r.set(PORTFOLIO_FETCH_KEY, os.getpid(), nx=True, px=ttl_ms):
+        if limiter is not None:
+            limiter.acquire(2)
+        state = broker_state(client_factory())
+        r.set(PORTFOLIO_STATE_KEY, json.dumps(state), px=max(ttl_ms * 3, 60_000))
+        cache.apply(state)
+        return "fetched"
+
+    deadline = time.monotonic() + wait_s
+    while True:
+        raw = r.get(PORTFOLIO_STATE_KEY)
+        if raw is not None:
+            return "shared" if cache.apply(json.loads(raw)) else "none"
+        if time.monotonic() >= deadline:
+            return "none"
+        time.sleep(0.1)
+
+
+def _sync(cache: PortfolioCache, every_s: float, *, wait_s: float = 0.0) -> str:
+    limiter = get_alpaca_rate_limiter()
+    try:
+        return sync_shared(cache, get_redis(), every_s, limiter=limiter, wait_s=wait_s)
+    except redis.RedisError as e:
+        # No Redis to share through: fetch for this process alone
+        logger.warning("portfolio cache: Redis unavailable (%s), reconciling directly", e)
+        if limiter is not None:
+            limiter.acquire(2)
+        cache.reconcile(get_trading_client())
+        return "fetched"
+
+
+_cache: Optional[PortfolioCache] = None
+_cache_lock = threading.Lock()
+_reconciler: Optional[threading.Thread] = None
+_seed_failed_at = float("-inf")
+
+
+def get_portfolio_cache() -> Optional[PortfolioCache]:
+    """
+    Process-wide cache, seeded on first use and then reconciled every
+    PORTFOLIO_RECONCILE_S by a daemon thread. Seeding and reconciling go
+    through sync_shared, so worker processes share one broker fetch per
+    interval instead of each polling the broker. Returns None when
+    disabled (PORTFOLIO_RECONCILE_S=0) or if seeding failed.
+    """
+    global _cache
+    if settings.portfolio_reconcile_s <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            global _seed_failed_at
+            # After a failed seed, don't hit the broker again on every call
+            if time.monotonic() - _seed_failed_at < settings.portfolio_reconcile_s:
+                return None
+            cache = PortfolioCache()
+            try:
+                _sync(cache, settings.portfolio_reconcile_s, wait_s=5.0)
+                if not cache.ready:
+                    raise TimeoutError("no shared portfolio state yet")
+            except Exception as e:
+                _seed_failed_at = time.monotonic()
+                logger.warning("portfolio cache: initial reconcile failed (%s); risk checks run without it", e)
+                return None
+            _cache = cache
+            start_reconciler(cache, settings.portfolio_reconcile_s)
+        return _cache
+
+
+def start_reconciler(cache: PortfolioCache, every_s: float) -> threading.Thread:
+    global _reconciler
+
+    def _loop() -> None:
+        stop = threading.Event()
+        while not stop.wait(every_s):
+            try:
+                _sync(cache, every_s)
+            except Exception as e:
+                logger.warning("portfolio reconcile failed: %s", e)
+
+    _reconciler = threading.Thread(target=_loop, name="portfolio-reconcile", daemon=True)
+    _reconciler.start()
+    return _reconciler
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Optional
+import logging
+import threading
+import time
+import redis
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateTier:
+    rate_per_s: float   # steady-state refill rate
+    burst: float        # bucket capacity
+
+
+# Massive plan tiers. Basic is hard-limited to 5 calls/min; paid plans are
+# "unlimited" but the provider asks clients to stay under ~100 req/s.
+PLAN_TIERS: dict[str, RateTier] = {
+    "basic": RateTier(rate_per_s=5 / 60, burst=5),
+    "starter": RateTier(rate_per_s=100, burst=100),
+    "developer": RateTier(rate_per_s=100, burst=100),
+    "advanced": RateTier(rate_per_s=100, burst=100),
+}
+
+# Reserve `want` tokens and return how long the caller must wait (seconds).
+# The bucket may go negative: callers queue up behind each other with a single
+# round-trip each instead of polling. Uses the server clock so every process
+# agrees on "now".
+_TAKE_SCRIPT = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+
+local data = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+if tokens == nil then tokens = burst end
+if ts == nil then ts = now end
+
+tokens = math.min(burst, tokens + (now - ts) * rate) - want
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', key, math.ceil((burst / rate) * 1000) + 60000)
+
+local wait = 0
+if tokens < 0 then wait = -tokens / rate end
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Token bucket shared by every process that points at the same Redis key
+    (API, Celery workers, beat).
+
+    acquire() blocks until the caller's token is available and returns the
+    wait in seconds. Wait totals are kept both locally and in Redis
+    (`{key}:stats`) so plan sizing can look at the whole fleet.
+
+    If Redis is unreachable the limiter fails open and logs, so market data
+    keeps flowing and the API's own 429 handling takes over.
+    """
+
+    def __init__(
+        self,
+        r: redis.Redis,  # must use decode_responses=True
+        key: str,
+        *,
+        rate_per_s: float,
+        burst: float,
+    ):
+        if rate_per_s <= 0 or burst <= 0:
+            raise ValueError("rate_per_s and burst must be > 0")
+        self.r = r
+        self.key = key
+        self.stats_key = f"{key}:stats"
+        self.rate_per_s = float(rate_per_s)
+        self.burst = float(burst)
+        self._take = r.register_script(_TAKE_SCRIPT)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.waited_calls = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    @classmethod
+    def for_tier(cls, r: redis.Redis, key: str, tier: str) -> "RedisTokenBucket":
+        t = PLAN_TIERS.get(tier.lower())
+        if t is None:
+            raise ValueError(f"Unknown plan tier {tier!r}; expected one of {sorted(PLAN_TIERS)}")
+        return cls(r, key, rate_per_s=t.rate_per_s, burst=t.burst)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        try:
+            wait_s = float(self._take(keys=[self.key], args=[self.rate_per_s, self.burst, tokens]))
+        except redis.RedisError as e:
+            logger.warning("rate limiter %s unavailable, failing open: %s", self.key, e)
+            return 0.0
+
+        if wait_s > 0:
+            time.sleep(wait_s)
+        self._record(wait_s)
+        return wait_s
+
+    def _record(self, wait_s: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.total_wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+            if wait_s > 0:
+                self.waited_calls += 1
+        try:
+            p = self.r.pipeline(transaction=False)
+            p.hincrby(self.stats_key, "calls", 1)
+            if wait_s > 0:
+                p.hincrby(self.stats_key, "waited_calls", 1)
+                p.hincrbyfloat(self.stats_key, "total_wait_s", wait_s)
+            p.execute()
+        except redis.RedisError:
+            pass
+
+    def local_stats(self) -> dict[str, Any]:
+        """Counters for this process only."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "waited_calls": self.waited_calls,
+                "total_wait_s": round(self.total_wait_s, 6),
+                "max_wait_s": round(self.max_wait_s, 6),
+                "avg_wait_s": round(self.total_wait_s / self.calls, 6) if self.calls else 0.0,
+            }
+
+    def stats(self) -> dict[str, Any]:
+        """Counters aggregated over every process sharing this bucket."""
+        raw = self.r.hgetall(self.stats_key)
+        calls = int(raw.get("calls", 0))
+        total = float(raw.get("total_wait_s", 0))
+        return {
+            "key": self.key,
+            "rate_per_s": self.rate_per_s,
+            "burst": self.burst,
+            "calls": calls,
+            "waited_calls": int(raw.get("waited_calls", 0)),
+            "total_wait_s": round(total, 6),
+            "avg_wait_s": round(total / calls, 6) if calls else 0.0,
+        }
+
+
+_massive_limiter: Optional[RedisTokenBucket] = None
+_massive_limiter_lock = threading.Lock()
+_alpaca_limiter: Optional[RedisTokenBucket] = None
+_alpaca_limiter_lock = threading.Lock()
+
+
+def get_massive_rate_limiter() -> Optional[RedisTokenBucket]:
+    """
+    Process-wide limiter for Massive API calls, configured from settings.
+    Returns None when settings.massive_plan_tier is empty (limiter disabled).
+    """
+    global _massive_limiter
+    if not settings.massive_plan_tier:
+        return None
+    with _massive_limiter_lock:
+        if _massive_limiter is None:
+            tier = PLAN_TIERS.get(settings.massive_plan_tier.lower())
+            if tier is None:
+                raise ValueError(f"Unknown MASSIVE_PLAN_TIER {settings.massive_plan_tier!r}")
+            _massive_limiter = RedisTokenBucket(
+                get_redis(),
+                "ratelimit:massive",
+                rate_per_s=settings.massive_rate_per_s or tier.rate_per_s,
+                burst=settings.massive_rate_burst or tier.burst,
+            )
+        return _massive_limiter
+
+
+def get_alpaca_rate_limiter() -> Optional[RedisTokenBucket]:
+    """
+    Process-wide limiter for Alpaca trading API calls (shared through Redis,
+    since the broker limit is per account, not per worker). Returns None
+    when settings.alpaca_rate_per_min is 0.
+    """
+    global _alpaca_limiter
+    if settings.alpaca_rate_per_min <= 0:
+        return None
+    with _alpaca_limiter_lock:
+        if _alpaca_limiter is None:
+            _alpaca_limiter = RedisTokenBucket(
+                get_redis(),
+                "ratelimit:alpaca",
+                rate_per_s=settings.alpaca_rate_per_min / 60.0,
+                burst=settings.alpaca_rate_burst,
+            )
+        return _alpaca_limiter
+
@@ -1,12 +1,108 @@
-from dataclasses import dataclass
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Mapping, Optional
+
 
 @dataclass
 class RiskLimits:
     max_position_qty: float = 100
     max_orders_per_run: int = 20
+    # Checked against a PortfolioCache when one is passed (None = no limit)
+    max_position_notional: float | None = None
+    max_gross_exposure: float | None = None
+    min_buying_power: float = 0.0   # buying power to leave untouched
+
+
+@dataclass
+class PendingExposure:
+    """Effect of signals already accepted in the same batch, not yet in the cache."""
+    qty: dict[str, float] = field(default_factory=dict)
+    gross: float = 0.0
+
+    def add(self, symbol: str, signed_qty: float, exposure_delta: float) -> None:
+        self.qty[symbol] = self.qty.get(symbol, 0.0) + signed_qty
+        self.gross += exposure_delta
+
+
+def validate_signal(
+    signal,
+    limits: RiskLimits,
+    *,
+    portfolio: Any = None,
+    price: Optional[float] = None,
+    pending: Optional[PendingExposure] = None,
+) -> float:
+    """
+    Raise ValueError if `signal` breaks `limits`.
 
-def validate_signal(signal, limits: RiskLimits) -> None:
+    With a PortfolioCache, the resulting position (cached + pending + this
+    order) is checked against max_position_qty / max_position_notional, and
+    any added exposure against max_gross_exposure and buying power. All
+    reads are in-memory. Returns the exposure this order adds (<= 0 when it
+    reduces a position), for the caller to accumulate in `pending`.
+    """
     if signal.qty <= 0:
         raise ValueError("qty must be > 0")
     if signal.qty > limits.max_position_qty:
         raise ValueError(f"qty exceeds max_position_qty ({limits.max_position_qty})")
+    if portfolio is None:
+        return 0.0
+
+    sym = signal.symbol
+    signed = signal.qty if signal.side == "buy" else -signal.qty
+    cur = portfolio.position_qty(sym) + (pending.qty.get(sym, 0.0) if pending else 0.0)
+    new = cur + signed
+    if abs(new) > limits.max_position_qty:
+        raise ValueError(f"{sym} position would be {new:g} (max_position_qty {limits.max_position_qty})")
+
+    px = price or portfolio.price(sym)
+    if px is None:
+        if limits.max_position_notional is not None or limits.max_gross_exposure is not None:
+            raise ValueError(f"no price for {sym}; cannot check exposure")
+        return 0.0
+
+    if limits.max_position_notional is not None and abs(new) * px > limits.max_position_notional:
+        raise ValueError(
+            f"{sym} position notional {abs(new) * px:,.2f} exceeds max_position_notional ({limits.max_position_notional:,.2f})"
+        )
+
+    added = (abs(new) - abs(cur)) * px
+    if added > 0:
+        gross = portfolio.gross_exposure() + (pending.gross if pending else 0.0) + added
+        if limits.max_gross_exposure is not None and gross > limits.max_gross_exposure:
+            raise ValueError(f"gross exposure {gross:,.2f} exceeds max_gross_exposure ({limits.max_gross_exposure:,.2f})")
+        available = portfolio.buying_power - (pending.gross if pending else 0.0) - limits.min_buying_power
+        if added > available:
+            raise ValueError(f"needs {added:,.2f} buying power, {max(available, 0.0):,.2f} available")
+    return added
+
+
+def apply_risk(
+    signals,
+    limits: RiskLimits,
+    *,
+    portfolio: Any = None,
+    prices: Optional[Mapping[str, Optional[float]]] = None,
+) -> tuple[list, list[dict]]:
+    """
+    Validate a combined batch of signals. Returns (accepted, rejected) where
+    rejected entries are {"signal": s, "error": str}; accepted is capped at
+    limits.max_orders_per_run in the order given. Signals accepted earlier in
+    the batch count towards the exposure limits of later ones.
+    """
+    accepted, rejected = [], []
+    pending = PendingExposure()
+    for s in signals:
+        if len(accepted) >= limits.max_orders_per_run:
+            rejected.append({"signal": s, "error": f"over max_orders_per_run ({limits.max_orders_per_run})"})
+            continue
+        try:
+            added = validate_signal(
+                s, limits, portfolio=portfolio, price=(prices or {}).get(s.symbol), pending=pending
+            )
+        except ValueError as e:
+            rejected.append({"signal": s, "error": str(e)})
+            continue
+        pending.add(s.symbol, s.qty if s.side == "buy" else -s.qty, added)
+        accepted.append(s)
+    return accepted, rejected
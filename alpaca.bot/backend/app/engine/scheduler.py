@@ -0,0 +1,168 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Iterable, Optional
+import logging
+import time
+import redis
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+# KEYS[1] = due zset, KEYS[2] = interval hash
+# ARGV[1] = now (s), ARGV[2] = max ids
+# Pops every due strategy and pushes it back at its next due time in the same
+# step, so two dispatchers racing on the same second never both get an id.
+_CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+local now = tonumber(ARGV[1])
+local out = {}
+for i = 1, #due, 2 do
+    local id = due[i]
+    local interval = tonumber(redis.call('HGET', KEYS[2], id))
+    if interval then
+        local nxt = tonumber(due[i + 1]) + interval
+        if nxt <= now then
+            -- fell behind (beat/worker downtime): run once now, don't replay missed runs
+            nxt = now + interval
+        end
+        redis.call('ZADD', KEYS[1], nxt, id)
+        out[#out + 1] = id
+    else
+        redis.call('ZREM', KEYS[1], id)
+    end
+end
+return out
+"""
+
+
+class StrategyScheduler:
+    """
+    Due-time queue for enabled strategies, kept in Redis so every beat /
+    worker process sees the same schedule.
+
+    - {prefix}:due       ZSET strategy_id -> next due time (epoch s): the min-heap
+    - {prefix}:interval  HASH strategy_id -> interval_seconds
+    - {prefix}:version   bumped whenever a StrategyConfig changes (see notify_changed)
+
+    claim_due() is one round trip that only touches due entries, so a
+    dispatcher polling every second costs the same with 5 or 500 strategies
+    configured. sync() reconciles the queue with the database; it runs when
+    the version changes, and every sync_every_s as a backstop for edits
+    made outside the API.
+    """
+
+    def __init__(self, r: redis.Redis, *, prefix: str = "sched", sync_every_s: float = 30.0):
+        self.r = r  # must use decode_responses=True
+        self.prefix = prefix
+        self.sync_every_s = sync_every_s
+        self.due_key = f"{prefix}:due"
+        self.interval_key = f"{prefix}:interval"
+        self.version_key = f"{prefix}:version"
+        self.synced_key = f"{prefix}:synced"  # HASH version, at
+        self._claim = r.register_script(_CLAIM_SCRIPT)
+
+    # -----------------------
+    # Dispatch
+    # -----------------------
+    def claim_due(self, now: Optional[float] = None, *, limit: int = 1000) -> list[str]:
+        """Strategy ids due at `now`, already rescheduled to their next run."""
+        now = time.time() if now is None else now
+        return list(self._claim(keys=[self.due_key, self.interval_key], args=[now, limit]))
+
+    def next_due(self) -> Optional[float]:
+        head = self.r.zrange(self.due_key, 0, 0, withscores=True)
+        return float(head[0][1]) if head else None
+
+    # -----------------------
+    # Config changes
+    # -----------------------
+    def notify_changed(self) -> None:
+        self.r.incr(self.version_key)
+
+    def needs_sync(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        p = self.r.pipeline(transaction=False)
+        p.get(self.version_key)
+        p.hgetall(self.synced_key)
+        version, synced = p.execute()
+        if not synced:
+            return True
+        if (version or "0") != synced.get("version"):
+            return True
+        return now - float(synced.get("at", 0)) >= self.sync_every_s
+
+    def sync(self, rows: Iterable[tuple[str, int, Optional[datetime]]], now: Optional[float] = None) -> dict[str, int]:
+        """
+        Make the queue match `rows` = (id, interval_seconds, last_run_at) of
+        the enabled strategies. New ids are due at last_run_at + interval (or
+        now), changed intervals keep the last run as the anchor, and ids no
+        longer enabled are dropped.
+        """
+        now = time.time() if now is None else now
+        version = self.r.get(self.version_key) or "0"
+
+        want: dict[str, tuple[int, Optional[datetime]]] = {
+            str(i): (max(1, int(n or 60)), last) for i, n, last in rows
+        }
+        p = self.r.pipeline(transaction=False)
+        p.hgetall(self.interval_key)
+        p.zrange(self.due_key, 0, -1, withscores=True)
+        have_interval, have_due = p.execute()
+        have_due = dict(have_due)
+
+        added = changed = removed = 0
+        p = self.r.pipeline(transaction=True)
+        for sid in set(have_interval) | set(have_due):
+            if sid not in want:
+                p.zrem(self.due_key, sid)
+                p.hdel(self.interval_key, sid)
+                removed += 1
+        for sid, (interval, last) in want.items():
+            old = have_interval.get(sid)
+            if sid not in have_due or old is None:
+                anchor = last.timestamp() if last is not None else now - interval
+                p.zadd(self.due_key, {sid: max(anchor + interval, now)})
+                p.hset(self.interval_key, sid, interval)
+                added += 1
+            elif int(old) != interval:
+                p.zadd(self.due_key, {sid: have_due[sid] - int(old) + interval})
+                p.hset(self.interval_key, sid, interval)
+                changed += 1
+        p.hset(self.synced_key, mapping={"version": version, "at": now})
+        p.execute()
+
+        if added or changed or removed:
+            logger.info("scheduler sync: %d added, %d changed, %d removed", added, changed, removed)
+        return {"scheduled": len(want), "added": added, "changed": changed, "removed": removed}
+
+    def stats(self) -> dict[str, Any]:
+        p = self.r.pipeline(transaction=False)
+        p.zcard(self.due_key)
+        p.zrange(self.due_key, 0, 0, withscores=True)
+        p.hgetall(self.synced_key)
+        count, head, synced = p.execute()
+        return {
+            "scheduled": int(count),
+            "next_due_in_s": round(float(head[0][1]) - time.time(), 3) if head else None,
+            "synced_at": float(synced["at"]) if synced.get("at") else None,
+        }
+
+
+_scheduler: Optional[StrategyScheduler] = None
+
+
+def get_scheduler() -> StrategyScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = StrategyScheduler(get_redis(), sync_every_s=settings.scheduler_sync_s)
+    return _scheduler
+
+
+def notify_schedule_changed() -> None:
+    """Call after creating/updating/deleting a StrategyConfig; never raises."""
+    try:
+        get_scheduler().notify_changed()
+    except redis.RedisError:
+        logger.warning("scheduler: could not signal config change; next periodic sync will pick it up")
@@ -0,0 +1,402 @@
+"""
+Local simulated broker for exercising the execution path offline.
+
+SimTradingClient implements the parts of alpaca-py's TradingClient that the
+bot uses (submit_order, get_order_by_id, get_orders, get_account,
+get_all_positions) and fills market orders against a price source instead
+of the network:
+
+    tape = PriceTape.from_snapshot_fixture("fixtures/tick.jsonl.gz", ["AAPL", "MSFT"])
+    client = SimTradingClient(tape, latency_s=0.03, partial_rate=0.1, reject_rate=0.01)
+    execute_signals(signals, risk=RiskLimits(), client=client)
+
+Setting BROKER_SIM=true makes get_trading_client() return one, so workers run
+end to end without sending paper orders to Alpaca.
+"""
+from __future__ import annotations
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, Mapping, Optional, Sequence
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import threading
+import time
+import uuid
+from alpaca.common.exceptions import APIError
+from app.core.config import settings
+from app.engine.bars import BarSeries
+from app.engine.fixtures import replay_service
+from app.engine.massive_service import MassiveDataService, SnapshotQuote
+from app.engine.rate_limit import get_massive_rate_limiter
+from app.engine.snapshot_cache import get_snapshot_cache
+
+logger = logging.getLogger(__name__)
+
+PriceSource = Callable[[str], Optional[float]]
+
+
+# -----------------------
+# Prices
+# -----------------------
+class PriceTape:
+    """
+    Replayed prices as a sequence of frames {symbol: price}. price() reads
+    the current frame, falling back to the last price seen for a symbol;
+    advance() steps to the next frame (it stays on the last one at the end).
+    """
+
+    def __init__(self, frames: Sequence[Mapping[str, Optional[float]]]):
+        self.frames = [dict(f) for f in frames] or [{}]
+        self._i = 0
+        self._last: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._absorb(self.frames[0])
+
+    def _absorb(self, frame: Mapping[str, Optional[float]]) -> None:
+        self._last.update({s: float(p) for s, p in frame.items() if p})
+
+    def __call__(self, symbol: str) -> Optional[float]:
+        return self.price(symbol)
+
+    def price(self, symbol: str) -> Optional[float]:
+        return self._last.get(symbol)
+
+    def prices(self) -> dict[str, float]:
+        return dict(self._last)
+
+    def advance(self, steps: int = 1) -> bool:
+        """Move forward; False once the tape is exhausted."""
+        with self._lock:
+            for _ in range(steps):
+                if self._i + 1 >= len(self.frames):
+                    return False
+                self._i += 1
+                self._absorb(self.frames[self._i])
+        return True
+
+    @classmethod
+    def from_bars(cls, bars: Mapping[str, BarSeries]) -> "PriceTape":
+        """One frame per distinct bar timestamp, holding the closes at that time."""
+        by_t: dict[int, dict[str, float]] = {}
+        for sym, b in bars.items():
+            for t, c in zip(b.t.tolist(), b.c.tolist()):
+                by_t.setdefault(t, {})[sym] = c
+        return cls([by_t[t] for t in sorted(by_t)])
+
+    @classmethod
+    def from_snapshot_fixture(cls, path: str | os.PathLike, symbols: Sequence[str], *, frames: int = 1) -> "PriceTape":
+        """
+        Frames from a recorded snapshot fixture (app.engine.fixtures); a
+        recording of several ticks replays one tick per frame.
+        """
+        svc = replay_service(path)
+        out = []
+        for _ in range(max(1, frames)):
+            rows = svc.get_market_snapshot(list(symbols))
+            out.append({q.ticker: q.price for q in map(SnapshotQuote.from_row, rows) if q.ticker})
+        return cls(out)
+
+
+def snapshot_prices(svc: MassiveDataService) -> PriceSource:
+    """Live last-trade prices through the shared snapshot cache (when enabled)."""
+    snapshots = get_snapshot_cache(svc) or svc
+
+    def _price(symbol: str) -> Optional[float]:
+        rows = snapshots.get_market_snapshot([symbol])
+        return SnapshotQuote.from_row(rows[0]).price if rows else None
+
+    return _price
+
+
+# -----------------------
+# Broker
+# -----------------------
+def _api_error(code: int, message: str) -> APIError:
+    # Same shape as alpaca-py raises, so callers' error handling is exercised
+    return APIError(json.dumps({"code": code, "message": message}))
+
+
+def _enum_value(v: Any) -> str:
+    return str(getattr(v, "value", v)).lower()
+
+
+class SimTradingClient:
+    """
+    In-process TradingClient stand-in with a simple fill model:
+
+    - each call sleeps latency_s (+ uniform jitter_s) like a round-trip;
+    - market orders fill immediately at the source price, moved against
+      the taker by slippage_bps;
+    - with probability partial_rate an order fills only 10-90% of its qty
+      and stays "partially_filled";
+    - with probability reject_rate (and always for unknown prices or
+      insufficient buying power) submit_order raises APIError;
+    - bracket / OTO take-profit and stop-loss legs rest as exit orders for
+      the filled qty and trigger, one cancelling the other, when the price
+      source crosses them (checked by process_exits(), which account and
+      position reads call).
+
+    Positions net per symbol; buying power is equity * leverage minus
+    gross exposure at cost. Safe to call from many threads.
+    """
+
+    def __init__(
+        self,
+        prices: PriceSource,
+        *,
+        cash: float = 100_000.0,
+        leverage: float = 2.0,
+        latency_s: float = 0.0,
+        jitter_s: float = 0.0,
+        slippage_bps: float = 0.0,
+        partial_rate: float = 0.0,
+        reject_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.prices = prices
+        self.cash = float(cash)
+        self.leverage = leverage
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.slippage_bps = slippage_bps
+        self.partial_rate = partial_rate
+        self.reject_rate = reject_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.positions: dict[str, list[float]] = {}  # symbol -> [signed qty, avg entry]
+        self._marks: dict[str, float] = {}  # last price seen per symbol (no lookups under the lock)
+        self.orders: dict[str, SimpleNamespace] = {}
+        self.fill_ms: list[float] = []
+        self.counts = {"submitted": 0, "filled": 0, "partially_filled": 0, "rejected": 0, "exits": 0}
+        self._exits: list[list[SimpleNamespace]] = []  # open legs of each bracket/OTO entry
+
+    def _delay(self) -> None:
+        with self._lock:
+            d = self.latency_s + (self._rng.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        if d > 0:
+            time.sleep(d)
+
+    # -----------------------
+    # Orders
+    # -----------------------
+    def submit_order(self, order_data: Any) -> SimpleNamespace:
+        t0 = time.perf_counter()
+        self._delay()
+        symbol = order_data.symbol
+        side = _enum_value(order_data.side)
+        qty = float(order_data.qty)
+        px = self.prices(symbol)
+
+        with self._lock:
+            if px is not None:
+                self._marks[symbol] = px
+            self.counts["submitted"] += 1
+            reason = None
+            if px is None:
+                reason = (42210000, f"asset {symbol} has no price")
+            elif self.reject_rate > 0 and self._rng.random() < self.reject_rate:
+                reason = (40310000, "simulated reject")
+            else:
+                fill_px = px * (1 + self.slippage_bps / 10_000 * (1 if side == "buy" else -1))
+                fill_qty = qty
+                if self.partial_rate > 0 and self._rng.random() < self.partial_rate:
+                    fill_qty = qty * self._rng.uniform(0.1, 0.9)
+                    fill_qty = max(1.0, math.floor(fill_qty)) if qty == int(qty) and qty > 1 else round(fill_qty, 9)
+                signed = fill_qty if side == "buy" else -fill_qty
+                added = (abs(self._qty(symbol) + signed) - abs(self._qty(symbol))) * fill_px
+                if added > 0 and added > self._buying_power():
+                    reason = (40310000, "insufficient buying power")
+            if reason is not None:
+                self.counts["rejected"] += 1
+                raise _api_error(*reason)
+
+            self._apply_fill(symbol, signed, fill_px)
+            status = "filled" if fill_qty >= qty else "partially_filled"
+            self.counts[status] += 1
+            now = datetime.now(timezone.utc)
+            legs = self._exit_legs(order_data, symbol, side, fill_qty, now)
+            o = SimpleNamespace(
+                id=uuid.uuid4(),
+                client_order_id=getattr(order_data, "client_order_id", None) or uuid.uuid4().hex,
+                symbol=symbol,
+                side=side,
+                qty=str(qty),
+                filled_qty=str(fill_qty),
+                filled_avg_price=str(round(fill_px, 6)),
+                type=_enum_value(getattr(order_data, "type", "market")),
+                order_class=_enum_value(getattr(order_data, "order_class", None) or "simple"),
+                time_in_force=_enum_value(getattr(order_data, "time_in_force", "day")),
+                status=status,
+                submitted_at=now,
+                filled_at=now,
+                legs=legs or None,
+            )
+            self.orders[str(o.id)] = o
+            if legs:
+                self._exits.append(legs)
+            self.fill_ms.append((time.perf_counter() - t0) * 1000)
+        return o
+
+    def _exit_legs(self, order_data: Any, symbol: str, side: str, qty: float, now: datetime) -> list[SimpleNamespace]:
+        exit_side = "sell" if side == "buy" else "buy"
+        legs = []
+        tp = getattr(order_data, "take_profit", None)
+        sl = getattr(order_data, "stop_loss", None)
+        for kind, req, price_attr in (("limit", tp, "limit_price"), ("stop", sl, "stop_price")):
+            if req is None:
+                continue
+            leg = SimpleNamespace(
+                id=uuid.uuid4(), symbol=symbol, side=exit_side, qty=str(qty), filled_qty="0",
+                filled_avg_price=None, type=kind, order_class=None, status="new", submitted_at=now, filled_at=None,
+                limit_price=str(req.limit_price) if kind == "limit" else None,
+                stop_price=str(req.stop_price) if kind == "stop" else None,
+                legs=None,
+            )
+            self.orders[str(leg.id)] = leg
+            legs.append(leg)
+        return legs
+
+    def process_exits(self) -> int:
+        """Fill resting exit legs whose price was crossed; returns how many filled."""
+        n = 0
+        with self._lock:
+            still_open = []
+            for legs in self._exits:
+                hit = None
+                for leg in legs:
+                    px = self._marks.get(leg.symbol)
+                    if px is None:
+                        continue
+                    sell = leg.side == "sell"
+                    if leg.type == "limit" and (px >= float(leg.limit_price) if sell else px <= float(leg.limit_price)):
+                        hit, fill_px = leg, float(leg.limit_price)
+                    elif leg.type == "stop" and (px <= float(leg.stop_price) if sell else px >= float(leg.stop_price)):
+                        hit, fill_px = leg, px
+                    if hit:
+                        break
+                if hit is None:
+                    still_open.append(legs)
+                    continue
+                # Never more than what is still held in the entry's direction
+                held = self._qty(hit.symbol) * (1 if hit.side == "sell" else -1)
+                qty = min(float(hit.qty), max(held, 0.0))
+                if qty <= 0:
+                    for leg in legs:
+                        leg.status = "canceled"
+                    continue
+                self._apply_fill(hit.symbol, -qty if hit.side == "sell" else qty, fill_px)
+                hit.status, hit.filled_qty, hit.filled_avg_price = "filled", str(qty), str(round(fill_px, 6))
+                hit.filled_at = datetime.now(timezone.utc)
+                for other in legs:
+                    if other is not hit:
+                        other.status = "canceled"
+                self.counts["exits"] += 1
+                n += 1
+            self._exits = still_open
+        return n
+
+    def get_order_by_id(self, order_id: Any) -> SimpleNamespace:
+        self._delay()
+        o = self.orders.get(str(order_id))
+        if o is None:
+            raise _api_error(40410000, "order not found")
+        return o
+
+    def get_orders(self, filter: Any = None) -> list[SimpleNamespace]:
+        self._delay()
+        with self._lock:
+            return list(self.orders.values())
+
+    # -----------------------
+    # Account
+    # -----------------------
+    def _qty(self, symbol: str) -> float:
+        p = self.positions.get(symbol)
+        return p[0] if p else 0.0
+
+    def _gross_at_cost(self) -> float:
+        return sum(abs(q) * avg for q, avg in self.positions.values())
+
+    def _equity(self) -> float:
+        return self.cash + sum(q * self._marks.get(s, avg) for s, (q, avg) in self.positions.items())
+
+    def _buying_power(self) -> float:
+        return max(0.0, self._equity() * self.leverage - self._gross_at_cost())
+
+    def _apply_fill(self, symbol: str, signed: float, px: float) -> None:
+        q, avg = self.positions.get(symbol, [0.0, 0.0])
+        new = q + signed
+        if abs(new) < 1e-12:
+            self.positions.pop(symbol, None)
+        elif q == 0 or (q > 0) != (new > 0):
+            self.positions[symbol] = [new, px]          # opened or flipped
+        elif abs(new) > abs(q):
+            self.positions[symbol] = [new, (abs(q) * avg + abs(signed) * px) / abs(new)]
+        else:
+            self.positions[symbol] = [new, avg]         # reduced
+        self.cash -= signed * px
+
+    def _refresh_marks(self) -> None:
+        marks = {s: self.prices(s) for s in {*self.positions, *(leg.symbol for legs in self._exits for leg in legs)}}
+        with self._lock:
+            self._marks.update({s: px for s, px in marks.items() if px is not None})
+        self.process_exits()
+
+    def get_account(self) -> SimpleNamespace:
+        self._delay()
+        self._refresh_marks()
+        with self._lock:
+            equity = self._equity()
+            return SimpleNamespace(
+                cash=str(round(self.cash, 2)),
+                equity=str(round(equity, 2)),
+                buying_power=str(round(self._buying_power(), 2)),
+                multiplier=str(self.leverage),
+            )
+
+    def get_all_positions(self) -> list[SimpleNamespace]:
+        self._delay()
+        self._refresh_marks()
+        with self._lock:
+            out = []
+            for s, (q, avg) in self.positions.items():
+                px = self._marks.get(s, avg)
+                out.append(SimpleNamespace(
+                    symbol=s,
+                    qty=str(q),
+                    side="long" if q > 0 else "short",
+                    avg_entry_price=str(avg),
+                    current_price=str(px),
+                    market_value=str(q * px),
+                    unrealized_pl=str((px - avg) * q),
+                ))
+            return out
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            ms = sorted(self.fill_ms)
+        return {
+            **self.counts,
+            "positions": len(self.positions),
+            "fill_ms_p50": round(statistics.median(ms), 2) if ms else None,
+            "fill_ms_p99": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 2) if ms else None,
+        }
+
+
+def new_sim_client() -> SimTradingClient:
+    """SimTradingClient configured from BROKER_SIM_* settings, priced from live snapshots."""
+    svc = MassiveDataService(api_key=settings.polygon_api_key, rate_limiter=get_massive_rate_limiter())
+    logger.warning("BROKER_SIM is on: orders are filled by the local simulator, not sent to Alpaca")
+    return SimTradingClient(
+        snapshot_prices(svc),
+        cash=settings.broker_sim_cash,
+        latency_s=settings.broker_sim_latency_ms / 1000,
+        jitter_s=settings.broker_sim_jitter_ms / 1000,
+        slippage_bps=settings.broker_sim_slippage_bps,
+        partial_rate=settings.broker_sim_partial_rate,
+        reject_rate=settings.broker_sim_reject_rate,
+    )
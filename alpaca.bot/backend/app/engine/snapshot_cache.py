@@ -0,0 +1,247 @@
+from __future__ import annotations
+from typing import Any, Optional, Sequence
+import json
+import logging
+import threading
+import time
+import uuid
+import redis
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.engine.massive_service import MassiveDataService
+
+logger = logging.getLogger(__name__)
+
+# get_market_snapshot arguments that change the rows returned, so cached
+# entries fetched with different values must not be shared.
+SHAPING_KWARGS = ("include_otc",)
+
+# Drop only the in-flight claims still holding our token: a claim that
+# expired while we were fetching may already belong to another caller.
+_RELEASE_SCRIPT = """
+local n = 0
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        n = n + redis.call('DEL', key)
+    end
+end
+return n
+"""
+
+
+class SnapshotCache:
+    """
+    Short-TTL, Redis-backed cache in front of MassiveDataService.get_market_snapshot.
+
+    - One key per ticker ({prefix}:{T}) holding the snapshot row as JSON, so
+      callers asking for overlapping ticker sets share entries.
+    - Single-flight: before fetching, a caller claims {prefix}:inflight:{T}
+      with SET NX. Tickers already claimed by someone else are not fetched
+      again; the caller waits for the owner to fill them in, and only falls
+      back to fetching itself if that takes longer than wait_timeout_s.
+    - Tickers the API returns nothing for are cached as null for the same
+      TTL, so unknown symbols don't force a request every call.
+
+    hits/misses/coalesced are counted locally and in {prefix}:stats.
+    Full-market calls (no symbols) are passed straight through. Arguments
+    that change which rows come back (SHAPING_KWARGS, e.g. include_otc) are
+    part of the key; the rest only affect how the fetch is done.
+    """
+
+    def __init__(
+        self,
+        svc: MassiveDataService,
+        r: redis.Redis,  # must use decode_responses=True
+        *,
+        ttl_s: float = 5.0,
+        inflight_ttl_s: float = 15.0,
+        wait_timeout_s: float = 10.0,
+        prefix: str = "snap",
+    ):
+        self.svc = svc
+        self.r = r
+        self.ttl_ms = max(1, int(ttl_s * 1000))
+        self.inflight_ttl_ms = max(1, int(inflight_ttl_s * 1000))
+        self.wait_timeout_s = wait_timeout_s
+        self.prefix = prefix
+        self.stats_key = f"{prefix}:stats"
+        self._release = r.register_script(_RELEASE_SCRIPT)
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _scope(kwargs: dict[str, Any]) -> str:
+        # "" for the defaults, so plain calls keep sharing {prefix}:{T}
+        return "".join(f"{k}={kwargs[k]}:" for k in SHAPING_KWARGS if kwargs.get(k))
+
+    def _key(self, ticker: str, scope: str = "") -> str:
+        return f"{self.prefix}:{scope}{ticker}"
+
+    def _inflight_key(self, ticker: str, scope: str = "") -> str:
+        return f"{self.prefix}:inflight:{scope}{ticker}"
+
+    # -----------------------
+    # Public
+    # -----------------------
+    def get_market_snapshot(
+        self,
+        symbols: Optional[Sequence[str]] = None,
+        **kwargs: Any,
+    ) -> list[dict[str, Any]]:
+        """
+        Same contract as MassiveDataService.get_market_snapshot; rows come back
+        in the order of `symbols` (tickers without data are omitted).
+        """
+        if not symbols:
+            return self.svc.get_market_snapshot(symbols, **kwargs)
+
+        scope = self._scope(kwargs)
+        wanted = list(dict.fromkeys(symbols))
+        found = self._mget(wanted, scope)
+        missing = [t for t in wanted if t not in found]
+        self._count(hits=len(wanted) - len(missing), misses=len(missing))
+
+        if missing:
+            token, owned, waiting = self._claim(missing, scope)
+            if owned:
+                found.update(self._fetch_and_store(owned, kwargs, scope, token=token))
+            if waiting:
+                got = self._wait_for(waiting, scope)
+                self._count(coalesced=len(got))
+                found.update(got)
+                late = [t for t in waiting if t not in got]
+                if late:
+                    logger.warning("snapshot cache: %d in-flight tickers timed out, fetching directly", len(late))
+                    found.update(self._fetch_and_store(late, kwargs, scope))
+
+        return [found[t] for t in wanted if found.get(t) is not None]
+
+    def local_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return _stats_dict(self.hits, self.misses, self.coalesced)
+
+    def stats(self) -> dict[str, Any]:
+        """Counters across every process sharing this cache."""
+        return {"ttl_s": self.ttl_ms / 1000, **shared_stats(self.r, prefix=self.prefix)}
+
+    # -----------------------
+    # Internals
+    # -----------------------
+    def _count(self, *, hits: int = 0, misses: int = 0, coalesced: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.coalesced += coalesced
+        try:
+            p = self.r.pipeline(transaction=False)
+            if hits:
+                p.hincrby(self.stats_key, "hits", hits)
+            if misses:
+                p.hincrby(self.stats_key, "misses", misses)
+            if coalesced:
+                p.hincrby(self.stats_key, "coalesced", coalesced)
+            p.execute()
+        except redis.RedisError:
+            pass
+
+    def _mget(self, tickers: list[str], scope: str = "") -> dict[str, Optional[dict[str, Any]]]:
+        """Cached entries only; a cached null maps to None."""
+        if not tickers:
+            return {}
+        vals = self.r.mget([self._key(t, scope) for t in tickers])
+        return {t: json.loads(v) for t, v in zip(tickers, vals) if v is not None}
+
+    def _claim(self, tickers: list[str], scope: str = "") -> tuple[str, list[str], list[str]]:
+        token = uuid.uuid4().hex
+        p = self.r.pipeline(transaction=False)
+        for t in tickers:
+            p.set(self._inflight_key(t, scope), token, nx=True, px=self.inflight_ttl_ms)
+        res = p.execute()
+        owned = [t for t, ok in zip(tickers, res) if ok]
+        waiting = [t for t, ok in zip(tickers, res) if not ok]
+        return token, owned, waiting
+
+    def _fetch_and_store(
+        self,
+        tickers: list[str],
+        kwargs: dict[str, Any],
+        scope: str = "",
+        *,
+        token: Optional[str] = None,
+    ) -> dict[str, Optional[dict[str, Any]]]:
+        """Fetch, cache and return `tickers`; with `token`, release the claims made under it."""
+        try:
+            rows = self.svc.get_market_snapshot(tickers, **kwargs)
+            by_ticker: dict[str, Optional[dict[str, Any]]] = {t: None for t in tickers}
+            for row in rows:
+                t = row.get("ticker") or row.get("T")
+                if t in by_ticker:
+                    by_ticker[t] = row
+
+            p = self.r.pipeline(transaction=False)
+            for t, row in by_ticker.items():
+                p.set(self._key(t, scope), json.dumps(row, default=str), px=self.ttl_ms)
+            p.execute()
+            return by_ticker
+        finally:
+            if token is not None:
+                # Release our claims so waiters stop waiting even if the fetch failed.
+                self._release(keys=[self._inflight_key(t, scope) for t in tickers], args=[token])
+
+    def _wait_for(self, tickers: list[str], scope: str = "") -> dict[str, Optional[dict[str, Any]]]:
+        got: dict[str, Optional[dict[str, Any]]] = {}
+        pending = list(tickers)
+        deadline = time.monotonic() + self.wait_timeout_s
+        delay = 0.02
+        while pending and time.monotonic() < deadline:
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+            got.update(self._mget(pending, scope))
+            pending = [t for t in pending if t not in got]
+            if pending:
+                # Owner gave up (fetch error / expired claim): stop waiting for those.
+                p = self.r.pipeline(transaction=False)
+                for t in pending:
+                    p.exists(self._inflight_key(t, scope))
+                alive = p.execute()
+                if not any(alive):
+                    break
+        return got
+
+
+def get_snapshot_cache(svc: MassiveDataService) -> Optional[SnapshotCache]:
+    """
+    SnapshotCache around `svc` using the shared Redis and settings.snapshot_cache_ttl_s.
+    Returns None when the cache is disabled (ttl <= 0).
+    """
+    if settings.snapshot_cache_ttl_s <= 0:
+        return None
+    return SnapshotCache(svc, get_redis(), ttl_s=settings.snapshot_cache_ttl_s)
+
+
+def _stats_dict(hits: int, misses: int, coalesced: int) -> dict[str, Any]:
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "coalesced": coalesced,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+def shared_stats(r: redis.Redis, *, prefix: str = "snap") -> dict[str, Any]:
+    """Counters every SnapshotCache on `prefix` has added to {prefix}:stats."""
+    raw = r.hgetall(f"{prefix}:stats")
+    return _stats_dict(int(raw.get("hits", 0)), int(raw.get("misses", 0)), int(raw.get("coalesced", 0)))
+
+
+def snapshot_cache_stats() -> Optional[dict[str, Any]]:
+    """
+    Fleet-wide counters without building a data service (None when disabled).
+    """
+    if settings.snapshot_cache_ttl_s <= 0:
+        return None
+    return {"ttl_s": settings.snapshot_cache_ttl_s, **shared_stats(get_redis())}
@@ -0,0 +1,195 @@
+"""
+Walk-forward optimisation on top of app.engine.backtest.
+
+The history is cut into rolling (or anchored) train/test folds. Every
+parameter set is scored on every train window, the best set per fold is
+then scored on the following, unseen test window, and the chain of test
+results is the out-of-sample estimate. The newest fold's winner is the
+suggestion for live trading.
+
+Prices are placed in shared memory once (SharedPrices); worker processes
+attach to it, compute each parameter set's signals once over the full
+history and score all folds from those, so nothing is copied per worker
+or per fold.
+"""
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Iterable, Mapping, Optional
+import logging
+import time
+import numpy as np
+from app.engine.backtest import BacktestData, SharedPrices, _init_worker, _worker, param_grid, pool_size, score
+
+logger = logging.getLogger(__name__)
+
+# StrategyConfig.params key the suggestion record is stored under
+SUGGESTION_KEY = "walk_forward"
+
+
+def make_folds(
+    n_bars: int,
+    train_bars: int,
+    test_bars: int,
+    *,
+    step: Optional[int] = None,
+    anchored: bool = False,
+) -> list[tuple[int, int, int]]:
+    """
+    (train_lo, train_hi, test_hi) bar indices. Test windows follow their
+    train window directly and advance by `step` (default test_bars), so
+    with the default they tile the history without overlap. anchored=True
+    keeps every train window starting at bar 0.
+    """
+    step = step or test_bars
+    out: list[tuple[int, int, int]] = []
+    lo = 0
+    while lo + train_bars + test_bars <= n_bars:
+        out.append((0 if anchored else lo, lo + train_bars, lo + train_bars + test_bars))
+        lo += step
+    return out
+
+
+def _score_folds(chunk: list[dict[str, Any]]) -> list[Optional[list[dict[str, float]]]]:
+    cls, data, kw = _worker["strategy_cls"], _worker["data"], _worker["kwargs"]
+    folds = kw["folds"]
+    out: list[Optional[list[dict[str, float]]]] = []
+    for p in chunk:
+        sig = cls.backtest_signals(data, dict(p))
+        if sig is None:
+            out.append(None)
+            continue
+        out.append([
+            score(sig, data, p, lo=a, hi=b, cost_bps=kw["cost_bps"], allow_short=kw["allow_short"])
+            for a, b, _ in folds
+        ])
+    return out
+
+
+def walk_forward(
+    strategy_cls: type,
+    data: BacktestData,
+    grid: Mapping[str, Iterable[Any]],
+    *,
+    train_bars: int = 252,
+    test_bars: int = 63,
+    step: Optional[int] = None,
+    anchored: bool = False,
+    metric: str = "sharpe",
+    min_trades: int = 1,
+    base_params: Optional[Mapping[str, Any]] = None,
+    workers: Optional[int] = None,
+    cost_bps: float = 0.0,
+    allow_short: bool = False,
+) -> dict[str, Any]:
+    """
+    Run the optimisation and return a JSON-ready record:
+
+        {"metric", "grid_size", "folds": [{"train": [d0, d1], "test": [d1, d2],
+          "params", "train_metrics", "test_metrics"}, ...],
+         "oos": {...}, "suggested_params": {...}}
+
+    Folds where no set reaches min_trades on the train window are skipped.
+    workers defaults to one process per CPU (see backtest.pool_size).
+    """
+    S, T = data.close.shape
+    folds = make_folds(T, train_bars, test_bars, step=step, anchored=anchored)
+    if not folds:
+        raise ValueError(f"{T} bars is not enough for one {train_bars}+{test_bars} bar fold")
+
+    sets = param_grid(grid, base_params)
+    kwargs = {"folds": folds, "cost_bps": cost_bps, "allow_short": allow_short}
+    workers = pool_size(workers)
+
+    t0 = time.perf_counter()
+    if workers <= 1 or len(sets) < 2:
+        _init_worker(strategy_cls, data, kwargs)
+        train = _score_folds(sets)
+    else:
+        n_chunks = min(len(sets), workers * 4)
+        size = -(-len(sets) // n_chunks)
+        chunks = [sets[i:i + size] for i in range(0, len(sets), size)]
+        with SharedPrices.create(data) as shared, ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(strategy_cls, shared, kwargs),
+        ) as pool:
+            train = [m for part in pool.map(_score_folds, chunks) for m in part]
+
+    fold_out: list[dict[str, Any]] = []
+    for f, (a, b, c) in enumerate(folds):
+        ranked = [
+            (scores[f][metric], i)
+            for i, scores in enumerate(train)
+            if scores is not None and scores[f]["trades"] >= min_trades and np.isfinite(scores[f][metric])
+        ]
+        if not ranked:
+            continue
+        _, i = max(ranked)
+        p = sets[i]
+        sig = strategy_cls.backtest_signals(data, dict(p))
+        fold_out.append({
+            "train": [str(data.dates[a]), str(data.dates[b - 1])],
+            "test": [str(data.dates[b]), str(data.dates[c - 1])],
+            "params": p,
+            "train_metrics": train[i][f],
+            "test_metrics": score(sig, data, p, lo=b, hi=c, cost_bps=cost_bps, allow_short=allow_short),
+        })
+
+    logger.info(
+        "walk-forward: %d sets x %d folds over %d symbols x %d bars in %.2fs",
+        len(sets), len(folds), S, T, time.perf_counter() - t0,
+    )
+    return {
+        "metric": metric,
+        "grid_size": len(sets),
+        "train_bars": train_bars,
+        "test_bars": test_bars,
+        "anchored": anchored,
+        "symbols": int(S),
+        "folds": fold_out,
+        "oos": _oos_summary(fold_out, metric),
+        "suggested_params": fold_out[-1]["params"] if fold_out else None,
+    }
+
+
+def _oos_summary(folds: list[dict[str, Any]], metric: str) -> dict[str, Any]:
+    """Chained test-window results: compounded return, worst drawdown, mean metric."""
+    if not folds:
+        return {}
+    tests = [f["test_metrics"] for f in folds]
+    return {
+        "total_return": float(np.prod([1.0 + t["total_return"] for t in tests]) - 1.0),
+        "max_drawdown": float(max(t["max_drawdown"] for t in tests)),
+        f"mean_{metric}": float(np.mean([t[metric] for t in tests])),
+        "trades": int(sum(t["trades"] for t in tests)),
+        # In-sample vs out-of-sample gap; large values point at overfitting
+        f"mean_train_{metric}": float(np.mean([f["train_metrics"][metric] for f in folds])),
+    }
+
+
+def save_suggestion(db: Any, strategy_id: str, result: Mapping[str, Any]) -> bool:
+    """
+    Store `result` (without the per-fold detail's bulk) under
+    StrategyConfig.params[SUGGESTION_KEY]. Live parameters are left alone;
+    applying the suggestion is a separate, deliberate edit.
+    """
+    from app.db.models import StrategyConfig
+
+    row = db.get(StrategyConfig, strategy_id)
+    if row is None:
+        return False
+    record = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "params": result.get("suggested_params"),
+        "metric": result.get("metric"),
+        "oos": result.get("oos"),
+        "folds": [
+            {"test": f["test"], "params": f["params"], result["metric"]: f["test_metrics"][result["metric"]]}
+            for f in result.get("folds", [])
+        ],
+    }
+    # Reassign (not mutate) so SQLAlchemy notices the JSON column changed
+    row.params = {**(row.params or {}), SUGGESTION_KEY: record}
+    db.commit()
+    return True
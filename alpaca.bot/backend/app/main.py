@@ -11,6 +11,7 @@ from app.api.routes import (
     symbols,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.ws_hub import get_event_hub
 import logging
 import sys
 
@@ -24,6 +25,11 @@ logging.basicConfig(
 
 app = FastAPI(title="Alpaca Bot API")
 
+
+@app.on_event("shutdown")
+async def _stop_event_hub():
+    await get_event_hub().stop()
+
 # Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -1,50 +1,3 @@
-from __future__ import annotations
-from dataclasses import dataclass
-from typing import Protocol, Any
-from app.db.models import StrategyConfig, StrategyRun
-from app.core.events import publish_event
-from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
-from sqlalchemy.orm import Session
-import json
-
-
-
-### Helpers
-def utcnow() -> datetime:
-    return datetime.now(timezone.utc)
-
-
-
-@dataclass
-class StrategyContext:
-    db_session_factory: callable
-    id: str
-    name: str
-    type: str
-    enabled: bool
-    interval_seconds: int
-    symbols: dict
-    params: Optional[dict] = {}
-    broker_client: Any
-    event_channel:str
-
-
-@dataclass
-class MarketContext:
-    now_iso: str
-
-@dataclass
-class Signal:
-    symbol: str
-    side: str            # "buy" or "sell"
-    qty: float
-    reason: str
-    take_profit_pct: float | None = None
-    stop_loss_pct: float | None = None
-
-
-
 from __future__ import annotations
 
 from dataclasses import dataclass, field
@@ -56,6 +9,7 @@ import json
 
 from app.db.models import StrategyConfig, StrategyRun
 from app.core.events import publish_event
+from app.strategies.indicator_cache import IndicatorCache
 
 
 ### Helpers
@@ -75,6 +29,8 @@ class StrategyContext:
     broker_client: Any
     event_channel: str
     params: Dict[str, Any] = field(default_factory=dict)
+    indicators: Optional[IndicatorCache] = None  # shared per-tick cache; one per strategy if None
+    publish_signals: bool = True  # False when a caller publishes a combined event instead
 
 
 @dataclass
@@ -110,6 +66,7 @@ class StrategyBase:
         self.strategy_id = ctx.id
         self.ctx = ctx
         self.params = dict(ctx.params or {})  # local copy
+        self.indicators = ctx.indicators if ctx.indicators is not None else IndicatorCache()
         self.db_row = self.load_from_db()
 
     # -------------------- DB config loading --------------------
@@ -124,12 +81,14 @@ class StrategyBase:
 
             self.db_row = row
             if row:
-                self.params = self._parse_params(getattr(row, "params_json", None))
+                self.params = self._parse_params(getattr(row, "params", None))
             return row
 
-    def _parse_params(self, params_json: str | None) -> Dict[str, Any]:
+    def _parse_params(self, params_json: str | dict | None) -> Dict[str, Any]:
         if not params_json:
             return {}
+        if isinstance(params_json, dict):
+            return dict(params_json)
         try:
             v = json.loads(params_json)
             return v if isinstance(v, dict) else {}
@@ -154,8 +113,15 @@ class StrategyBase:
         except Exception:
             return 60
 
+    # -------------------- Backtesting --------------------
 
-
-
-
-
+    @classmethod
+    def backtest_signals(cls, data: Any, params: Dict[str, Any]) -> Optional[Any]:
+        """
+        Vectorised signal logic for app.engine.backtest: given a BacktestData
+        (data.close is a symbols x bars matrix) return an int8 matrix of the
+        same shape with +1 (buy) / -1 (sell) on the bars where run-time logic
+        would emit that signal, else 0. Return None for parameter combinations
+        that make no sense (they are skipped in sweeps).
+        """
+        raise NotImplementedError(f"{cls.__name__} does not support backtesting")
@@ -0,0 +1,221 @@
+"""
+Per-tick indicator cache shared by every strategy evaluated in that tick.
+
+Entries are keyed by (symbol, timeframe, indicator, params), e.g.
+("AAPL", "1/day", "sma", (50,)), so three strategies asking for SMA(50) on
+AAPL compute it once. Close series are cached the same way under the
+"close" indicator, so the bars behind them are fetched once as well.
+
+With last2(..., incremental=True) the values come from streaming state
+(app.strategies.indicator_state) checkpointed per timeframe and indicator,
+not per strategy, and land under the same keys: every strategy using
+SMA(50) keeps one state warm, and in a tick it is updated (and its recent
+bars fetched) once.
+
+Create one IndicatorCache per tick, pass it in StrategyContext.indicators
+and call report() when the tick is done to add its counters to the
+fleet-wide totals in Redis.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Hashable, Optional, Sequence
+import logging
+import threading
+import numpy as np
+import redis
+from app.core.redis_client import get_redis
+from app.engine.market_data import closes_matrix, recent_series
+from app.strategies.indicator_state import load_engine, save_engine
+from app.strategies.indicators import right_align, sma_last2
+
+logger = logging.getLogger(__name__)
+
+CacheKey = tuple[str, str, str, tuple[Hashable, ...]]
+
+# indicator -> (fn(close_matrix, *params) -> (prev, now), bars needed for params)
+_LAST2: dict[str, tuple[Callable[..., tuple[np.ndarray, np.ndarray]], Callable[..., int]]] = {
+    "sma": (sma_last2, lambda window: int(window) + 1),
+}
+
+STATS_KEY = "indcache:stats"
+
+
+def timeframe_of(client: Any) -> str:
+    """'{multiplier}/{timespan}' of a market data client (MassiveMarketData has both)."""
+    return f"{getattr(client, 'multiplier', 1)}/{getattr(client, 'timespan', 'day')}"
+
+
+class IndicatorCache:
+    """
+    In-memory memo for one tick. Not meant to outlive it: values are never
+    invalidated, a new tick gets a new cache.
+
+    requests counts every (symbol, indicator) lookup, computed counts the
+    ones that actually had to be evaluated; dedup_ratio = requests / computed.
+    """
+
+    def __init__(self) -> None:
+        self._values: dict[CacheKey, Any] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.computed = 0
+
+    # -----------------------
+    # Generic access
+    # -----------------------
+    def get_many(
+        self,
+        keys: Sequence[CacheKey],
+        compute: Callable[[list[CacheKey]], Sequence[Any]],
+    ) -> list[Any]:
+        """
+        Values for `keys`; the misses are evaluated together in one
+        compute(missing_keys) call, which must return values in the same order.
+        """
+        with self._lock:
+            found = [self._values.get(k, _MISSING) for k in keys]
+        missing = list(dict.fromkeys(k for k, v in zip(keys, found) if v is _MISSING))
+
+        computed: dict[CacheKey, Any] = {}
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+        with self._lock:
+            self._values.update(computed)
+            self.requests += len(keys)
+            self.hits += len(keys) - len(missing)
+            self.computed += len(missing)
+        return [computed[k] if v is _MISSING else v for k, v in zip(keys, found)]
+
+    def get(self, key: CacheKey, compute: Callable[[], Any]) -> Any:
+        return self.get_many([key], lambda _: [compute()])[0]
+
+    # -----------------------
+    # Market data helpers
+    # -----------------------
+    def closes(self, client: Any, symbols: Sequence[str], limit: int) -> np.ndarray:
+        """
+        (S, limit) close matrix like closes_matrix(), with each symbol's closes
+        shared across strategies. A cached series fetched with a smaller limit
+        is not reused; the larger request is fetched and cached alongside it.
+        """
+        tf = timeframe_of(client)
+        keys = [(s, tf, "close", (int(limit),)) for s in symbols]
+        longer = self._longest_closes(symbols, tf, limit)
+
+        def _fetch(missing: list[CacheKey]) -> list[np.ndarray]:
+            need = [k[0] for k in missing if k[0] not in longer]
+            fetched = closes_matrix(client, need, limit) if need else np.empty((0, limit))
+            rows = dict(zip(need, fetched))
+            return [rows[k[0]] if k[0] in rows else longer[k[0]][-limit:] for k in missing]
+
+        return right_align(self.get_many(keys, _fetch), limit)
+
+    def series(self, client: Any, limits: dict[str, int]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        recent_series(client, limits) with each (symbol, count) fetched once
+        per tick, e.g. the short tails several streaming states ask for.
+        """
+        tf = timeframe_of(client)
+        keys = [(s, tf, "series", (int(n),)) for s, n in limits.items()]
+
+        def _fetch(missing: list[CacheKey]) -> list[tuple[np.ndarray, np.ndarray]]:
+            got = recent_series(client, {k[0]: k[3][0] for k in missing})
+            empty = (np.empty(0, dtype=np.int64), np.empty(0))
+            return [got.get(k[0], empty) for k in missing]
+
+        return {k[0]: v for k, v in zip(keys, self.get_many(keys, _fetch))}
+
+    def last2(
+        self,
+        client: Any,
+        symbols: Sequence[str],
+        indicator: str,
+        *params: Hashable,
+        incremental: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Indicator at t-1 and t per symbol, e.g. last2(client, syms, "sma", 50).
+        Only symbols not yet evaluated this tick are computed (in one batch):
+        from a close matrix, or with incremental=True from the shared
+        streaming state, which only needs the bars since the last tick.
+        """
+        tf = timeframe_of(client)
+        keys = [(s, tf, indicator, tuple(params)) for s in symbols]
+
+        def _compute(missing: list[CacheKey]) -> list[tuple[float, float]]:
+            fn, bars = _LAST2[indicator]
+            close = self.closes(client, [k[0] for k in missing], bars(*params))
+            prev, now = fn(close, *params)
+            return list(zip(prev.tolist(), now.tolist()))
+
+        def _compute_incremental(missing: list[CacheKey]) -> list[tuple[float, float]]:
+            syms = [k[0] for k in missing]
+            state_key = tf.replace("/", "")  # e.g. "1day"; file-safe for INDICATOR_STATE_DIR
+            engine = load_engine(state_key, {"v": (indicator, *params)})
+            engine.refresh(syms, lambda need: self.series(client, need))
+            save_engine(state_key, engine, symbols=syms)  # other shards write other symbols
+            prev, now = engine.last2("v", syms)
+            return list(zip(prev.tolist(), now.tolist()))
+
+        vals = self.get_many(keys, _compute_incremental if incremental else _compute)
+        if not vals:
+            return np.empty(0), np.empty(0)
+        prev, now = zip(*vals)
+        return np.asarray(prev, dtype=float), np.asarray(now, dtype=float)
+
+    # -----------------------
+    # Stats
+    # -----------------------
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return _stats_dict(self.requests, self.hits, self.computed)
+
+    def report(self, r: Optional[redis.Redis] = None) -> dict[str, Any]:
+        """
+        Log this tick's counters and add them to STATS_KEY. Returns stats().
+        """
+        s = self.stats()
+        logger.info(
+            "indicator cache: %d requests, %d computed (dedup %.2fx)",
+            s["requests"], s["computed"], s["dedup_ratio"],
+        )
+        try:
+            p = (r or get_redis()).pipeline(transaction=False)
+            p.hincrby(STATS_KEY, "ticks", 1)
+            p.hincrby(STATS_KEY, "requests", s["requests"])
+            p.hincrby(STATS_KEY, "hits", s["hits"])
+            p.hincrby(STATS_KEY, "computed", s["computed"])
+            p.execute()
+        except redis.RedisError:
+            pass
+        return s
+
+    def _longest_closes(self, symbols: Sequence[str], tf: str, limit: int) -> dict[str, np.ndarray]:
+        wanted = set(symbols)
+        best: dict[str, np.ndarray] = {}
+        with self._lock:
+            for (sym, t, ind, params), v in self._values.items():
+                if ind == "close" and t == tf and sym in wanted and params[0] > limit:
+                    if sym not in best or len(v) > len(best[sym]):
+                        best[sym] = v
+        return best
+
+
+_MISSING = object()
+
+def _stats_dict(requests: int, hits: int, computed: int) -> dict[str, Any]:
+    return {
+        "requests": requests,
+        "hits": hits,
+        "computed": computed,
+        "dedup_ratio": round(requests / computed, 4) if computed else 0.0,
+    }
+
+
+def indicator_cache_stats() -> dict[str, Any]:
+    """Totals across every reported tick (see IndicatorCache.report)."""
+    raw = get_redis().hgetall(STATS_KEY)
+    return {
+        "ticks": int(raw.get("ticks", 0)),
+        **_stats_dict(int(raw.get("requests", 0)), int(raw.get("hits", 0)), int(raw.get("computed", 0))),
+    }
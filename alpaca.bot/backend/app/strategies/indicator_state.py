@@ -0,0 +1,429 @@
+"""
+Incremental (streaming) indicator state kept between ticks.
+
+Each indicator holds O(1)-update state per symbol in flat arrays: a ring
+buffer + running sum for SMA, last value for EMA. A tick only feeds the bars
+that arrived since the previous tick; the indicator values at t and t-1 are
+then read straight from the state instead of re-reading history.
+
+The engine is checkpointed (np.savez bytes) to Redis or to a directory so
+it survives worker restarts.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Optional, Sequence
+import io
+import json
+import logging
+import time
+import numpy as np
+import redis
+from app.core.config import settings
+from app.engine.locks import RedisLock
+
+logger = logging.getLogger(__name__)
+
+
+class _SymbolRows:
+    """Symbol -> row index, growing the backing arrays on demand."""
+
+    def __init__(self, symbols: Sequence[str] = ()):
+        self.index: dict[str, int] = {}
+        self.symbols: list[str] = []
+        for s in symbols:
+            self.add(s)
+
+    def add(self, symbol: str) -> int:
+        i = self.index.get(symbol)
+        if i is None:
+            i = len(self.symbols)
+            self.index[symbol] = i
+            self.symbols.append(symbol)
+        return i
+
+
+class SmaState:
+    """
+    Rolling SMA for many symbols: ring buffer (S, window), running sum, count.
+
+    update() with a bar whose t equals the last seen t amends that bar (the
+    still-forming bar changes every tick); older bars are ignored.
+    """
+
+    def __init__(self, window: int, n: int = 0):
+        self.window = int(window)
+        self.buf = np.full((n, self.window), np.nan)
+        self.pos = np.zeros(n, dtype=np.int64)      # next write slot
+        self.count = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n)
+        self.prev = np.full(n, np.nan)              # SMA as of the previous bar
+        self.last_t = np.full(n, -1, dtype=np.int64)
+
+    def _grow(self, n: int) -> None:
+        extra = n - len(self.pos)
+        if extra <= 0:
+            return
+        self.buf = np.vstack([self.buf, np.full((extra, self.window), np.nan)])
+        self.pos = np.concatenate([self.pos, np.zeros(extra, dtype=np.int64)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.total = np.concatenate([self.total, np.zeros(extra)])
+        self.prev = np.concatenate([self.prev, np.full(extra, np.nan)])
+        self.last_t = np.concatenate([self.last_t, np.full(extra, -1, dtype=np.int64)])
+
+    def reset(self, i: int) -> None:
+        self.buf[i] = np.nan
+        self.pos[i] = 0
+        self.count[i] = 0
+        self.total[i] = 0.0
+        self.prev[i] = np.nan
+        self.last_t[i] = -1
+
+    def value(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count >= self.window, self.total / self.window, np.nan)
+
+    def update(self, i: int, t: int, close: float) -> None:
+        w = self.window
+        if t < self.last_t[i]:
+            return
+        if t == self.last_t[i]:
+            # Amend the most recent bar in place.
+            j = (self.pos[i] - 1) % w
+            self.total[i] += close - self.buf[i, j]
+            self.buf[i, j] = close
+            return
+
+        self.prev[i] = self.total[i] / w if self.count[i] >= w else np.nan
+        j = self.pos[i]
+        if self.count[i] >= w:
+            self.total[i] -= self.buf[i, j]
+        else:
+            self.count[i] += 1
+        self.total[i] += close
+        self.buf[i, j] = close
+        self.pos[i] = (j + 1) % w
+        self.last_t[i] = t
+        if self.pos[i] == 0 and self.count[i] >= w:
+            # Re-sum once per lap so float drift in the running total can't accumulate.
+            self.total[i] = self.buf[i].sum()
+
+    # -----------------------
+    # Checkpoint
+    # -----------------------
+    def arrays(self, prefix: str) -> dict[str, np.ndarray]:
+        return {
+            f"{prefix}buf": self.buf, f"{prefix}pos": self.pos, f"{prefix}count": self.count,
+            f"{prefix}total": self.total, f"{prefix}prev": self.prev, f"{prefix}last_t": self.last_t,
+        }
+
+    @classmethod
+    def from_arrays(cls, window: int, a: dict[str, np.ndarray], prefix: str) -> "SmaState":
+        s = cls(window)
+        s.buf, s.pos, s.count = a[f"{prefix}buf"], a[f"{prefix}pos"], a[f"{prefix}count"]
+        s.total, s.prev, s.last_t = a[f"{prefix}total"], a[f"{prefix}prev"], a[f"{prefix}last_t"]
+        return s
+
+
+class EmaState:
+    """
+    EMA for many symbols (alpha = 2 / (span + 1)), seeded with the SMA of the
+    first `span` bars. Same amend/ignore rules as SmaState.
+    """
+
+    def __init__(self, span: int, n: int = 0):
+        self.span = int(span)
+        self.alpha = 2.0 / (self.span + 1)
+        self.cur = np.full(n, np.nan)
+        self.prev = np.full(n, np.nan)
+        self.base = np.full(n, np.nan)      # EMA before the last bar (for amends)
+        self.seed_sum = np.zeros(n)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.last_t = np.full(n, -1, dtype=np.int64)
+        self.last_c = np.full(n, np.nan)
+
+    def _grow(self, n: int) -> None:
+        extra = n - len(self.cur)
+        if extra <= 0:
+            return
+        nan = np.full(extra, np.nan)
+        self.cur = np.concatenate([self.cur, nan])
+        self.prev = np.concatenate([self.prev, nan])
+        self.base = np.concatenate([self.base, nan])
+        self.seed_sum = np.concatenate([self.seed_sum, np.zeros(extra)])
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.last_t = np.concatenate([self.last_t, np.full(extra, -1, dtype=np.int64)])
+        self.last_c = np.concatenate([self.last_c, nan])
+
+    def reset(self, i: int) -> None:
+        self.cur[i] = self.prev[i] = self.base[i] = self.last_c[i] = np.nan
+        self.seed_sum[i] = 0.0
+        self.count[i] = 0
+        self.last_t[i] = -1
+
+    def value(self) -> np.ndarray:
+        return self.cur
+
+    def update(self, i: int, t: int, close: float) -> None:
+        if t < self.last_t[i]:
+            return
+        if t == self.last_t[i]:
+            if self.count[i] <= self.span:
+                self.seed_sum[i] += close - self.last_c[i]
+                if self.count[i] == self.span:
+                    self.cur[i] = self.seed_sum[i] / self.span
+            else:
+                self.cur[i] = self.base[i] + self.alpha * (close - self.base[i])
+            self.last_c[i] = close
+            return
+
+        self.prev[i] = self.cur[i]
+        self.count[i] += 1
+        if self.count[i] <= self.span:
+            self.seed_sum[i] += close
+            if self.count[i] == self.span:
+                self.cur[i] = self.seed_sum[i] / self.span
+        else:
+            self.base[i] = self.cur[i]
+            self.cur[i] = self.base[i] + self.alpha * (close - self.base[i])
+        self.last_t[i] = t
+        self.last_c[i] = close
+
+    def arrays(self, prefix: str) -> dict[str, np.ndarray]:
+        return {
+            f"{prefix}cur": self.cur, f"{prefix}prev": self.prev, f"{prefix}base": self.base,
+            f"{prefix}seed_sum": self.seed_sum, f"{prefix}count": self.count,
+            f"{prefix}last_t": self.last_t, f"{prefix}last_c": self.last_c,
+        }
+
+    @classmethod
+    def from_arrays(cls, span: int, a: dict[str, np.ndarray], prefix: str) -> "EmaState":
+        s = cls(span)
+        s.cur, s.prev, s.base = a[f"{prefix}cur"], a[f"{prefix}prev"], a[f"{prefix}base"]
+        s.seed_sum, s.count = a[f"{prefix}seed_sum"], a[f"{prefix}count"]
+        s.last_t, s.last_c = a[f"{prefix}last_t"], a[f"{prefix}last_c"]
+        return s
+
+
+_KINDS = {"sma": SmaState, "ema": EmaState}
+
+
+class IndicatorEngine:
+    """
+    A set of streaming indicators over a symbol universe.
+
+        eng = IndicatorEngine({"fast": ("sma", 10), "slow": ("sma", 50)})
+        need = eng.bars_needed(symbols, tail=3)       # per-symbol fetch size
+        eng.sync({sym: (t_array, close_array), ...})  # feeds only new bars
+        eng.refresh(symbols, fetch)                   # both, refetching symbols with gaps
+        prev, now = eng.last2("fast", symbols)
+    """
+
+    def __init__(self, spec: dict[str, tuple[str, int]]):
+        self.spec = {k: (kind, int(n)) for k, (kind, n) in spec.items()}
+        self.rows = _SymbolRows()
+        self.states: dict[str, Any] = {k: _KINDS[kind](n) for k, (kind, n) in self.spec.items()}
+
+    @property
+    def history_needed(self) -> int:
+        """Bars required to warm a cold symbol (largest window + 1 for the previous value)."""
+        return max(n for _, n in self.spec.values()) + 1
+
+    def _last_t(self, i: int) -> int:
+        return min(int(s.last_t[i]) for s in self.states.values())
+
+    def is_warm(self, symbol: str) -> bool:
+        i = self.rows.index.get(symbol)
+        return i is not None and self._last_t(i) >= 0
+
+    def bars_needed(self, symbols: Sequence[str], *, tail: int = 3) -> dict[str, int]:
+        """
+        How many recent bars to fetch per symbol: a short overlapping tail for
+        warm symbols, full warm-up history for cold ones.
+        """
+        full = self.history_needed
+        return {s: (tail if self.is_warm(s) else full) for s in symbols}
+
+    def sync(self, series: dict[str, tuple[np.ndarray, np.ndarray]]) -> list[str]:
+        """
+        Feed recent bars (t ascending). Bars at or before the last seen bar are
+        skipped (the last one is amended). If a warm symbol's tail does not
+        overlap what we've seen, bars were missed: the symbol is reset to cold
+        and its bars are not fed, since a short tail can't rebuild the
+        windows. Returns those symbols; they need history_needed bars again
+        (see refresh).
+        """
+        gaps: list[str] = []
+        for sym, (t, c) in series.items():
+            if len(t) == 0:
+                continue
+            i = self.rows.add(sym)
+            for st in self.states.values():
+                st._grow(len(self.rows.symbols))
+
+            last = self._last_t(i)
+            if last >= 0 and int(t[0]) > last:
+                logger.info("indicator state: %s has a gap since %d, reseeding", sym, last)
+                for st in self.states.values():
+                    st.reset(i)
+                gaps.append(sym)
+                continue
+
+            for tt, cc in zip(t.tolist(), c.tolist()):
+                if cc != cc:  # NaN close
+                    continue
+                for st in self.states.values():
+                    st.update(i, tt, cc)
+        return gaps
+
+    def refresh(
+        self,
+        symbols: Sequence[str],
+        fetch: Callable[[dict[str, int]], dict[str, tuple[np.ndarray, np.ndarray]]],
+        *,
+        tail: int = 3,
+    ) -> None:
+        """
+        One tick's update: fetch(bars_needed(symbols)) and sync it. Symbols
+        found to have missed bars are refetched with full history right away,
+        so they have values this tick instead of after `window` more bars.
+        """
+        gaps = self.sync(fetch(self.bars_needed(symbols, tail=tail)))
+        if gaps:
+            self.sync(fetch(self.bars_needed(gaps, tail=tail)))
+
+    def merge(self, other: "IndicatorEngine", symbols: Sequence[str]) -> None:
+        """Take `symbols`' state from `other` (same spec), leaving every other symbol as is."""
+        for sym in symbols:
+            j = other.rows.index.get(sym)
+            if j is None:
+                continue
+            i = self.rows.add(sym)
+            for name, st in self.states.items():
+                st._grow(len(self.rows.symbols))
+                src = other.states[name].arrays("")
+                for k, arr in st.arrays("").items():
+                    arr[i] = src[k][j]
+
+    def last2(self, name: str, symbols: Sequence[str]) -> tuple[np.ndarray, np.ndarray]:
+        """(previous, current) value of indicator `name` for `symbols` (NaN if unknown/cold)."""
+        st = self.states[name]
+        cur, prev = st.value(), st.prev
+        out_prev = np.full(len(symbols), np.nan)
+        out_now = np.full(len(symbols), np.nan)
+        for k, s in enumerate(symbols):
+            i = self.rows.index.get(s)
+            if i is not None and i < len(cur):
+                out_prev[k], out_now[k] = prev[i], cur[i]
+        return out_prev, out_now
+
+    # -----------------------
+    # Checkpoint
+    # -----------------------
+    def to_bytes(self) -> bytes:
+        arrays: dict[str, np.ndarray] = {}
+        for name, st in self.states.items():
+            arrays.update(st.arrays(f"{name}."))
+        meta = {"spec": self.spec, "symbols": self.rows.symbols}
+        arrays["__meta__"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+        bio = io.BytesIO()
+        np.savez(bio, **arrays)
+        return bio.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "IndicatorEngine":
+        with np.load(io.BytesIO(data)) as z:
+            a = {k: z[k] for k in z.files}
+        meta = json.loads(a.pop("__meta__").tobytes())
+        eng = cls({k: tuple(v) for k, v in meta["spec"].items()})
+        eng.rows = _SymbolRows(meta["symbols"])
+        for name, (kind, n) in eng.spec.items():
+            eng.states[name] = _KINDS[kind].from_arrays(n, a, f"{name}.")
+        return eng
+
+
+# -----------------------
+# Checkpoint storage
+# -----------------------
+_redis: Optional[redis.Redis] = None
+
+
+def _checkpoint_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.celery_broker_url)  # raw bytes
+    return _redis
+
+
+def _checkpoint_key(key: str, spec: dict[str, tuple[str, int]]) -> str:
+    # Spec is part of the key so a params change starts from fresh state.
+    sig = ",".join(f"{k}={kind}{n}" for k, (kind, n) in sorted(spec.items()))
+    return f"indstate:{key}:{sig}"
+
+
+def _read_checkpoint(ck: str) -> Optional[bytes]:
+    if settings.indicator_state_dir:
+        p = Path(settings.indicator_state_dir) / f"{ck.replace(':', '_')}.npz"
+        return p.read_bytes() if p.exists() else None
+    return _checkpoint_redis().get(ck)
+
+
+def _write_checkpoint(ck: str, data: bytes) -> None:
+    if settings.indicator_state_dir:
+        d = Path(settings.indicator_state_dir)
+        d.mkdir(parents=True, exist_ok=True)
+        p = d / f"{ck.replace(':', '_')}.npz"
+        tmp = p.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(p)
+    else:
+        _checkpoint_redis().set(ck, data, ex=settings.indicator_state_ttl_s)
+
+
+def load_engine(key: str, spec: dict[str, tuple[str, int]]) -> IndicatorEngine:
+    """
+    Restore the checkpoint for `key` (e.g. a strategy id) or start empty.
+    Uses settings.indicator_state_dir when set, else Redis.
+    """
+    ck = _checkpoint_key(key, spec)
+    try:
+        data = _read_checkpoint(ck)
+        if data:
+            return IndicatorEngine.from_bytes(data)
+    except Exception as e:
+        logger.warning("indicator state: could not load %s, starting cold: %s", ck, e)
+    return IndicatorEngine(spec)
+
+
+def save_engine(
+    key: str,
+    engine: IndicatorEngine,
+    *,
+    symbols: Optional[Sequence[str]] = None,
+    lock_timeout_s: float = 5.0,
+) -> None:
+    """
+    Checkpoint `engine` under `key`. With `symbols`, only those symbols'
+    state is written: the current checkpoint is re-read and merged under a
+    Redis lock, so concurrent writers updating different symbols (the
+    shards of one tick) don't overwrite each other. If the lock can't be
+    had within lock_timeout_s the write is skipped; the symbols then reseed
+    next tick instead of clobbering someone else's state.
+    """
+    ck = _checkpoint_key(key, engine.spec)
+    if symbols is None:
+        _write_checkpoint(ck, engine.to_bytes())
+        return
+
+    lock = RedisLock(_checkpoint_redis(), f"{ck}:lock", ttl_s=max(10.0, lock_timeout_s * 2))
+    deadline = time.monotonic() + lock_timeout_s
+    while not lock.acquire():
+        if time.monotonic() >= deadline:
+            logger.warning("indicator state: %s is locked, skipping save of %d symbols", ck, len(symbols))
+            return
+        time.sleep(0.01)
+    try:
+        current = load_engine(key, engine.spec)
+        current.merge(engine, symbols)
+        _write_checkpoint(ck, current.to_bytes())
+    finally:
+        lock.release()
@@ -0,0 +1,82 @@
+"""
+Vectorised indicators over a (symbols x bars) close matrix.
+
+Rows are right-aligned: the last column is the most recent bar and shorter
+histories are NaN-padded on the left. All windows are computed from
+cumulative sums, so every symbol is evaluated in one pass.
+"""
+from __future__ import annotations
+import numpy as np
+
+
+def _window_sums(x: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling sums and rolling counts of finite values over `window` columns.
+    Output has x.shape[1] - window + 1 columns (window ending at each bar).
+    """
+    finite = np.isfinite(x)
+    cs = np.cumsum(np.where(finite, x, 0.0), axis=1)
+    cn = np.cumsum(finite, axis=1)
+    zeros = np.zeros((x.shape[0], 1))
+    cs = np.hstack([zeros, cs])
+    cn = np.hstack([zeros, cn])
+    return cs[:, window:] - cs[:, :-window], cn[:, window:] - cn[:, :-window]
+
+
+def sma(close: np.ndarray, window: int) -> np.ndarray:
+    """
+    Full rolling SMA, same shape as `close`; NaN until a full window of data.
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    out = np.full(close.shape, np.nan)
+    if window <= 0 or close.shape[1] < window:
+        return out
+    sums, counts = _window_sums(close, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[:, window - 1:] = np.where(counts == window, sums / window, np.nan)
+    return out
+
+
+def sma_last2(close: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    SMA at t-1 and t for every row, touching only the last window + 1 bars.
+    Returns (prev, now), each shape (S,), NaN where the window is incomplete.
+    """
+    close = np.atleast_2d(np.asarray(close, dtype=float))
+    n = close.shape[0]
+    if window <= 0 or close.shape[1] < window + 1:
+        return np.full(n, np.nan), np.full(n, np.nan)
+    tail = close[:, -(window + 1):]
+    sums, counts = _window_sums(tail, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        v = np.where(counts == window, sums / window, np.nan)
+    return v[:, 0], v[:, 1]
+
+
+def crossover(
+    fast_prev: np.ndarray,
+    fast_now: np.ndarray,
+    slow_prev: np.ndarray,
+    slow_now: np.ndarray,
+) -> np.ndarray:
+    """
+    +1 where fast crosses above slow, -1 where it crosses below, else 0.
+    Cross up: fast goes from <= slow to > slow (and symmetrically for down).
+    NaN inputs never cross.
+    """
+    up = (fast_prev <= slow_prev) & (fast_now > slow_now)
+    down = (fast_prev >= slow_prev) & (fast_now < slow_now)
+    return up.astype(np.int8) - down.astype(np.int8)
+
+
+def right_align(series: list[np.ndarray], length: int) -> np.ndarray:
+    """
+    Stack 1-D close arrays into a (len(series), length) matrix, keeping the
+    last `length` values of each and NaN-padding shorter ones on the left.
+    """
+    out = np.full((len(series), length), np.nan)
+    for i, s in enumerate(series):
+        s = np.asarray(s, dtype=float)[-length:]
+        if len(s):
+            out[i, length - len(s):] = s
+    return out
@@ -1,6 +1,9 @@
 from __future__ import annotations
+from functools import partial
 from typing import Any
+from app.engine.market_data import recent_series
 from app.strategies.base import Signal
+from app.strategies.indicator_state import load_engine, save_engine
 
 class SMACrossStrategy:
     key = "sma_cross"
@@ -9,19 +12,38 @@ class SMACrossStrategy:
     def __init__(self, market_data):
         self.market_data = market_data
 
-    def run(self, *, symbols: list[str], params: dict[str, Any]) -> list[Signal]:
+    def run(self, *, symbols: list[str], params: dict[str, Any], state_key: str | None = None) -> list[Signal]:
+        """
+        With `state_key` (and a market_data that has get_bars), SMAs come from
+        streaming indicator state checkpointed under that key instead of being
+        recomputed from max(slow, 60) closes every tick.
+        """
         fast = int(params.get("fast", 10))
         slow = int(params.get("slow", 30))
         qty  = float(params.get("qty", 1))
 
+        smas = None
+        if state_key and hasattr(self.market_data, "get_bars"):
+            engine = load_engine(state_key, {"fast": ("sma", fast), "slow": ("sma", slow)})
+            engine.refresh(symbols, partial(recent_series, self.market_data))
+            save_engine(state_key, engine)
+            _, fast_now = engine.last2("fast", symbols)
+            _, slow_now = engine.last2("slow", symbols)
+            smas = dict(zip(symbols, zip(fast_now.tolist(), slow_now.tolist())))
+
         out: list[Signal] = []
         for sym in symbols:
-            closes = self.market_data.get_recent_closes(sym, limit=max(slow, 60))
-            if len(closes) < slow:
-                continue
+            if smas is not None:
+                fast_sma, slow_sma = smas[sym]
+                if fast_sma != fast_sma or slow_sma != slow_sma:  # NaN: not enough history yet
+                    continue
+            else:
+                closes = self.market_data.get_recent_closes(sym, limit=max(slow, 60))
+                if len(closes) < slow:
+                    continue
 
-            fast_sma = sum(closes[-fast:]) / fast
-            slow_sma = sum(closes[-slow:]) / slow
+                fast_sma = sum(closes[-fast:]) / fast
+                slow_sma = sum(closes[-slow:]) / slow
 
             # naive cross check: compare current smas only (upgrade later with prev values)
             if fast_sma > slow_sma:
@@ -0,0 +1,53 @@
+from __future__ import annotations
+from typing import Any, Optional, Sequence
+from app.core.events import EVENT_CHANNEL
+from app.db.session import SessionLocal
+from app.strategies.base import StrategyBase, StrategyContext
+from app.strategies.indicator_cache import IndicatorCache
+from app.strategies.models.cross_over import SmaCrossOverStrategy
+
+# StrategyConfig.type -> StrategyBase subclass
+STRATEGY_TYPES: dict[str, type[StrategyBase]] = {
+    cls.TYPE: cls
+    for cls in (
+        SmaCrossOverStrategy,
+    )
+}
+
+
+def get_strategy_class(type_: str) -> type[StrategyBase]:
+    try:
+        return STRATEGY_TYPES[type_]
+    except KeyError:
+        raise ValueError(f"Unknown strategy type {type_!r} (known: {', '.join(sorted(STRATEGY_TYPES))})") from None
+
+
+def make_strategy(
+    row: Any,
+    *,
+    broker_client: Any,
+    indicators: Optional[IndicatorCache] = None,
+    symbols: Optional[Sequence[str]] = None,
+    publish_signals: bool = True,
+) -> StrategyBase:
+    """
+    Instantiate the strategy for a StrategyConfig row. `symbols` overrides
+    the configured list (e.g. one shard of the universe).
+    """
+    cls = get_strategy_class(row.type)
+    return cls(
+        StrategyContext(
+            db_session_factory=SessionLocal,
+            id=row.id,
+            name=row.name,
+            type=row.type,
+            enabled=row.enabled,
+            interval_seconds=row.interval_seconds,
+            symbols=list(symbols) if symbols is not None else row.symbols,
+            broker_client=broker_client,
+            event_channel=EVENT_CHANNEL,
+            params=row.params or {},
+            indicators=indicators,
+            publish_signals=publish_signals,
+        )
+    )
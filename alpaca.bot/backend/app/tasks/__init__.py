@@ -1 +1 @@
-from . import runner
\ No newline at end of file
+from . import runner, backfill, optimize, scheduler
\ No newline at end of file
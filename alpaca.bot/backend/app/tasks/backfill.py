@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from pathlib import Path
+from celery.utils.log import get_task_logger
+
+from app.tasks.celery_app import celery
+from app.core.config import settings
+from app.engine.massive_service import MassiveDataService
+from app.engine.backfill import DailyMatrix, backfill_daily_matrix
+from app.engine.rate_limit import get_massive_rate_limiter
+
+logger = get_task_logger(__name__)
+
+
+@celery.task(name="app.tasks.backfill.daily_history", bind=True)
+def daily_history(self, days: int = 730, max_workers: int = 8) -> dict:
+    """
+    Refresh the on-disk daily matrix with the last `days` calendar days of
+    Grouped Daily bars. Dates already saved are not requested again.
+    """
+    path = Path(settings.daily_matrix_dir)
+    existing = DailyMatrix.load(path, mmap=False) if (path / "meta.json").exists() else None
+
+    end = date.today()
+    start = end - timedelta(days=days)
+    svc = MassiveDataService(api_key=settings.polygon_api_key, rate_limiter=get_massive_rate_limiter())
+
+    m = backfill_daily_matrix(svc, start, end, existing=existing, max_workers=max_workers)
+    m.save(path)
+
+    logger.info("daily backfill: saved %d symbols x %d dates to %s", len(m.symbols), len(m.dates), path)
+    return {
+        "ok": True,
+        "symbols": int(len(m.symbols)),
+        "dates": int(len(m.dates)),
+        "path": str(path),
+    }
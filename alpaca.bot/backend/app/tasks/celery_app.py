@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init
 from app.core.config import settings
 import os
 import platform
@@ -20,5 +21,20 @@ celery.conf.beat_schedule = {
     "tick-every-10s": {
         "task": "app.tasks.runner.tick",
         "schedule": 60.0,
-    }
+    },
+    "dispatch-due-strategies": {
+        "task": "app.tasks.scheduler.dispatch",
+        "schedule": settings.scheduler_resolution_s,
+        # a dispatch that sat in the queue past the next one is pointless
+        "options": {"expires": max(1.0, settings.scheduler_resolution_s * 2)},
+    },
 }
+
+
+@worker_process_init.connect
+def _warm_portfolio_cache(**_kwargs):
+    # Seed positions/buying power before the first tick needs them (from the
+    # state shared through Redis: one broker fetch for all pool children)
+    from app.engine.portfolio import get_portfolio_cache
+
+    get_portfolio_cache()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Optional
+from celery.utils.log import get_task_logger
+
+from app.tasks.celery_app import celery
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db import models
+from app.engine.backfill import DailyMatrix
+from app.engine.backtest import BacktestData
+from app.engine.walk_forward import SUGGESTION_KEY, save_suggestion, walk_forward as run_walk_forward
+from app.strategies.registry import get_strategy_class
+
+logger = get_task_logger(__name__)
+
+
+@celery.task(name="app.tasks.optimize.walk_forward", bind=True)
+def walk_forward(
+    self,
+    strategy_id: str,
+    grid: dict[str, list[Any]],
+    train_days: int = 252,
+    test_days: int = 63,
+    metric: str = "sharpe",
+    workers: Optional[int] = None,
+) -> dict:
+    """
+    Walk-forward optimise one StrategyConfig over the saved daily matrix and
+    record the result in its params as a suggestion (live params untouched).
+
+    grid: {"fast": [5, 10, 20], "slow": [50, 100, 200]}; days are trading days.
+
+    Under the default prefork pool the sweep runs in this worker process
+    (a pool child can't start its own processes); route this task to a
+    worker started with -P solo or -P threads to spread it over every core.
+    """
+    with SessionLocal() as db:
+        row = db.get(models.StrategyConfig, strategy_id)
+        if row is None:
+            return {"ok": False, "error": "strategy not found"}
+        cls = get_strategy_class(row.type)
+        symbols = _config_symbols(row.symbols)
+        base_params = {k: v for k, v in (row.params or {}).items() if k not in grid and k != SUGGESTION_KEY}
+
+    m = DailyMatrix.load(Path(settings.daily_matrix_dir))
+    data = BacktestData.from_daily_matrix(m, symbols=symbols or None)
+
+    result = run_walk_forward(
+        cls,
+        data,
+        grid,
+        train_bars=train_days,
+        test_bars=test_days,
+        metric=metric,
+        base_params=base_params,
+        workers=workers,
+    )
+
+    with SessionLocal() as db:
+        save_suggestion(db, strategy_id, result)
+
+    logger.info(
+        "walk-forward %s: %d folds, suggested %s (oos %s)",
+        strategy_id, len(result["folds"]), result["suggested_params"], result["oos"],
+    )
+    return {
+        "ok": True,
+        "strategy_id": strategy_id,
+        "folds": len(result["folds"]),
+        "suggested_params": result["suggested_params"],
+        "oos": result["oos"],
+    }
+
+
+def _config_symbols(symbols: Any) -> list[str]:
+    # StrategyConfig.symbols is a list, or a dict keyed by symbol / {"symbols": [...]}
+    if isinstance(symbols, dict):
+        symbols = symbols["symbols"] if isinstance(symbols.get("symbols"), list) else list(symbols)
+    return [str(s).upper() for s in symbols or []]
@@ -1,6 +1,12 @@
 from __future__ import annotations
 
+import time
 from datetime import datetime, timezone
+from contextlib import nullcontext
+from typing import Any, Optional
+import redis
+from celery import chord
+from celery.exceptions import SoftTimeLimitExceeded
 from sqlalchemy import select
 from celery.utils.log import get_task_logger
 
@@ -9,11 +15,35 @@ from app.db.session import SessionLocal
 from app.db import models
 from app.core.events import publish_event
 from app.core.config import settings
-from app.engine.massive_service import MassiveDataService
+from app.core.redis_client import TICK_LAST_KEY, TICK_LOCK_KEY, get_redis
+from app.engine.massive_service import MassiveDataService, SnapshotQuote
+from app.engine.market_data import MassiveMarketData
+from app.engine.bar_store import BarStore
+from app.engine.locks import RedisLock
+from app.engine.portfolio import get_portfolio_cache
+from app.engine.rate_limit import get_massive_rate_limiter
+from app.engine.risk import RiskLimits, apply_risk
+from app.engine.snapshot_cache import get_snapshot_cache
+from app.strategies.base import MarketContext, Signal
+from app.strategies.indicator_cache import IndicatorCache
+from app.strategies.registry import make_strategy
 
 logger = get_task_logger(__name__)
 
 
+class Deadline:
+    """Wall-clock budget shared by every task of one tick (epoch seconds)."""
+
+    def __init__(self, at: float):
+        self.at = at
+
+    def remaining(self) -> float:
+        return self.at - time.time()
+
+    def allows(self, min_remaining_s: float = 0.0) -> bool:
+        return self.remaining() > min_remaining_s
+
+
 @celery.task(
     name="app.tasks.runner.tick",
     bind=True,
@@ -25,44 +55,383 @@ logger = get_task_logger(__name__)
     max_retries=3,
 )
 def tick(self) -> dict:
+    """
+    Fan out one pass over the enabled symbol universe: shards of at most
+    TICK_SHARD_SYMBOLS symbols are fetched and evaluated by tick_shard on
+    any worker, and tick_merge combines them once all shards are done.
+
+    Strategies evaluated here are the enabled ones without their own symbol
+    list (universe strategies) whose interval_seconds has elapsed since
+    their last run; the rest run on their own interval through
+    app.tasks.scheduler.
+
+    Only one tick runs at a time across replicas: TICK_LOCK_KEY is held from
+    here until tick_merge or tick_failed releases it. It is taken for
+    TICK_BUDGET_S + TICK_LOCK_SLACK_S and shards keep it alive while they
+    run, so a shard that overruns the budget never lets the next beat in.
+    The task id is the lock token, so a retry of this tick gets it back but
+    a new beat firing while it runs is skipped. Every stage works against a
+    deadline TICK_BUDGET_S from now; each shard gets a soft time limit at
+    that deadline (less the merge reserve).
+    """
+    started = time.time()
+    lock = RedisLock(
+        get_redis(),
+        TICK_LOCK_KEY,
+        ttl_s=settings.tick_budget_s + settings.tick_lock_slack_s,
+        token=self.request.id,
+    )
+    if not lock.acquire():
+        logger.warning("tick: previous tick still running (lock held by %s); skipping", lock.holder())
+        return {"ok": False, "skipped": "overlap"}
+
+    try:
+        with SessionLocal() as db:
+            symbols = (
+                db.execute(select(models.Symbol.symbol).where(models.Symbol.enabled.is_(True)))
+                .scalars()
+                .all()
+            )
+            strategy_ids = [
+                sid
+                for sid, syms, interval, last in db.execute(
+                    select(
+                        models.StrategyConfig.id,
+                        models.StrategyConfig.symbols,
+                        models.StrategyConfig.interval_seconds,
+                        models.StrategyConfig.last_run_at,
+                    ).where(models.StrategyConfig.enabled.is_(True))
+                ).all()
+                if not syms and is_due(last, interval, started)
+            ]
+
+        now = datetime.now(timezone.utc).isoformat()
+        deadline = started + settings.tick_budget_s
+        shards = shard_symbols(symbols, settings.tick_shard_symbols)
+        logger.info(
+            "tick: %d symbols in %d shards, %d universe strategies", len(symbols), len(shards), len(strategy_ids)
+        )
+
+        if not shards:
+            lock.release()
+            publish_event({"type": "tick", "at": now, "symbol_count": 0, "shards": 0})
+            return {"ok": True, "at": now, "symbol_count": 0, "shards": 0}
+
+        soft_s = max(1.0, deadline - settings.tick_merge_reserve_s - time.time())
+        chord(
+            tick_shard.s(shard, strategy_ids, now, deadline, lock_token=lock.token).set(
+                soft_time_limit=soft_s, time_limit=soft_s + settings.tick_lock_slack_s
+            )
+            for shard in shards
+        )(tick_merge.s(
+            at=now,
+            started=started,
+            deadline=deadline,
+            symbol_count=len(symbols),
+            strategy_ids=strategy_ids,
+            lock_token=lock.token,
+        ).on_error(tick_failed.s(at=now, lock_token=lock.token)))
+    except Exception:
+        lock.release()
+        raise
+
+    return {"ok": True, "at": now, "symbol_count": len(symbols), "shards": len(shards)}
+
+
+# Beat does not fire exactly on the second: a strategy due within this many
+# seconds of a tick runs on it rather than a whole beat period later.
+DUE_SLACK_S = 5.0
+
+
+def is_due(last_run_at: Optional[datetime], interval_seconds: Optional[int], now: float) -> bool:
+    """Whether a universe strategy's interval has elapsed at `now` (epoch s)."""
+    if last_run_at is None:
+        return True
+    if last_run_at.tzinfo is None:  # SQLite drops the offset; stored as UTC
+        last_run_at = last_run_at.replace(tzinfo=timezone.utc)
+    return last_run_at.timestamp() + max(1, int(interval_seconds or 60)) <= now + DUE_SLACK_S
+
+
+def shard_symbols(symbols: list[str], budget: int) -> list[list[str]]:
+    """Split into ceil(n / budget) shards of near-equal size."""
+    if not symbols:
+        return []
+    n = max(1, -(-len(symbols) // max(1, budget)))
+    size = -(-len(symbols) // n)
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+@celery.task(name="app.tasks.runner.tick_shard", bind=True, acks_late=True)
+def tick_shard(
+    self,
+    symbols: list[str],
+    strategy_ids: list[str],
+    at: str,
+    deadline: float,
+    lock_token: Optional[str] = None,
+) -> dict:
+    """
+    One shard of a tick: snapshot the shard's symbols and evaluate every
+    universe strategy on them. Returns a small, JSON-safe summary; signals
+    are not published here (tick_merge publishes one event for the tick).
+
+    Stages stop TICK_MERGE_RESERVE_S before the deadline so the merge still
+    fits. Strategies run in params["priority"] order (highest first), so the
+    least important are the ones skipped when time runs short; the
+    indicator-stats stage only runs with TICK_LOW_PRIORITY_MIN_S to spare.
+    Data requests are cut off at the same point, and a stage still running
+    when the soft time limit fires ends the shard with what it has so far
+    ("time_limit" in "skipped"). A failed snapshot or strategy is recorded
+    in "errors" and the shard still returns, so tick_merge always runs.
+
+    With a lock_token the shard heartbeats the tick lock while it runs.
+    """
+    t0 = time.perf_counter()
+    budget = Deadline(deadline - settings.tick_merge_reserve_s)
+    out: dict[str, Any] = {
+        "symbols": len(symbols),
+        "snapshot_rows": 0,
+        "snapshot_ms": 0,
+        "signals": [],
+        "errors": [],
+        "prices": {},
+        "skipped": [],
+        "skipped_strategies": [],
+    }
+    if not budget.allows():
+        out["skipped"] = ["snapshot", "strategies", "indicator_stats"]
+        out["skipped_strategies"] = list(strategy_ids)
+        out["ms"] = int((time.perf_counter() - t0) * 1000)
+        return out
+
+    prices: dict[str, Optional[float]] = {}
+    done: set[str] = set()
+    heartbeat = (
+        RedisLock(get_redis(), TICK_LOCK_KEY, ttl_s=1, token=lock_token).held(
+            settings.tick_merge_reserve_s + settings.tick_lock_slack_s
+        )
+        if lock_token else nullcontext()
+    )
+    try:
+        with heartbeat:
+            _shard_stages(out, prices, done, symbols, strategy_ids, at, budget, t0)
+    except SoftTimeLimitExceeded:
+        logger.warning("tick shard: time limit hit with %d/%d strategies done", len(done), len(strategy_ids))
+        out["errors"].append({"strategy_id": None, "stage": "time_limit", "error": "soft time limit exceeded"})
+        out["skipped_strategies"] = [sid for sid in strategy_ids if sid not in done]
+        out["skipped"].append("time_limit")
+        if out["skipped_strategies"] and "strategies" not in out["skipped"]:
+            out["skipped"].append("strategies")
+        if "indicator_cache" not in out and "indicator_stats" not in out["skipped"]:
+            out["skipped"].append("indicator_stats")
+
+    out["prices"] = {s["symbol"]: prices.get(s["symbol"]) for s in out["signals"]}
+    out["ms"] = int((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def _shard_stages(
+    out: dict[str, Any],
+    prices: dict[str, Optional[float]],
+    done: set[str],
+    symbols: list[str],
+    strategy_ids: list[str],
+    at: str,
+    budget: Deadline,
+    t0: float,
+) -> None:
+    """tick_shard's stages; fills out/prices/done as it goes so a time limit keeps the partial result."""
+    svc = MassiveDataService(
+        api_key=settings.polygon_api_key,
+        bar_store=(
+            BarStore(settings.bar_store_dir, publish_lag_s=settings.bar_store_publish_lag_s)
+            if settings.bar_store_dir else None
+        ),
+        rate_limiter=get_massive_rate_limiter(),
+        deadline=budget.at,
+    )
+    snapshots = get_snapshot_cache(svc) or svc
+
+    # A failed snapshot must not fail the shard: the chord would never run
+    # tick_merge. Strategies still run; risk falls back to cached prices.
+    try:
+        snap = snapshots.get_market_snapshot(symbols)
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception as e:
+        logger.exception("tick shard: snapshot of %d symbols failed", len(symbols))
+        out["errors"].append({"strategy_id": None, "stage": "snapshot", "error": str(e)})
+        snap = []
+    out["snapshot_rows"] = len(snap)
+    out["snapshot_ms"] = int((time.perf_counter() - t0) * 1000)
+    prices.update({q.ticker: q.price for q in map(SnapshotQuote.from_row, snap) if q.ticker})
+
     with SessionLocal() as db:
-        symbols = (
-            db.execute(select(models.Symbol.symbol).where(models.Symbol.enabled.is_(True)))
-            .scalars()
-            .all()
+        rows = list(
+            db.execute(select(models.StrategyConfig).where(models.StrategyConfig.id.in_(strategy_ids))).scalars()
         )
+    rows.sort(key=lambda r: -float((r.params or {}).get("priority", 0)))
 
-    now = datetime.now(timezone.utc).isoformat()
-    logger.info("tick: loaded %d symbols (sample=%s)", len(symbols), symbols[:10])
-
-    # --- TEST: call Massive snapshot for a small subset first ---
-    svc = MassiveDataService(api_key=settings.polygon_api_key)
-
-    test_symbols = symbols[:50]  # start small; increase once confirmed working
-    t0 = datetime.now(timezone.utc)
-    snap = svc.get_market_snapshot(test_symbols)
-    dt_ms = int((datetime.now(timezone.utc) - t0).total_seconds() * 1000)
-    sample = snap[:3]
-    logger.info("massive snapshot: got %d rows in %dms (sample=%s)", len(snap), dt_ms, sample)
-
-    publish_event(
-        {
-            "at": now,
-            "symbol_count": len(symbols),
-            "tested_symbol_count": len(test_symbols),
-            "snapshot_row_count": len(snap),
-            "snapshot_sample": sample,
-            "snapshot_ms": dt_ms,
-        },
+    market_data = MassiveMarketData(svc)
+    indicators = IndicatorCache()
+    market = MarketContext(now_iso=at)
+    for row in rows:
+        if not budget.allows():
+            out["skipped_strategies"].append(row.id)
+            continue
+        try:
+            strategy = make_strategy(
+                row, broker_client=market_data, indicators=indicators, symbols=symbols, publish_signals=False
+            )
+            signals = [{"strategy_id": row.id, **s.__dict__} for s in strategy.generate_signals(market)]
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            logger.exception("tick shard: strategy %s failed", row.id)
+            out["errors"].append({"strategy_id": row.id, "error": str(e)})
+            signals = []
+        out["signals"].extend(signals)
+        done.add(row.id)
+    if out["skipped_strategies"]:
+        out["skipped"].append("strategies")
+
+    if budget.allows(settings.tick_low_priority_min_s):
+        out["indicator_cache"] = indicators.report()
+    else:
+        out["skipped"].append("indicator_stats")
+
+
+@celery.task(name="app.tasks.runner.tick_merge", bind=True)
+def tick_merge(
+    self,
+    shard_results: list[dict],
+    *,
+    at: str,
+    started: float,
+    deadline: float,
+    symbol_count: int,
+    strategy_ids: list[str],
+    lock_token: Optional[str] = None,
+) -> dict:
+    """
+    Fan-in: combine shard signals, run them through the risk limits as one
+    batch (against the cached portfolio when enabled), record a StrategyRun per strategy and publish a single event with
+    how much of the tick budget was used. Releases the tick lock.
+    """
+    lock = None
+    if lock_token:
+        # Shards heartbeat the lock, but the merge may be picked up late
+        ttl_s = settings.tick_merge_reserve_s + settings.tick_lock_slack_s
+        lock = RedisLock(get_redis(), TICK_LOCK_KEY, ttl_s=ttl_s, token=lock_token)
+        try:
+            if not (lock.extend(ttl_s) or lock.acquire()):
+                logger.warning("tick merge %s: tick lock lost to %s; ticks overlapped", at, lock.holder())
+                lock = None
+        except redis.RedisError as e:
+            logger.warning("tick merge %s: could not extend the tick lock: %s", at, e)
+
+    raw = [s for r in shard_results for s in r["signals"]]
+    errors = [e for r in shard_results for e in r["errors"]]
+    prices = {k: v for r in shard_results for k, v in r["prices"].items()}
+
+    by_strategy: dict[str, list[Signal]] = {}
+    for s in raw:
+        s = dict(s)
+        by_strategy.setdefault(s.pop("strategy_id"), []).append(Signal(**s))
+
+    # Exposure checks read the worker's in-memory portfolio (no broker calls)
+    portfolio = get_portfolio_cache()
+    if portfolio is not None:
+        portfolio.mark(prices)
+    accepted, rejected = apply_risk(
+        [s for sigs in by_strategy.values() for s in sigs], RiskLimits(), portfolio=portfolio, prices=prices
     )
 
-    return {
-        "ok": True,
-        "at": now,
-        "symbol_count": len(symbols),
-        "tested_symbol_count": len(test_symbols),
-        "snapshot_row_count": len(snap),
-        "snapshot_ms": dt_ms,
+    finished = datetime.now(timezone.utc)
+    failed = {e["strategy_id"]: e["error"] for e in errors if e.get("strategy_id") is not None}
+    skipped_in: dict[str, int] = {}
+    for res in shard_results:
+        for sid in res["skipped_strategies"]:
+            skipped_in[sid] = skipped_in.get(sid, 0) + 1
+    with SessionLocal() as db:
+        for sid in strategy_ids:
+            sigs = by_strategy.get(sid, [])
+            db.add(models.StrategyRun(
+                strategy_id=sid,
+                started_at=datetime.fromisoformat(at),
+                finished_at=finished,
+                status="error" if sid in failed else "partial" if sid in skipped_in else "ok",
+                message=failed.get(sid) or (
+                    f"skipped in {skipped_in[sid]}/{len(shard_results)} shards (deadline)" if sid in skipped_in else None
+                ),
+                signals={"signals": [s.__dict__ for s in sigs]},
+                metrics={"source": "tick", "shards": len(shard_results)},
+            ))
+        if strategy_ids:
+            db.query(models.StrategyConfig).filter(
+                models.StrategyConfig.id.in_(strategy_ids)
+            ).update({models.StrategyConfig.last_run_at: datetime.fromisoformat(at)}, synchronize_session=False)
+        db.commit()
+
+    shard_ms = [r["ms"] for r in shard_results]
+    wall_ms = int((time.time() - started) * 1000)
+    budget_ms = int((deadline - started) * 1000)
+    skipped_stages: dict[str, int] = {}
+    for r in shard_results:
+        for stage in r["skipped"]:
+            skipped_stages[stage] = skipped_stages.get(stage, 0) + 1
+    summary = {
+        "at": at,
+        "symbol_count": symbol_count,
+        "shards": len(shard_results),
+        "snapshot_row_count": sum(r["snapshot_rows"] for r in shard_results),
+        "wall_ms": wall_ms,
+        "shard_ms_max": max(shard_ms),
+        "shard_ms_sum": sum(shard_ms),
+        "signal_count": len(raw),
+        "accepted_count": len(accepted),
+        "rejected_count": len(rejected),
+        "error_count": len(errors),
+        "budget_ms": budget_ms,
+        "budget_used_pct": round(100.0 * wall_ms / budget_ms, 1) if budget_ms > 0 else None,
+        "skipped_stages": skipped_stages,
+        "skipped_strategy_count": len(skipped_in),
     }
 
+    rc = get_redis()
+    try:
+        rc.hset(TICK_LAST_KEY, mapping={k: str(v) for k, v in summary.items() if not isinstance(v, dict)})
+    except redis.RedisError:
+        pass
+    if lock is not None:
+        lock.release()
+
+    publish_event({
+        "type": "tick",
+        **summary,
+        "signals": [{**s.__dict__, "price": prices.get(s.symbol)} for s in accepted],
+        "rejected": [{**r["signal"].__dict__, "error": r["error"]} for r in rejected],
+        "errors": errors,
+    })
+    logger.info(
+        "tick merge: %d shards, %d signals (%d accepted), wall %dms = %s%% of budget, slowest shard %dms, skipped %s",
+        len(shard_results), len(raw), len(accepted), wall_ms, summary["budget_used_pct"],
+        summary["shard_ms_max"], skipped_stages or "nothing",
+    )
+    return {"ok": True, **summary}
+
 
+@celery.task(name="app.tasks.runner.tick_failed")
+def tick_failed(request: Any, exc: BaseException, traceback: Any, *, at: str, lock_token: Optional[str] = None) -> None:
+    """
+    Chord errback: a shard or tick_merge raised, so tick_merge won't release
+    the tick lock. Release it now (the next beat would otherwise be skipped
+    until the TTL runs out) and publish a failed tick event.
+    """
+    logger.error("tick %s failed: %r", at, exc)
+    if lock_token:
+        try:
+            RedisLock(get_redis(), TICK_LOCK_KEY, ttl_s=1, token=lock_token).release()
+        except redis.RedisError:
+            logger.warning("tick %s: could not release the tick lock; it expires on its own", at)
+    publish_event({"type": "tick", "at": at, "ok": False, "error": str(exc)})
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from sqlalchemy import select
+from celery.utils.log import get_task_logger
+
+from app.tasks.celery_app import celery
+from app.db.session import SessionLocal
+from app.db import models
+from app.core.config import settings
+from app.engine.massive_service import MassiveDataService
+from app.engine.market_data import MassiveMarketData
+from app.engine.bar_store import BarStore
+from app.engine.rate_limit import get_massive_rate_limiter
+from app.engine.scheduler import get_scheduler
+from app.strategies.base import MarketContext
+from app.strategies.indicator_cache import IndicatorCache
+from app.strategies.registry import make_strategy
+
+logger = get_task_logger(__name__)
+
+
+@celery.task(name="app.tasks.scheduler.dispatch", ignore_result=True)
+def dispatch() -> dict:
+    """
+    Fired by beat every SCHEDULER_RESOLUTION_S. Queues the strategies whose
+    interval_seconds has elapsed; does nothing else unless configs changed.
+    """
+    sched = get_scheduler()
+    if sched.needs_sync():
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(
+                    models.StrategyConfig.id,
+                    models.StrategyConfig.interval_seconds,
+                    models.StrategyConfig.last_run_at,
+                    models.StrategyConfig.symbols,
+                ).where(models.StrategyConfig.enabled.is_(True))
+            ).all()
+        # Strategies without their own symbol list run over the universe on the
+        # tick, which checks their interval itself (runner.is_due)
+        sched.sync((i, n, last) for i, n, last, symbols in rows if symbols)
+
+    due = sched.claim_due()
+    if due:
+        run_strategies.delay(due)
+    return {"due": len(due)}
+
+
+@celery.task(name="app.tasks.scheduler.run_strategies", bind=True, acks_late=True)
+def run_strategies(self, strategy_ids: list[str]) -> dict:
+    """
+    Run the given strategies once, sharing one market data client and one
+    IndicatorCache between them, and stamp last_run_at / a StrategyRun each.
+    """
+    with SessionLocal() as db:
+        rows = list(
+            db.execute(
+                select(models.StrategyConfig).where(
+                    models.StrategyConfig.id.in_(strategy_ids),
+                    models.StrategyConfig.enabled.is_(True),
+                )
+            ).scalars()
+        )
+
+    svc = MassiveDataService(
+        api_key=settings.polygon_api_key,
+        bar_store=(
+            BarStore(settings.bar_store_dir, publish_lag_s=settings.bar_store_publish_lag_s)
+            if settings.bar_store_dir else None
+        ),
+        rate_limiter=get_massive_rate_limiter(),
+    )
+    market_data = MassiveMarketData(svc)
+    indicators = IndicatorCache()
+    market = MarketContext(now_iso=datetime.now(timezone.utc).isoformat())
+
+    results: dict[str, dict] = {}
+    for row in rows:
+        results[row.id] = run_one(row, market_data, indicators, market)
+
+    indicators.report()
+    return {"ok": True, "ran": len(results), "results": results}
+
+
+def run_one(row: models.StrategyConfig, market_data, indicators: IndicatorCache, market: MarketContext) -> dict:
+    """Evaluate one strategy and record the run; errors are recorded, not raised."""
+    started = datetime.now(timezone.utc)
+
+    with SessionLocal() as db:
+        run = models.StrategyRun(strategy_id=row.id, started_at=started, status="running")
+        db.add(run)
+        db.commit()
+
+        try:
+            strategy = make_strategy(row, broker_client=market_data, indicators=indicators)
+            signals = strategy.generate_signals(market)
+            run.status = "ok"
+            run.signals = {"signals": [s.__dict__ for s in signals]}
+        except Exception as e:
+            logger.exception("strategy %s (%s) failed", row.id, row.type)
+            signals = []
+            run.status = "error"
+            run.message = str(e)
+
+        finished = datetime.now(timezone.utc)
+        run.finished_at = finished
+        run.metrics = {"duration_ms": int((finished - started).total_seconds() * 1000)}
+        db.query(models.StrategyConfig).filter(models.StrategyConfig.id == row.id).update(
+            {models.StrategyConfig.last_run_at: started}
+        )
+        db.commit()
+
+    return {"status": run.status, "signals": len(signals)}
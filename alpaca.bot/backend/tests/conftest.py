@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+# Settings are read at import time; give the required ones harmless values
+# so the app modules import without a .env (real services are never hit).
+for _k, _v in {
+    "ALPACA_API_KEY": "test",
+    "ALPACA_API_SECRET": "test",
+    "DATABASE_URL": f"sqlite:///{tempfile.gettempdir()}/bots-tests-{os.getpid()}.db",
+    "CELERY_BROKER_URL": "redis://localhost:6379/0",
+    "CELERY_RESULT_BACKEND": "redis://localhost:6379/1",
+    "POLYGON_API_KEY": "test",
+    "PORT": "8001",
+}.items():
+    os.environ.setdefault(_k, _v)
+
+import fakeredis
+import pytest
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def r(redis_server):
+    """In-memory Redis with Lua support (decode_responses, like the app's shared clients)."""
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+
+@pytest.fixture
+def rb(redis_server):
+    """Same server as `r`, returning raw bytes (checkpoints, event frames)."""
+    return fakeredis.FakeRedis(server=redis_server)
+
+
+@pytest.fixture
+def db():
+    """Fresh tables in the test database; yields SessionLocal."""
+    from app.db.models import Base
+    from app.db.session import SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    yield SessionLocal
+    Base.metadata.drop_all(engine)
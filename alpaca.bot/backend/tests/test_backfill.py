@@ -0,0 +1,78 @@
+from datetime import date
+import numpy as np
+import pytest
+from app.engine import backfill as bf
+from app.engine.backfill import DailyMatrix, backfill_daily_matrix
+
+DAYS = [date(2024, 1, 2), date(2024, 1, 3), date(2024, 1, 4)]
+
+
+class _Grouped:
+    """get_daily_market_summary over {date: {ticker: close}}."""
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.calls = []
+
+    def get_daily_market_summary(self, d, *, adjusted=True, include_otc=False):
+        self.calls.append(d)
+        return [
+            {"T": t, "o": c, "h": c, "l": c, "c": c, "v": 1000.0, "vw": c}
+            for t, c in self.closes.get(date.fromisoformat(d), {}).items()
+        ]
+
+
+def _matrix():
+    svc = _Grouped({d: {"AAPL": 100.0 + i, "MSFT": 400.0} for i, d in enumerate(DAYS)})
+    return backfill_daily_matrix(svc, DAYS[0], DAYS[-1], max_workers=1)
+
+
+def test_save_replaces_the_whole_directory(tmp_path):
+    path = tmp_path / "daily"
+    m = _matrix()
+    m.save(path)
+    m.rows(["MSFT"]).save(path)
+
+    loaded = DailyMatrix.load(path)
+    assert list(loaded.symbols) == ["MSFT"] and loaded.values.shape == (1, 3, len(bf.FIELDS))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["daily"]
+
+
+def test_failed_save_leaves_the_previous_matrix(tmp_path, monkeypatch):
+    path = tmp_path / "daily"
+    _matrix().save(path)
+
+    real_save, calls = np.save, []
+
+    def _crash(file, arr, *a, **kw):
+        calls.append(file)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return real_save(file, arr, *a, **kw)
+
+    monkeypatch.setattr(bf.np, "save", _crash)
+    with pytest.raises(OSError):
+        _matrix().rows(["MSFT"]).save(path)
+
+    assert list(DailyMatrix.load(path).symbols) == ["AAPL", "MSFT"]
+
+
+def test_split_since_last_save_rescales_saved_history():
+    existing = _matrix()
+    # 2:1 AAPL split: every adjusted close halves, volume doubles; one new day
+    later = DAYS + [date(2024, 1, 5)]
+    svc = _Grouped({d: {"AAPL": (100.0 + i) / 2, "MSFT": 400.0} for i, d in enumerate(later)})
+
+    m = backfill_daily_matrix(svc, later[0], later[-1], existing=existing, max_workers=1)
+
+    aapl, msft = m.symbol_index()["AAPL"], m.symbol_index()["MSFT"]
+    np.testing.assert_allclose(m.field("c")[aapl], [50.0, 50.5, 51.0, 51.5])
+    np.testing.assert_allclose(m.field("v")[aapl, :2], [2000.0, 2000.0])
+    np.testing.assert_allclose(m.field("c")[msft], [400.0] * 4)
+    assert "2024-01-03" in svc.calls   # the probe date
+
+
+def test_no_split_keeps_saved_history():
+    existing = _matrix()
+    svc = _Grouped({d: {"AAPL": 100.0 + i, "MSFT": 400.0} for i, d in enumerate(DAYS)})
+    assert bf.rebase_splits(svc, existing) is existing
@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+import numpy as np
+from app.engine.bar_store import BarStore
+from app.engine.massive_service import MassiveDataService
+
+MIN = 60_000
+DAY = 86_400_000
+
+
+class _Aggs:
+    """list_aggs over a dict of t -> close, counting requests."""
+
+    def __init__(self, closes):
+        self.closes = closes
+        self.calls = []
+
+    def list_aggs(self, *, ticker, multiplier, timespan, from_, to, limit):
+        self.calls.append((from_, to))
+        return iter([
+            SimpleNamespace(timestamp=t, open=c, high=c, low=c, close=c, volume=1.0, vwap=c, transactions=1)
+            for t, c in sorted(self.closes.items()) if from_ <= t <= to
+        ])
+
+
+def _service(tmp_path, closes, **store_kw):
+    svc = MassiveDataService(api_key="test", bar_store=BarStore(tmp_path, **store_kw))
+    svc.client = _Aggs(closes)
+    return svc
+
+
+def _delayed_feed(tmp_path, publish_lag_s):
+    now = int(time.time() * 1000) // MIN * MIN
+    start, end = now - 120 * MIN, now - 5 * MIN
+    # 15-minute delayed feed: nothing newer than now - 15min is served yet
+    closes = {t: 1.0 for t in range(start, now - 15 * MIN, MIN)}
+    svc = _service(tmp_path, closes, publish_lag_s=publish_lag_s)
+    first = svc.get_ohlc("AAPL", timespan="minute", from_=start, to=end)
+    closes.update({t: 2.0 for t in range(now - 15 * MIN, end, MIN)})
+    return first, svc.get_ohlc("AAPL", timespan="minute", from_=start, to=end)
+
+
+def test_bars_inside_the_publish_lag_are_fetched_again(tmp_path):
+    first, second = _delayed_feed(tmp_path, publish_lag_s=20 * 60)
+    assert len(second) == len(first) + 10 and second.c[-1] == 2.0
+
+
+def test_without_a_publish_lag_delayed_bars_are_never_fetched(tmp_path):
+    first, second = _delayed_feed(tmp_path, publish_lag_s=0)
+    assert len(second) == len(first)
+
+
+def test_split_rebases_cached_history(tmp_path):
+    d0 = 1_700_000_000_000 // DAY * DAY
+    closes = {d0 + i * DAY: 100.0 + i for i in range(5)}
+    svc = _service(tmp_path, closes)
+    assert len(svc.get_ohlc("AAPL", from_=d0, to=d0 + 5 * DAY - 1)) == 5
+
+    # 2:1 split: the provider re-bases every adjusted close, and a new day arrives
+    for t in closes:
+        closes[t] /= 2
+    closes[d0 + 5 * DAY] = 60.0
+    bars = svc.get_ohlc("AAPL", from_=d0, to=d0 + 6 * DAY - 1)
+
+    np.testing.assert_array_equal(bars.c, [50.0, 50.5, 51.0, 51.5, 52.0, 60.0])
+
+
+def test_unchanged_history_only_fetches_the_tail(tmp_path):
+    d0 = 1_700_000_000_000 // DAY * DAY
+    closes = {d0 + i * DAY: 100.0 + i for i in range(5)}
+    svc = _service(tmp_path, closes)
+    svc.get_ohlc("AAPL", from_=d0, to=d0 + 5 * DAY - 1)
+    closes[d0 + 5 * DAY] = 105.0
+    bars = svc.get_ohlc("AAPL", from_=d0, to=d0 + 6 * DAY - 1)
+
+    assert svc.client.calls[1:] == [(d0 + 4 * DAY, d0 + 6 * DAY - 1)]  # last cached bar + the new gap
+    np.testing.assert_array_equal(bars.c, [100.0, 101.0, 102.0, 103.0, 104.0, 105.0])
@@ -0,0 +1,29 @@
+import math
+from types import SimpleNamespace
+import numpy as np
+from app.engine.bars import BarSeries
+
+
+def _agg(**kw):
+    base = dict(timestamp=1, open=1.0, high=2.0, low=0.5, close=1.5, volume=10.0, vwap=1.2, transactions=3)
+    base.update(kw)
+    return SimpleNamespace(**base)
+
+
+def test_from_aggs_columns():
+    s = BarSeries.from_aggs([_agg(timestamp=1), _agg(timestamp=2, close=2.5)])
+    assert s.t.dtype == np.int64 and s.c.dtype == np.float64
+    assert s.t.tolist() == [1, 2]
+    assert s.c.tolist() == [1.5, 2.5]
+    assert s[1].c == 2.5
+
+
+def test_missing_values_are_nan_not_zero():
+    s = BarSeries.from_aggs([_agg(), _agg(timestamp=2, close=None, volume=None, vwap=None, transactions=None)])
+    assert math.isnan(s.c[1]) and math.isnan(s.v[1]) and math.isnan(s.vw[1])
+    assert s.n[1] == -1
+    assert np.nanmean(s.c) == 1.5
+
+
+def test_empty():
+    assert len(BarSeries.from_aggs([])) == 0
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+from app.engine.execution import execute_signals
+from app.engine.portfolio import PortfolioCache
+from app.engine.risk import RiskLimits
+from app.strategies.base import Signal
+
+
+class Client:
+    def __init__(self):
+        self.orders = []
+
+    def submit_order(self, req):
+        self.orders.append(req)
+        return SimpleNamespace(id=f"order-{len(self.orders)}", order_class=None)
+
+
+class BrokenCache(PortfolioCache):
+    def on_order(self, *a, **kw):
+        raise RuntimeError("cache bug")
+
+
+def test_order_stays_accepted_when_the_cache_update_fails():
+    out = execute_signals(
+        [Signal(symbol="AAPL", side="buy", qty=1, reason="test")],
+        risk=RiskLimits(), client=Client(), rate_limiter=None, portfolio=BrokenCache(), max_concurrency=1,
+    )
+    assert out[0]["id"] == "order-1" and "error" not in out[0]
+
+
+def test_submitted_orders_are_applied_to_the_cache():
+    cache = PortfolioCache()
+    cache.apply({"at": "2026-01-02T15:00:00+00:00", "cash": 100, "buying_power": 100, "equity": 100, "positions": {}})
+    out = execute_signals(
+        [Signal(symbol="AAPL", side="buy", qty=2, reason="test"), Signal(symbol="MSFT", side="buy", qty=1, reason="test")],
+        risk=RiskLimits(), client=Client(), rate_limiter=None, portfolio=cache, prices={"AAPL": 10.0, "MSFT": 20.0},
+    )
+    assert sorted(o["id"] for o in out) == ["order-1", "order-2"]   # submitted concurrently
+    assert cache.position_qty("AAPL") == 2 and cache.gross_exposure() == 40.0
+    assert cache.buying_power == 60.0
+
+
+def test_rejected_signal_is_reported_without_stopping_the_batch():
+    cache = PortfolioCache()
+    cache.apply({"at": "2026-01-02T15:00:00+00:00", "cash": 100, "buying_power": 100, "equity": 100, "positions": {}})
+    client = Client()
+    out = execute_signals(
+        [
+            Signal(symbol="AAPL", side="buy", qty=2, reason="test"),
+            Signal(symbol="MSFT", side="buy", qty=5, reason="test"),   # 5 * 20 > buying power left
+            Signal(symbol="NVDA", side="buy", qty=1, reason="test"),
+        ],
+        risk=RiskLimits(), client=client, rate_limiter=None, portfolio=cache, max_concurrency=1,
+        prices={"AAPL": 10.0, "MSFT": 20.0, "NVDA": 30.0},
+    )
+    assert [o["symbol"] for o in out] == ["AAPL", "MSFT", "NVDA"]
+    assert "id" in out[0] and "id" in out[2]
+    assert "id" not in out[1] and "buying power" in out[1]["error"]
+    assert len(client.orders) == 2
@@ -0,0 +1,77 @@
+import json
+import numpy as np
+import requests
+from types import SimpleNamespace
+from app.engine.fixtures import recording_service, replay_service
+from app.engine.bars import BarSeries
+
+AGGS = [
+    # vwap / transactions missing on the first bar only
+    SimpleNamespace(open=1.0, high=2.0, low=0.5, close=1.5, volume=100.0, vwap=None, timestamp=1000, transactions=None),
+    SimpleNamespace(open=1.5, high=2.5, low=1.0, close=2.0, volume=200.0, vwap=1.8, timestamp=2000, transactions=7),
+]
+SNAPSHOT = {"status": "OK", "tickers": [{"ticker": "AAPL", "day": {"c": 190.5}}, {"ticker": "MSFT", "day": {"c": 400}}]}
+
+
+class _Aggs:
+    def list_aggs(self, **kwargs):
+        return iter(AGGS)
+
+
+class _Session:
+    headers: dict = {}
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def get(self, url, params=None, **kwargs):
+        resp = requests.Response()
+        resp.status_code = 200
+        resp.headers.update({"Content-Type": "application/json", "X-Other": "dropped"})
+        resp._content = json.dumps(SNAPSHOT).encode()
+        return resp
+
+
+def _record(path):
+    svc = recording_service("test", path)
+    svc.client.inner = _Aggs()
+    svc._http.inner = _Session()
+    bars = svc.get_ohlc("AAPL", from_="2024-01-01", to="2024-01-31")
+    snap = svc.get_market_snapshot()
+    svc.recorder.close()
+    return bars, snap
+
+
+def _assert_same(a: BarSeries, b: BarSeries):
+    for k in ("t", "o", "h", "l", "c", "v", "vw", "n"):
+        np.testing.assert_array_equal(getattr(a, k), getattr(b, k))
+
+
+def test_record_replay_round_trip(tmp_path):
+    path = tmp_path / "tick.jsonl.gz"
+    live_bars, live_snap = _record(path)
+
+    svc = replay_service(path)
+    bars = svc.get_ohlc("AAPL", from_="2024-01-01", to="2024-01-31")
+
+    _assert_same(bars, live_bars)
+    np.testing.assert_array_equal(bars.vw, [np.nan, 1.8])
+    np.testing.assert_array_equal(bars.n, [-1, 7])
+    assert svc.get_market_snapshot() == live_snap == SNAPSHOT["tickers"]
+
+
+def test_replay_restores_fields_dropped_by_older_recordings(tmp_path):
+    import gzip
+
+    path = tmp_path / "old.jsonl.gz"
+    _record(path)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    for e in entries:
+        if e["kind"] == "aggs":
+            e["rows"] = [{k: v for k, v in r.items() if v is not None} for r in e["rows"]]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.writelines(json.dumps(e) + "\n" for e in entries)
+
+    bars = replay_service(path).get_ohlc("AAPL", from_="2024-01-01", to="2024-01-31")
+    np.testing.assert_array_equal(bars.vw, [np.nan, 1.8])
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.strategies.indicator_cache import IndicatorCache
+
+
+class Bars:
+    """Strategy client over a fixed daily series; counts bars fetched per call."""
+
+    multiplier, timespan = 1, "day"
+
+    def __init__(self, now: int = 60):
+        self.now = now
+        self.calls: list[tuple[str, int]] = []
+
+    def get_bars(self, symbol, limit):
+        self.calls.append((symbol, limit))
+        lo = max(0, self.now + 1 - limit)
+        return [{"t": k * 86_400_000, "c": float(k + 1)} for k in range(lo, self.now + 1)]
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch, rb):
+    monkeypatch.setattr(settings, "indicator_state_dir", str(tmp_path))
+    monkeypatch.setattr("app.strategies.indicator_state._redis", rb)  # checkpoint lock
+
+
+def test_cached_path_computes_each_window_once():
+    client, cache = Bars(), IndicatorCache()
+    a = cache.last2(client, ["A", "B"], "sma", 10)
+    b = cache.last2(client, ["B", "A"], "sma", 10)
+    assert a[1].tolist() == b[1][::-1].tolist() == [56.5, 56.5]
+    assert cache.stats()["computed"] == 2 + 2  # two closes + two SMAs
+
+
+def test_incremental_state_is_shared_across_strategies_and_ticks():
+    client = Bars(now=60)
+    tick1 = IndicatorCache()
+    prev, now = tick1.last2(client, ["A"], "sma", 10, incremental=True)
+    assert (prev[0], now[0]) == (55.5, 56.5)
+    # a second strategy with the same window in the same tick: no fetch, same values
+    tick1.last2(client, ["A"], "sma", 10, incremental=True)
+    np.testing.assert_array_equal(tick1.last2(client, ["A"], "sma", 10), (prev, now))
+    assert client.calls == [("A", 11)]
+
+    client.now, client.calls = 61, []
+    tick2 = IndicatorCache()
+    _, now = tick2.last2(client, ["A"], "sma", 10, incremental=True)
+    assert now[0] == 57.5
+    assert client.calls == [("A", 3)]   # warm: tail only
+
+
+def test_incremental_windows_share_the_tail_fetch():
+    client = Bars(now=60)
+    IndicatorCache().last2(client, ["A"], "sma", 5, incremental=True)
+    IndicatorCache().last2(client, ["A"], "sma", 10, incremental=True)
+    client.now, client.calls = 61, []
+
+    tick = IndicatorCache()
+    fast = tick.last2(client, ["A"], "sma", 5, incremental=True)
+    slow = tick.last2(client, ["A"], "sma", 10, incremental=True)
+    assert client.calls == [("A", 3)]
+    assert fast[1][0] == float(np.arange(58, 63).mean())
+    assert slow[1][0] == 57.5
@@ -0,0 +1,107 @@
+import numpy as np
+from app.strategies.indicator_state import IndicatorEngine
+
+CLOSES = np.arange(1.0, 101.0)   # bar k closes at k + 1
+TIMES = np.arange(100, dtype=np.int64) * 60_000
+
+
+class History:
+    """fetch() for IndicatorEngine.refresh over a fixed series, up to bar `now`."""
+
+    def __init__(self):
+        self.now = 0
+        self.requests: list[dict[str, int]] = []
+
+    def __call__(self, need):
+        self.requests.append(dict(need))
+        hi = self.now + 1
+        return {s: (TIMES[max(0, hi - n):hi], CLOSES[max(0, hi - n):hi]) for s, n in need.items()}
+
+
+def _sma(k: int, w: int) -> float:
+    return float(CLOSES[k - w + 1:k + 1].mean())
+
+
+def test_streaming_matches_full_recompute():
+    eng = IndicatorEngine({"fast": ("sma", 3), "slow": ("sma", 5), "e": ("ema", 4)})
+    fetch = History()
+    for now in range(10, 20):
+        fetch.now = now
+        eng.refresh(["A"], fetch)
+    prev, cur = eng.last2("slow", ["A"])
+    assert prev[0] == _sma(18, 5) and cur[0] == _sma(19, 5)
+    assert fetch.requests[0] == {"A": 6}
+    assert fetch.requests[-1] == {"A": 3}
+
+
+def test_gap_refetches_full_history_in_the_same_tick():
+    eng = IndicatorEngine({"fast": ("sma", 3), "slow": ("sma", 5)})
+    fetch = History()
+    fetch.now = 10
+    eng.refresh(["A"], fetch)
+
+    fetch.now = 30  # missed 19 ticks: the 3-bar tail doesn't reach bar 10
+    fetch.requests.clear()
+    eng.refresh(["A"], fetch)
+
+    assert fetch.requests == [{"A": 3}, {"A": 6}]
+    prev, cur = eng.last2("slow", ["A"])
+    assert prev[0] == _sma(29, 5) and cur[0] == _sma(30, 5)
+    assert eng.bars_needed(["A"]) == {"A": 3}
+
+
+def test_sync_leaves_a_gapped_symbol_cold():
+    eng = IndicatorEngine({"slow": ("sma", 5)})
+    eng.sync({"A": (TIMES[:6], CLOSES[:6])})
+    assert eng.is_warm("A")
+    assert eng.sync({"A": (TIMES[20:23], CLOSES[20:23])}) == ["A"]
+    assert not eng.is_warm("A")
+    assert eng.bars_needed(["A"]) == {"A": 6}
+
+
+def test_last_bar_is_amended_and_checkpoint_round_trips():
+    eng = IndicatorEngine({"s": ("sma", 2), "e": ("ema", 2)})
+    eng.sync({"A": (TIMES[:3], np.array([1.0, 2.0, 3.0]))})
+    eng.sync({"A": (TIMES[2:3], np.array([5.0]))})   # forming bar moved
+    assert eng.last2("s", ["A"])[1][0] == 3.5
+
+    copy = IndicatorEngine.from_bytes(eng.to_bytes())
+    for name in ("s", "e"):
+        np.testing.assert_array_equal(copy.last2(name, ["A", "B"]), eng.last2(name, ["A", "B"]))
+
+
+def test_shards_saving_different_symbols_keep_each_others_state(rb, monkeypatch):
+    from app.strategies import indicator_state
+    from app.strategies.indicator_state import load_engine, save_engine
+
+    monkeypatch.setattr(indicator_state, "_redis", rb)
+    monkeypatch.setattr(indicator_state.settings, "indicator_state_dir", None)
+    spec = {"v": ("sma", 3)}
+    fetch = History()
+    fetch.now = 10
+
+    # both shards load the same (empty) checkpoint, then save in turn
+    shard1, shard2 = load_engine("1day", spec), load_engine("1day", spec)
+    shard1.refresh(["A", "B"], fetch)
+    shard2.refresh(["C"], fetch)
+    save_engine("1day", shard1, symbols=["A", "B"])
+    save_engine("1day", shard2, symbols=["C"])
+
+    merged = load_engine("1day", spec)
+    assert all(merged.is_warm(s) for s in "ABC")
+    assert merged.last2("v", ["A", "C"])[1].tolist() == [_sma(10, 3)] * 2
+    assert not rb.keys("*:lock")
+
+
+def test_save_is_skipped_while_another_writer_holds_the_lock(rb, monkeypatch):
+    from app.strategies import indicator_state
+    from app.strategies.indicator_state import _checkpoint_key, load_engine, save_engine
+
+    monkeypatch.setattr(indicator_state, "_redis", rb)
+    monkeypatch.setattr(indicator_state.settings, "indicator_state_dir", None)
+    spec = {"v": ("sma", 3)}
+    rb.set(_checkpoint_key("1day", spec) + ":lock", "someone-else")
+    eng = IndicatorEngine(spec)
+    eng.sync({"A": (TIMES[:4], CLOSES[:4])})
+    save_engine("1day", eng, symbols=["A"], lock_timeout_s=0.05)
+    assert not load_engine("1day", spec).is_warm("A")
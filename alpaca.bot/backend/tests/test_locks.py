@@ -0,0 +1,56 @@
+import time
+from app.engine.locks import RedisLock
+
+
+def test_second_owner_is_refused_until_release(r):
+    a = RedisLock(r, "lock:test", ttl_s=10)
+    b = RedisLock(r, "lock:test", ttl_s=10)
+    assert a.acquire()
+    assert not b.acquire()
+    assert b.holder() == a.token
+    assert a.release()
+    assert b.acquire()
+
+
+def test_same_token_reacquires(r):
+    assert RedisLock(r, "lock:test", ttl_s=10, token="task-1").acquire()
+    assert RedisLock(r, "lock:test", ttl_s=10, token="task-1").acquire()
+    assert not RedisLock(r, "lock:test", ttl_s=10, token="task-2").acquire()
+
+
+def test_release_and_extend_only_by_owner(r):
+    a = RedisLock(r, "lock:test", ttl_s=10)
+    a.acquire()
+    other = RedisLock(r, "lock:test", ttl_s=10)
+    assert not other.release()
+    assert not other.extend(60)
+    assert r.get("lock:test") == a.token
+
+    assert a.extend(60)
+    assert r.pttl("lock:test") > 10_000
+
+
+def test_expired_lock_taken_over_is_not_released_by_old_owner(r):
+    a = RedisLock(r, "lock:test", ttl_s=10)
+    a.acquire()
+    r.delete("lock:test")  # TTL ran out
+    b = RedisLock(r, "lock:test", ttl_s=10)
+    assert b.acquire()
+    assert not a.release()
+    assert b.holder() == b.token
+
+
+def test_extend_never_shortens(r):
+    a = RedisLock(r, "lock:test", ttl_s=60)
+    a.acquire()
+    assert a.extend(1)
+    assert r.pttl("lock:test") > 50_000
+
+
+def test_held_outlives_the_ttl(r):
+    a = RedisLock(r, "lock:test", ttl_s=0.3)
+    a.acquire()
+    with a.held(0.3):
+        time.sleep(0.8)
+        assert r.get("lock:test") == a.token
+    assert r.get("lock:test") == a.token
@@ -0,0 +1,87 @@
+import json
+import time
+import pytest
+from app.engine.massive_service import MassiveDataService, SnapshotQuote, _iter_json_array
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+ROWS = [
+    {"ticker": "AAPL", "day": {"c": 190.5}, "lastTrade": {"p": 191.0}, "name": "Apple ]}"},
+    {"ticker": "ÆØÅ", "min": {"c": 1.25}},
+    {"ticker": "MSFT", "prevDay": {"c": 400}},
+]
+BODY = json.dumps({"status": "OK", "count": 3, "tickers": ROWS, "after": [1, 2]}, ensure_ascii=False).encode()
+
+
+def test_array_elements_survive_any_chunk_split():
+    for size in (1, 2, 3, 7, 64, len(BODY)):
+        assert list(_iter_json_array(_chunks(BODY, size), "tickers")) == ROWS
+
+
+def test_missing_key_yields_nothing():
+    assert list(_iter_json_array(_chunks(b'{"status": "OK"}', 4), "tickers")) == []
+
+
+def test_truncated_body_raises():
+    cut = BODY[:BODY.index(b'"MSFT"')]
+    for size in (1, 5, len(cut)):
+        with pytest.raises(ValueError, match="closing"):
+            list(_iter_json_array(_chunks(cut, size), "tickers"))
+
+
+def test_malformed_element_raises():
+    body = b'{"tickers": [{"ticker": "AAPL"}, {"ticker": oops}, {"ticker": "MSFT"}]}'
+    with pytest.raises(ValueError, match="oops"):
+        list(_iter_json_array(_chunks(body, 8), "tickers"))
+
+
+class _StreamedResponse:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.closed = False
+
+    def iter_content(self, chunk_size: int = 1):
+        return iter(_chunks(self.body, 5))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+
+def _service(monkeypatch, body: bytes):
+    svc = MassiveDataService(api_key="test")
+    seen = []
+
+    def _request(path, params=None, *, stream=False):
+        seen.append(stream)
+        return _StreamedResponse(body)
+
+    monkeypatch.setattr(svc, "_request", _request)
+    return svc, seen
+
+
+def test_full_market_snapshot_is_streamed(monkeypatch):
+    svc, seen = _service(monkeypatch, BODY)
+    assert svc.get_market_snapshot() == ROWS
+    assert seen == [True]
+
+
+def test_iter_market_snapshot_filters_and_compacts(monkeypatch):
+    svc, _ = _service(monkeypatch, BODY)
+    quotes = list(svc.iter_market_snapshot(["aapl", "msft"]))
+    assert [q.ticker for q in quotes] == ["AAPL", "MSFT"]
+    assert quotes[0] == SnapshotQuote.from_row(ROWS[0])
+    assert quotes[0].price == 191.0
+    assert quotes[1].prev_c == 400 and quotes[1].price is None
+
+
+def test_no_request_after_the_deadline(monkeypatch):
+    svc = MassiveDataService(api_key="test", deadline=time.time() - 1)
+    monkeypatch.setattr(svc._http, "get", lambda *a, **kw: pytest.fail("request sent past the deadline"))
+    with pytest.raises(TimeoutError):
+        svc.get_market_snapshot(["AAPL"])
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+import json
+import pytest
+from app.engine.portfolio import PORTFOLIO_FETCH_KEY, PORTFOLIO_STATE_KEY, PortfolioCache, sync_shared
+
+
+class Broker:
+    def __init__(self):
+        self.calls = 0
+        self.positions = [SimpleNamespace(symbol="AAPL", qty="10", side="long", current_price="200", avg_entry_price="150")]
+
+    def get_account(self):
+        self.calls += 1
+        return SimpleNamespace(cash="1000", buying_power="5000", equity="3000")
+
+    def get_all_positions(self):
+        self.calls += 1
+        return self.positions
+
+
+class Tokens:
+    def __init__(self):
+        self.taken = 0
+
+    def acquire(self, tokens=1.0):
+        self.taken += tokens
+        return 0.0
+
+
+def test_processes_share_one_broker_fetch_per_interval(r):
+    broker, tokens = Broker(), Tokens()
+    caches = [PortfolioCache() for _ in range(4)]
+    results = [
+        sync_shared(c, r, 30, client_factory=lambda: broker, limiter=tokens) for c in caches
+    ]
+    assert results == ["fetched", "shared", "shared", "shared"]
+    assert broker.calls == 2 and tokens.taken == 2
+    for c in caches:
+        assert c.ready and c.position_qty("AAPL") == 10 and c.gross_exposure() == 2000
+    # nothing newer yet: nothing applied
+    assert sync_shared(caches[1], r, 30, client_factory=lambda: broker) == "none"
+
+
+def test_next_interval_refetches(r):
+    broker = Broker()
+    a, b = PortfolioCache(), PortfolioCache()
+    sync_shared(a, r, 30, client_factory=lambda: broker)
+    r.delete(PORTFOLIO_FETCH_KEY)  # interval over
+    broker.positions = []
+    assert sync_shared(b, r, 30, client_factory=lambda: broker) == "fetched"
+    assert sync_shared(a, r, 30, client_factory=lambda: broker) == "shared"
+    assert a.position_qty("AAPL") == 0 and a.gross_exposure() == 0
+
+
+def test_loser_without_shared_state_reports_none(r):
+    r.set(PORTFOLIO_FETCH_KEY, "other", px=10_000)
+    c = PortfolioCache()
+    assert sync_shared(c, r, 30, client_factory=Broker, wait_s=0.05) == "none"
+    assert not c.ready
+
+
+def test_older_state_is_ignored(r):
+    c = PortfolioCache()
+    sync_shared(c, r, 30, client_factory=Broker)
+    old = json.loads(r.get(PORTFOLIO_STATE_KEY))
+    old["at"] = "2000-01-01T00:00:00+00:00"
+    assert not c.apply(old)
+
+
+def test_on_order_updates_exposure_and_buying_power():
+    c = PortfolioCache()
+    c.reconcile(Broker())
+    c.on_order("AAPL", "buy", 5, 210.0)
+    assert c.position_qty("AAPL") == 15
+    assert c.gross_exposure() == pytest.approx(15 * 210)
+    assert c.buying_power == pytest.approx(5000 - (15 * 210 - 2000))
+    c.on_order("AAPL", "sell", 15, 210.0)
+    assert "AAPL" not in c.positions and c.gross_exposure() == pytest.approx(0)
+
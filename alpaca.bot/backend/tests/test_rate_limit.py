@@ -0,0 +1,44 @@
+import pytest
+from app.engine.rate_limit import RedisTokenBucket
+
+
+def test_burst_is_free_then_callers_queue(r, monkeypatch):
+    slept = []
+    monkeypatch.setattr("app.engine.rate_limit.time.sleep", slept.append)
+    b = RedisTokenBucket(r, "rl:test", rate_per_s=10, burst=3)
+
+    waits = [b.acquire() for _ in range(5)]
+
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    # 4th and 5th reserve tokens that don't exist yet: 1/10 s, then 2/10 s
+    assert waits[3] == pytest.approx(0.1, abs=0.02)
+    assert waits[4] == pytest.approx(0.2, abs=0.02)
+    assert slept == waits[3:]
+
+
+def test_stats_are_shared_through_redis(r, monkeypatch):
+    monkeypatch.setattr("app.engine.rate_limit.time.sleep", lambda s: None)
+    a = RedisTokenBucket(r, "rl:test", rate_per_s=10, burst=1)
+    b = RedisTokenBucket(r, "rl:test", rate_per_s=10, burst=1)
+    a.acquire()
+    b.acquire()  # same bucket: has to wait
+
+    assert a.local_stats()["calls"] == 1
+    assert b.local_stats()["waited_calls"] == 1
+    s = a.stats()
+    assert s["calls"] == 2 and s["waited_calls"] == 1
+    assert s["total_wait_s"] == pytest.approx(0.1, abs=0.02)
+
+
+def test_fails_open_without_redis():
+    import redis
+    down = redis.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.05)
+    b = RedisTokenBucket(down, "rl:test", rate_per_s=1, burst=1)
+    assert b.acquire() == 0.0
+
+
+def test_rejects_bad_rates(r):
+    with pytest.raises(ValueError):
+        RedisTokenBucket(r, "rl:test", rate_per_s=0, burst=1)
+    with pytest.raises(ValueError):
+        RedisTokenBucket.for_tier(r, "rl:test", "platinum")
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+from app.engine.portfolio import PortfolioCache
+from app.engine.risk import RiskLimits, apply_risk
+from app.strategies.base import Signal
+
+
+def _portfolio(buying_power=10_000.0, positions=()):
+    c = PortfolioCache()
+    c.reconcile(SimpleNamespace(
+        get_account=lambda: SimpleNamespace(cash="0", buying_power=str(buying_power), equity="0"),
+        get_all_positions=lambda: [
+            SimpleNamespace(symbol=s, qty=str(q), side="long", current_price=str(p), avg_entry_price=str(p))
+            for s, q, p in positions
+        ],
+    ))
+    return c
+
+
+def _sig(symbol, side, qty):
+    return Signal(symbol=symbol, side=side, qty=qty, reason="test")
+
+
+def test_without_portfolio_only_qty_limits_apply():
+    ok, bad = apply_risk([_sig("A", "buy", 5), _sig("B", "buy", 500), _sig("C", "buy", 0)], RiskLimits())
+    assert [s.symbol for s in ok] == ["A"]
+    assert [r["signal"].symbol for r in bad] == ["B", "C"]
+
+
+def test_pending_signals_count_towards_gross_exposure():
+    limits = RiskLimits(max_gross_exposure=2_500)
+    p = _portfolio(positions=[("A", 10, 100.0)])          # 1000 gross already
+    ok, bad = apply_risk(
+        [_sig("B", "buy", 10), _sig("C", "buy", 10)],       # 1000 each at 100
+        limits, portfolio=p, prices={"B": 100.0, "C": 100.0},
+    )
+    assert [s.symbol for s in ok] == ["B"]
+    assert "max_gross_exposure" in bad[0]["error"]
+
+
+def test_reducing_a_position_needs_no_buying_power():
+    p = _portfolio(buying_power=0.0, positions=[("A", 10, 100.0)])
+    ok, bad = apply_risk(
+        [_sig("A", "sell", 5), _sig("B", "buy", 4), _sig("C", "buy", 2)],
+        RiskLimits(), portfolio=p, prices={"B": 100.0, "C": 100.0},
+    )
+    # the sale frees 500, which B uses; nothing is left for C
+    assert [s.symbol for s in ok] == ["A", "B"]
+    assert "buying power" in bad[0]["error"]
+
+
+def test_position_limits_include_held_and_pending_qty():
+    p = _portfolio(positions=[("A", 90, 10.0)])
+    ok, bad = apply_risk([_sig("A", "buy", 5), _sig("A", "buy", 5), _sig("A", "buy", 1)], RiskLimits(max_position_qty=100), portfolio=p)
+    assert len(ok) == 2 and "max_position_qty" in bad[0]["error"]
+
+    ok, bad = apply_risk([_sig("A", "buy", 5), _sig("A", "buy", 5)], RiskLimits(max_position_notional=975), portfolio=p)
+    assert len(ok) == 1 and "max_position_notional" in bad[0]["error"]
+
+
+def test_no_price_rejects_when_exposure_limits_are_set():
+    ok, bad = apply_risk([_sig("Z", "buy", 1)], RiskLimits(max_gross_exposure=1e9), portfolio=_portfolio())
+    assert not ok and "no price" in bad[0]["error"]
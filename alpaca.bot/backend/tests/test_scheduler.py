@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+from app.engine.scheduler import StrategyScheduler
+
+
+def test_claim_reschedules_and_never_double_claims(r):
+    s = StrategyScheduler(r)
+    s.sync([("a", 10, None), ("b", 60, None)], now=1000)
+
+    assert sorted(s.claim_due(now=1000)) == ["a", "b"]
+    assert s.claim_due(now=1000) == []      # a second dispatcher racing on the same second
+    assert s.claim_due(now=1009) == []
+    assert s.claim_due(now=1010) == ["a"]
+    assert s.next_due() == 1020
+
+
+def test_claim_after_downtime_runs_once(r):
+    s = StrategyScheduler(r)
+    s.sync([("a", 10, None)], now=1000)
+    assert s.claim_due(now=1000) == ["a"]
+    assert s.claim_due(now=1100) == ["a"]   # nine runs missed, not replayed
+    assert s.next_due() == 1110
+
+
+def test_sync_anchors_on_last_run_and_drops_disabled(r):
+    s = StrategyScheduler(r)
+    last = datetime.fromtimestamp(990, tz=timezone.utc)
+    s.sync([("a", 30, last), ("b", 10, None)], now=1000)
+    assert r.zscore(s.due_key, "a") == 1020
+
+    res = s.sync([("a", 60, last)], now=1001)
+    assert res == {"scheduled": 1, "added": 0, "changed": 1, "removed": 1}
+    assert r.zscore(s.due_key, "a") == 1050
+    assert s.claim_due(now=2000) == ["a"]
+
+
+def test_claim_drops_ids_without_interval(r):
+    s = StrategyScheduler(r)
+    r.zadd(s.due_key, {"ghost": 0})
+    assert s.claim_due(now=1) == []
+    assert r.zcard(s.due_key) == 0
+
+
+def test_needs_sync_on_version_bump(r):
+    s = StrategyScheduler(r, sync_every_s=30)
+    assert s.needs_sync(now=0)
+    s.sync([], now=0)
+    assert not s.needs_sync(now=1)
+    s.notify_changed()
+    assert s.needs_sync(now=1)
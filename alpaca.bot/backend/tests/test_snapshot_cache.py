@@ -0,0 +1,63 @@
+import threading
+import time
+from app.engine.snapshot_cache import SnapshotCache, shared_stats
+
+
+class FakeService:
+    def __init__(self, delay_s: float = 0.0):
+        self.calls: list[tuple[list[str], dict]] = []
+        self.delay_s = delay_s
+
+    def get_market_snapshot(self, symbols=None, **kwargs):
+        self.calls.append((list(symbols or []), kwargs))
+        time.sleep(self.delay_s)
+        otc = kwargs.get("include_otc", False)
+        return [{"ticker": t, "otc": otc} for t in symbols if t != "NOPE"]
+
+
+def test_hits_and_cached_nulls(r):
+    svc = FakeService()
+    cache = SnapshotCache(svc, r)
+    assert [x["ticker"] for x in cache.get_market_snapshot(["AAPL", "NOPE", "MSFT"])] == ["AAPL", "MSFT"]
+    assert [x["ticker"] for x in cache.get_market_snapshot(["MSFT", "NOPE", "AAPL"])] == ["MSFT", "AAPL"]
+    assert len(svc.calls) == 1
+    assert shared_stats(r) == {"hits": 3, "misses": 3, "coalesced": 0, "hit_ratio": 0.5}
+
+
+def test_shaping_kwargs_get_their_own_entries(r):
+    svc = FakeService()
+    cache = SnapshotCache(svc, r)
+    assert cache.get_market_snapshot(["AAPL"])[0]["otc"] is False
+    assert cache.get_market_snapshot(["AAPL"], include_otc=True)[0]["otc"] is True
+    assert cache.get_market_snapshot(["AAPL"], include_otc=True, max_workers=2)[0]["otc"] is True
+    assert len(svc.calls) == 2
+
+
+def test_concurrent_callers_share_one_fetch(r):
+    svc = FakeService(delay_s=0.2)
+    out = []
+    ts = [
+        threading.Thread(target=lambda: out.append(SnapshotCache(svc, r).get_market_snapshot(["AAPL"])))
+        for _ in range(3)
+    ]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    assert len(svc.calls) == 1
+    assert all(o == [{"ticker": "AAPL", "otc": False}] for o in out)
+    assert shared_stats(r)["coalesced"] == 2
+
+
+def test_slow_owner_does_not_release_someone_elses_claim(r):
+    cache = SnapshotCache(FakeService(), r)
+    token, owned, _ = cache._claim(["AAPL"])
+    assert owned == ["AAPL"]
+    # our claim expires mid-fetch and another caller claims the ticker
+    r.set(cache._inflight_key("AAPL"), "someone-else")
+    cache._fetch_and_store(owned, {}, token=token)
+    assert r.get(cache._inflight_key("AAPL")) == "someone-else"
+
+    token, owned, _ = cache._claim(["MSFT"])
+    cache._fetch_and_store(owned, {}, token=token)
+    assert not r.exists(cache._inflight_key("MSFT"))
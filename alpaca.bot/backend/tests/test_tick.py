@@ -0,0 +1,149 @@
+import time
+from datetime import datetime, timedelta, timezone
+from app.db import models
+from app.engine.locks import RedisLock
+from app.tasks import runner
+
+
+class _DownSnapshots:
+    def get_market_snapshot(self, symbols):
+        raise RuntimeError("snapshot API down")
+
+
+def test_failed_snapshot_returns_a_partial_shard(db, r, monkeypatch):
+    monkeypatch.setattr(runner, "get_snapshot_cache", lambda svc: _DownSnapshots())
+    monkeypatch.setattr("app.strategies.indicator_cache.get_redis", lambda: r)
+
+    out = runner.tick_shard(["AAPL", "MSFT"], [], "2026-01-02T15:00:00+00:00", time.time() + 60)
+
+    assert out["snapshot_rows"] == 0
+    assert out["errors"] == [{"strategy_id": None, "stage": "snapshot", "error": "snapshot API down"}]
+    assert out["signals"] == []
+
+
+def test_tick_failed_releases_the_lock(r, monkeypatch):
+    events = []
+    monkeypatch.setattr(runner, "get_redis", lambda: r)
+    monkeypatch.setattr(runner, "publish_event", events.append)
+    lock = RedisLock(r, runner.TICK_LOCK_KEY, ttl_s=60, token="tick-1")
+    assert lock.acquire()
+
+    runner.tick_failed(None, RuntimeError("boom"), None, at="2026-01-02T15:00:00+00:00", lock_token="tick-1")
+
+    assert not r.exists(runner.TICK_LOCK_KEY)
+    assert events == [{"type": "tick", "at": "2026-01-02T15:00:00+00:00", "ok": False, "error": "boom"}]
+
+
+def test_tick_failed_leaves_a_newer_ticks_lock(r, monkeypatch):
+    monkeypatch.setattr(runner, "get_redis", lambda: r)
+    monkeypatch.setattr(runner, "publish_event", lambda e: None)
+    RedisLock(r, runner.TICK_LOCK_KEY, ttl_s=60, token="tick-2").acquire()
+    runner.tick_failed(None, RuntimeError("boom"), None, at="x", lock_token="tick-1")
+    assert r.get(runner.TICK_LOCK_KEY) == "tick-2"
+
+
+class _Chord:
+    """Captures the chord tick() builds instead of sending it."""
+
+    def __init__(self):
+        self.headers = []
+
+    def __call__(self, header):
+        self.headers.append(list(header))
+        return lambda body: None
+
+
+def _strategy(db, name, *, interval, ago=None, symbols=None):
+    last = None if ago is None else datetime.now(timezone.utc) - timedelta(seconds=ago)
+    with db() as s:
+        row = models.StrategyConfig(
+            name=name, type="cross_over", enabled=True, interval_seconds=interval,
+            symbols=symbols or [], params={}, last_run_at=last,
+        )
+        s.add(row)
+        s.commit()
+        return row.id
+
+
+def test_tick_runs_universe_strategies_only_when_their_interval_elapsed(db, r, monkeypatch):
+    chords = _Chord()
+    monkeypatch.setattr(runner, "chord", chords)
+    monkeypatch.setattr(runner, "get_redis", lambda: r)
+    with db() as s:
+        s.add(models.Symbol(symbol="AAPL"))
+        s.commit()
+    recent = _strategy(db, "recent", interval=300, ago=100)
+    stale = _strategy(db, "stale", interval=300, ago=400)
+    never = _strategy(db, "never", interval=300)
+    _strategy(db, "own-symbols", interval=60, ago=3600, symbols=["AAPL"])
+
+    runner.tick()
+
+    (header,) = chords.headers
+    _, strategy_ids, _, _ = header[0].args
+    assert sorted(strategy_ids) == sorted([stale, never])
+    assert recent not in strategy_ids
+
+
+def test_is_due_tolerates_beat_jitter():
+    last = datetime.fromtimestamp(1000, tz=timezone.utc)
+    assert runner.is_due(last, 60, 1059.5)          # one beat later, slightly early
+    assert not runner.is_due(last, 300, 1060)
+    assert runner.is_due(last.replace(tzinfo=None), 300, 1300)
+
+
+class _Snapshots:
+    def get_market_snapshot(self, symbols):
+        return []
+
+
+class _Slow:
+    def __init__(self, seconds, exc=None):
+        self.seconds, self.exc = seconds, exc
+
+    def generate_signals(self, market):
+        time.sleep(self.seconds)
+        if self.exc is not None:
+            raise self.exc
+        return []
+
+
+def _shard_env(monkeypatch, r, strategies):
+    monkeypatch.setattr(runner, "get_redis", lambda: r)
+    monkeypatch.setattr("app.strategies.indicator_cache.get_redis", lambda: r)
+    monkeypatch.setattr(runner, "get_snapshot_cache", lambda svc: _Snapshots())
+    monkeypatch.setattr(runner, "make_strategy", lambda row, **kw: strategies[row.name])
+
+
+def test_shard_overrunning_the_lock_ttl_keeps_the_tick_lock(db, r, monkeypatch):
+    monkeypatch.setattr(runner.settings, "tick_merge_reserve_s", 0.2)
+    monkeypatch.setattr(runner.settings, "tick_lock_slack_s", 0.1)
+    _shard_env(monkeypatch, r, {"slow": _Slow(1.0)})
+    sid = _strategy(db, "slow", interval=60)
+    assert RedisLock(r, runner.TICK_LOCK_KEY, ttl_s=0.3, token="tick-1").acquire()
+
+    out = runner.tick_shard(["AAPL"], [sid], "2026-01-02T15:00:00+00:00", time.time() + 60, lock_token="tick-1")
+
+    assert out["errors"] == [] and out["skipped_strategies"] == []
+    assert r.get(runner.TICK_LOCK_KEY) == "tick-1"
+    assert not RedisLock(r, runner.TICK_LOCK_KEY, ttl_s=60, token="tick-2").acquire()
+
+
+def test_soft_time_limit_returns_a_partial_shard(db, r, monkeypatch):
+    from celery.exceptions import SoftTimeLimitExceeded
+
+    first = _strategy(db, "first", interval=60)
+    cut = _strategy(db, "cut", interval=60)
+    never = _strategy(db, "never", interval=60)
+    with db() as s:
+        for sid, priority in ((first, 3), (cut, 2), (never, 1)):
+            s.get(models.StrategyConfig, sid).params = {"priority": priority}
+        s.commit()
+    _shard_env(monkeypatch, r, {"first": _Slow(0), "cut": _Slow(0, SoftTimeLimitExceeded()), "never": _Slow(0)})
+
+    out = runner.tick_shard(["AAPL"], [first, cut, never], "2026-01-02T15:00:00+00:00", time.time() + 60)
+
+    assert out["skipped_strategies"] == [cut, never]
+    assert out["skipped"] == ["time_limit", "strategies", "indicator_stats"]
+    assert [e["stage"] for e in out["errors"]] == ["time_limit"]
+    assert "ms" in out and out["prices"] == {}
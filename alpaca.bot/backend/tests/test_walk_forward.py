@@ -0,0 +1,40 @@
+import multiprocessing
+import numpy as np
+import pytest
+from app.engine.backtest import BacktestData, pool_size
+from app.engine.walk_forward import walk_forward
+from app.strategies.models.cross_over import SmaCrossOverStrategy
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(7)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, size=(4, 300)), axis=1))
+    dates = np.datetime64("2024-01-01") + np.arange(300)
+    return BacktestData(symbols=np.array(["A", "B", "C", "D"]), dates=dates, close=close)
+
+
+@pytest.fixture
+def daemonic():
+    proc = multiprocessing.current_process()
+    proc._config["daemon"] = True   # what a Celery prefork child looks like
+    yield
+    proc._config.pop("daemon", None)
+
+
+def test_pool_size_defaults():
+    assert pool_size(3) == 3
+    assert pool_size(None) >= 1
+
+
+def test_pool_size_is_one_in_a_daemonic_process(daemonic):
+    assert pool_size(None) == 1
+    assert pool_size(8) == 1
+
+
+def test_walk_forward_runs_in_process_inside_a_pool_child(daemonic, data):
+    grid = {"fast": [3, 5], "slow": [20, 40]}
+    res = walk_forward(SmaCrossOverStrategy, data, grid, train_bars=120, test_bars=60, workers=4, min_trades=0)
+    assert res["grid_size"] == 4
+    assert res["folds"]
+    assert set(res["suggested_params"]) >= {"fast", "slow"}
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import msgpack
+import pytest
+from app.core.wire import decode, encode, prepend_field
+from app.core.ws_hub import ClientQueue, EventHub, Subscription
+
+
+def _hub(**kw) -> EventHub:
+    return EventHub("redis://unused", stream="events:test", **kw)
+
+
+def _client(hub: EventHub, fmt: str = "json", **sub) -> ClientQueue:
+    q = ClientQueue(64, Subscription(**sub), format=fmt)
+    hub.clients.add(q)
+    return q
+
+
+@pytest.mark.parametrize("fmt", ["json", "msgpack"])
+@pytest.mark.parametrize("event", [{"type": "tick", "n": 1}, {}, {f"k{i}": i for i in range(20)}])
+def test_prepend_field_matches_reencoding(fmt, event):
+    spliced = prepend_field(encode(event, fmt), fmt, "cursor", "5-1")
+    assert decode(spliced)[0] == {"cursor": "5-1", **event}
+
+
+def test_prepend_field_rejects_non_maps():
+    assert prepend_field(encode([1, 2], "json"), "json", "cursor", "1-0") is None
+    assert prepend_field(encode([1, 2], "msgpack"), "msgpack", "cursor", "1-0") is None
+
+
+def test_logged_frames_are_forwarded_without_reencoding():
+    hub = _hub()
+    j, m = _client(hub, "json"), _client(hub, "msgpack")
+    event = {"type": "order", "symbol": "AAPL", "qty": 3}
+
+    hub.dispatch(json.dumps(event).encode(), "7-0")
+    hub.dispatch(msgpack.packb(event), "7-1")
+
+    assert hub.encoded == 2  # each client re-encoded only the other format
+    frames = [asyncio.run(q.get()) for q in (j, j, m, m)]
+    assert [decode(f)[0]["cursor"] for f in frames] == ["7-0", "7-1", "7-0", "7-1"]
+    assert all(decode(f)[0]["qty"] == 3 for f in frames)
+    assert isinstance(frames[0], str) and isinstance(frames[2], bytes)
+
+
+def test_filtered_variant_carries_cursor():
+    hub = _hub()
+    q = _client(hub, symbols=frozenset({"AAPL"}))
+    hub.dispatch(json.dumps({"type": "tick", "signals": [{"symbol": "AAPL"}, {"symbol": "MSFT"}]}), "9-0")
+    payload, _ = decode(asyncio.run(q.get()))
+    assert payload["cursor"] == "9-0" and payload["signals"] == [{"symbol": "AAPL"}]
+
+
+# -----------------------
+# Replay
+# -----------------------
+def _logged_hub(redis_server, rb, ids, *, until):
+    import fakeredis.aioredis
+
+    for i in ids:
+        rb.xadd("events:test", {"d": json.dumps({"type": "fill", "n": i})}, id=f"{i}-0")
+    hub = _hub()
+    hub._replay_r = fakeredis.aioredis.FakeRedis(server=redis_server)
+    hub.last_id = until
+    hub._seeded.set()
+    q = _client(hub)
+    q.replay_until = until
+    return hub, q
+
+
+def _replay(hub, q, cursor, **kw):
+    async def run():
+        return [decode(f)[0] async for f in hub.replay(q, cursor, **kw)]
+    return asyncio.run(run())
+
+
+def test_replay_then_live_has_no_gaps_or_duplicates(redis_server, rb):
+    hub, q = _logged_hub(redis_server, rb, range(1, 6), until="4-0")
+    *events, marker = _replay(hub, q, "2-0", limit=100)
+    hub.dispatch(json.dumps({"type": "fill", "n": 5}), "5-0")
+    live = decode(asyncio.run(q.get()))[0]
+
+    assert [e["cursor"] for e in events] + [live["cursor"]] == ["3-0", "4-0", "5-0"]
+    assert marker == {"type": "replayed", "from": "2-0", "cursor": "4-0", "count": 2, "complete": True}
+
+
+def test_replay_incomplete_when_over_limit_or_trimmed(redis_server, rb):
+    hub, q = _logged_hub(redis_server, rb, range(3, 9), until="8-0")
+    *events, marker = _replay(hub, q, "3-0", limit=2)
+    assert [e["n"] for e in events] == [4, 5] and marker["complete"] is False
+
+    # 1-0 and 2-0 were trimmed from the capped stream
+    *events, marker = _replay(hub, q, "1-0", limit=100)
+    assert [e["n"] for e in events] == list(range(3, 9)) and marker["complete"] is False
+
+
+def test_replay_rejects_bad_cursor(redis_server, rb):
+    hub, q = _logged_hub(redis_server, rb, [], until="0-0")
+    with pytest.raises(ValueError):
+        _replay(hub, q, "latest", limit=10)
+
+
+def test_replay_gives_up_when_reader_never_seeds():
+    hub = _hub()
+    q = _client(hub)
+    assert _replay(hub, q, "1-0", limit=10, seed_timeout_s=0.01) == [
+        {"type": "replayed", "from": "1-0", "cursor": None, "count": 0, "complete": False}
+    ]
+    assert q.replay_until is None
+
+
+def test_replay_stops_at_seed_id_when_reader_seeds_after_subscribe(redis_server, rb):
+    hub, q = _logged_hub(redis_server, rb, range(1, 5), until="4-0")
+    # q joined before the reader started; it seeded at 3-0 and 4-0 already went out live
+    q.replay_until, hub.seed_id = None, "3-0"
+    hub.dispatch(json.dumps({"type": "fill", "n": 4}), "4-0")
+
+    *events, marker = _replay(hub, q, "1-0", limit=100)
+    live = decode(asyncio.run(q.get()))[0]
+    assert [e["cursor"] for e in events] + [live["cursor"]] == ["2-0", "3-0", "4-0"]
+    assert marker["cursor"] == "3-0" and marker["complete"] is True
+
+
+def test_replay_incomplete_when_live_frames_dropped_meanwhile(redis_server, rb):
+    hub, q = _logged_hub(redis_server, rb, range(1, 4), until="3-0")
+    q.maxsize = 1
+
+    async def run():
+        out = []
+        async for f in hub.replay(q, "1-0", limit=100):
+            if not out:  # live traffic piles up behind the replay
+                for i in (4, 5):
+                    hub.dispatch(json.dumps({"type": "fill", "n": i}), f"{i}-0")
+            out.append(decode(f)[0])
+        return out
+
+    *events, marker = asyncio.run(run())
+    assert [e["n"] for e in events] == [2, 3]
+    assert q.dropped == 1 and marker["complete"] is False
+
+
+def test_stream_reader_resets_backoff_after_a_read():
+    class _R:
+        calls = 0
+
+        async def xread(self, *a, **kw):
+            self.calls += 1
+            if self.calls > 1:
+                raise ConnectionError("gone")
+            return []
+
+    hub = _hub()
+    hub.last_id = hub.seed_id = "1-0"
+    hub._backoff = 16.0
+    with pytest.raises(ConnectionError):
+        asyncio.run(hub._tail_stream(_R()))
+    assert hub._backoff == 0.5